@@ -1,6 +1,9 @@
 """gunicorn configuration settings."""
 import multiprocessing
 import os
+import subprocess
+import sys
+from datetime import UTC, datetime
 
 # Django WSGI application path in pattern MODULE_NAME:VARIABLE_NAME
 wsgi_app = "lyprox.wsgi:application"
@@ -25,3 +28,17 @@ errorlog = "-"
 
 # Daemonize the Gunicorn process (detach & enter background)
 daemon = False
+
+
+def when_ready(server):
+    """Resume interrupted precompute jobs in the background, once per server start.
+
+    This runs in the master process before the workers are started. The jobs are run
+    by a separate ``lyprox resume_precompute`` process, such that the site is served
+    while the checkpoints are warming. Only jobs created before now are resumed.
+    """
+    started = datetime.now(UTC).isoformat()
+    subprocess.Popen(  # noqa: S603
+        [sys.executable, "-m", "lyprox", "resume_precompute", "--before", started],
+    )
+    server.log.info(f"Resuming interrupted precompute jobs from before {started}.")
@@ -152,7 +152,8 @@ about populating the database:
 - ``lyprox add_datasets --from-file initial/datasets.json``
     With the `add_datasets` command, fetching and loading CSV tables of patient records
     from the `lyDATA`_ repo is initiated. The loaded `pandas`_ dataframes are cached
-    using `joblib` and thus the patient data never reaches the `SQLite3`_ database.
+    as memory-mapped NumPy files and thus the patient data never reaches the
+    `SQLite3`_ database.
 - ``lyprox add_riskmodels --from-file initial/riskmodels.json``
     Lastly, the `add_riskmodels` command loads a model definition from the config files
     that the ``initial/riskmodels.json`` file points to. Then, it fetches the MCMC
@@ -19,9 +19,10 @@ it probably makes sense to dive into the docs in the order they are listed below
 3. The view then calls `execute_query` with this cleaned form data. In this function,
    the selected dataset specifications are loaded from the SQLite database. Using
    these specs, the actual `pandas.DataFrame` is loaded from the GitHub repository (if
-   requested for the first time) or from the `joblib` cache (in all subsequent calls).
-   It returns a filtered `pandas.DataFrame` that contains only the data that matches
-   the user's selection.
+   requested for the first time) or from its columnar `store` (in all subsequent calls).
+   The tables of all datasets are joined once and written to a memory-mapped `store`
+   that all worker processes share. `execute_query` returns a filtered
+   `pandas.DataFrame` that contains only the data that matches the user's selection.
 4. The view then returns a dynamically created instance of the ``Statistics`` class
    (using the `BaseStatistics.from_table` classmethod). It is a `pydantic.BaseModel`
    that creates a set of statistics (like the count of patients with positive, negative,
@@ -3,9 +3,15 @@
 Beyond some bookkeeping, the `DataExplorerConfig` has a class attribute `add_to_navbar`
 that is set to ``True`` and tells the `lyprox.context_processors.navbar_apps` context
 processor to add an entry to the main navigation bar for this app.
+
+When the app is ready, its `DataExplorerConfig.ready` method connects the
+`query.evict_dataset_receiver` to the signals that are sent when a
+`models.DatasetModel` is saved or deleted. This way, cached tables of outdated datasets
+are dropped from memory.
 """
 
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class DataExplorerConfig(AppConfig):
@@ -15,3 +21,19 @@ class DataExplorerConfig(AppConfig):
     name = "lyprox.dataexplorer"
     add_to_navbar = True
     """Tell the navbar context processor to add an entry for this app."""
+
+    def ready(self) -> None:
+        """Evict cached tables of datasets that are saved or deleted."""
+        from lyprox.dataexplorer.models import DatasetModel
+        from lyprox.dataexplorer.query import evict_dataset_receiver
+
+        post_save.connect(
+            evict_dataset_receiver,
+            sender=DatasetModel,
+            dispatch_uid="evict_dataset_on_save",
+        )
+        post_delete.connect(
+            evict_dataset_receiver,
+            sender=DatasetModel,
+            dispatch_uid="evict_dataset_on_delete",
+        )
@@ -0,0 +1,181 @@
+"""Bitmap index for answering dashboard queries with bitwise operations.
+
+Every click on the dashboard's "Compute" button creates a new query from the cleaned
+`DataexplorerForm` data (see `query.get_risk_factor_query` and `query.get_lnl_query`).
+Executing such a query via ``table.ly.query(query)`` scans every involved column of
+the patient table again, although the set of distinct values per column is tiny.
+
+The `BitmapIndex` defined here precomputes one packed bitset (via `numpy.packbits`)
+for every ``(column, value)`` pair that the dashboard can filter on. The same
+`lydata.querier.C` queries are then answered by walking the query tree and combining
+these bitsets with bitwise AND, OR, and NOT operations. This makes the query step
+independent of the number of columns and nearly independent of the number of patients.
+"""
+
+import logging
+from collections.abc import Hashable, Iterable
+from typing import Any
+
+import lydata  # noqa: F401
+import numpy as np
+import pandas as pd
+from lydata.querier import AndQ, NoneQ, NotQ, OrQ, Q
+from lydata.types import CanExecute
+
+from lyprox.settings import LNLS
+
+logger = logging.getLogger(__name__)
+
+RISK_FACTORS = ["t_stage", "subsite", "smoke", "hpv", "surgery", "midext", "central"]
+"""Short names of the columns that are indexed for every value they contain."""
+
+DATASET_COLUMN = ("dataset", "core", "name")
+"""Column that stores the name of the dataset each patient belongs to."""
+
+BitsetKey = tuple[Hashable, str, Any]
+"""Key of a bitset: The column name, the comparison operator, and the value."""
+
+
+def to_python_scalar(value: Any) -> Any:
+    """Convert NumPy scalars to their Python equivalent to get consistent dict keys.
+
+    >>> type(to_python_scalar(np.int64(3)))
+    <class 'int'>
+    >>> to_python_scalar("C01")
+    'C01'
+    """
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def pack_mask(mask: pd.Series | np.ndarray) -> np.ndarray:
+    """Pack a boolean ``mask`` into a bitset. Missing values are treated as ``False``.
+
+    >>> pack_mask(np.array([True, False, True]))
+    array([160], dtype=uint8)
+    """
+    if isinstance(mask, pd.Series):
+        mask = mask.to_numpy(dtype=bool, na_value=False)
+
+    return np.packbits(np.asarray(mask, dtype=bool))
+
+
+class BitmapIndex:
+    """Packed bitsets for all values of the columns the dashboard filters on.
+
+    For the risk factors in `RISK_FACTORS`, the consensus involvement of every LNL
+    on both sides, and the `DATASET_COLUMN`, this stores one bitset per distinct value,
+    keyed by ``(column, "==", value)``. The N+ status is stored under the keys
+    ``("n_stage", ">", 0)`` and ``("n_stage", "==", 0)``, because these are the two
+    comparisons that `query.get_risk_factor_query` creates.
+
+    Instances should be created using the `from_table` classmethod and are then used
+    to `execute` queries built from `lydata.querier.C` objects.
+    """
+
+    def __init__(
+        self,
+        num_rows: int,
+        bitsets: dict[BitsetKey, np.ndarray],
+        exhaustive_columns: Iterable[Hashable],
+    ) -> None:
+        """Store the ``bitsets`` for a table with ``num_rows`` rows.
+
+        The ``exhaustive_columns`` are the columns for which every present value has
+        its own bitset. An equality comparison with a value of one of these columns
+        that has no bitset simply matches no rows.
+        """
+        self.num_rows = num_rows
+        self.bitsets = bitsets
+        self.exhaustive_columns = set(exhaustive_columns)
+        self.num_bytes = (num_rows + 7) // 8
+
+    def __repr__(self) -> str:
+        """Return a string representation of the index."""
+        return f"BitmapIndex(num_rows={self.num_rows}, num_bitsets={len(self.bitsets)})"
+
+    @classmethod
+    def from_table(
+        cls,
+        table: pd.DataFrame,
+        method: str = "max_llh",
+    ) -> "BitmapIndex":
+        """Build the index from a ``table`` with combined LNL involvement columns.
+
+        The ``table`` should already contain the consensus involvement computed with
+        the given ``method`` (e.g. ``"max_llh"``), as it is done in the
+        `query.execute_query` function. Otherwise, queries on the LNLs cannot be
+        answered by the index.
+        """
+        bitsets = {}
+        columns = [(name, table.ly[name]) for name in RISK_FACTORS]
+        columns += [
+            ((method, side, lnl), table[method, side, lnl])
+            for side in ["ipsi", "contra"]
+            for lnl in LNLS
+            if (method, side, lnl) in table.columns
+        ]
+        if DATASET_COLUMN in table.columns:
+            columns.append((DATASET_COLUMN, table[DATASET_COLUMN]))
+
+        for colname, column in columns:
+            codes, uniques = pd.factorize(column)
+            for code, value in enumerate(uniques):
+                key = (colname, "==", to_python_scalar(value))
+                bitsets[key] = np.packbits(codes == code)
+
+        n_stage = table.ly["n_stage"]
+        bitsets["n_stage", ">", 0] = pack_mask(n_stage > 0)
+        bitsets["n_stage", "==", 0] = pack_mask(n_stage == 0)
+
+        exhaustive_columns = [colname for colname, _ in columns]
+        return cls(len(table), bitsets, exhaustive_columns)
+
+    def get_bitset(self, query: Q) -> np.ndarray:
+        """Return the packed bitset for a single, not combined ``query``.
+
+        Queries with the ``"in"`` operator are answered by OR-ing the bitsets of all
+        values in the list. A `KeyError` is raised if the ``query`` compares a column
+        or uses an operator that is not indexed.
+        """
+        if query.operator == "in":
+            result = np.zeros(self.num_bytes, dtype=np.uint8)
+            for value in query.value:
+                result |= self.get_bitset(Q(query.colname, "==", value))
+            return result
+
+        key = (query.colname, query.operator, query.value)
+        if key in self.bitsets:
+            return self.bitsets[key]
+
+        if query.operator == "==" and query.colname in self.exhaustive_columns:
+            return np.zeros(self.num_bytes, dtype=np.uint8)
+
+        raise KeyError(f"No bitset for {query!r} in {self!r}.")
+
+    def execute_packed(self, query: CanExecute) -> np.ndarray:
+        """Recursively combine the bitsets of the ``query`` tree into one bitset."""
+        if isinstance(query, NoneQ):
+            return np.full(self.num_bytes, 0xFF, dtype=np.uint8)
+
+        if isinstance(query, AndQ):
+            return self.execute_packed(query.q1) & self.execute_packed(query.q2)
+
+        if isinstance(query, OrQ):
+            return self.execute_packed(query.q1) | self.execute_packed(query.q2)
+
+        if isinstance(query, NotQ):
+            return ~self.execute_packed(query.q)
+
+        if isinstance(query, Q):
+            return self.get_bitset(query)
+
+        raise TypeError(f"Cannot execute query of type {type(query).__name__}.")
+
+    def execute(self, query: CanExecute) -> np.ndarray:
+        """Return a boolean mask of the rows that satisfy the ``query``.
+
+        This is equivalent to ``query.execute(table)`` for the table the index was
+        built from, but only uses bitwise operations on the precomputed bitsets.
+        """
+        packed = self.execute_packed(query)
+        return np.unpackbits(packed, count=self.num_rows).astype(bool)
@@ -0,0 +1,114 @@
+"""Precomputed count cube for dashboard queries that only filter on risk factors.
+
+Most queries from the dashboard do not select any LNL involvement, but only filter on
+risk factors like the T-category, the subsite, or the HPV status, and on the datasets.
+For such queries, it is not necessary to look at individual patients at all.
+
+The `CountCube` groups all patients into cells. Every cell holds the patients that
+share the same value in each of the `DIMENSIONS`. For every cell, the counts of all
+values of all `query.Statistics` fields are precomputed. A query on the risk factors
+then selects entire cells (using a `bitmap.BitmapIndex` built from one representative
+row per cell), and the statistics are obtained by summing the counts of the selected
+cells. This is independent of the number of patients.
+
+As soon as the query involves LNLs, the cells would need to be split further by the
+involvement of every LNL, and `query.execute_query` is used instead.
+"""
+
+import logging
+import time
+from collections.abc import Hashable
+
+import numpy as np
+import pandas as pd
+from lydata.types import CanExecute
+
+from lyprox.dataexplorer.bitmap import DATASET_COLUMN, RISK_FACTORS, BitmapIndex
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = [*RISK_FACTORS, "n_stage"]
+"""Short names of the risk factors that span the cube, besides the dataset."""
+
+
+def get_dimensions_table(table: pd.DataFrame) -> pd.DataFrame:
+    """Return the columns of the ``table`` that span the cube.
+
+    These are the columns behind the short names in `DIMENSIONS`, plus the
+    `DATASET_COLUMN`. The returned table keeps the full, three-level column names, such
+    that `lydata` queries using the short names still work on it.
+    """
+    columns: list[Hashable] = [table.ly[name].name for name in DIMENSIONS]
+    columns.append(DATASET_COLUMN)
+    return table[columns]
+
+
+class CountCube:
+    """Counts of all statistics values for every combination of risk factors.
+
+    The ``cells`` are a table with one row per cell and the columns returned by
+    `get_dimensions_table`. The ``counts`` have one row per cell and one column per
+    offset code (see `query.get_code_offsets`). Both are best created using the
+    `from_encoded` classmethod.
+    """
+
+    def __init__(self, cells: pd.DataFrame, counts: np.ndarray) -> None:
+        """Store the ``cells`` and ``counts`` and index the cells."""
+        self.cells = cells
+        self.counts = counts
+        self.index = BitmapIndex.from_table(cells)
+
+    def __repr__(self) -> str:
+        """Return a string representation of the cube."""
+        num_cells, num_values = self.counts.shape
+        return f"CountCube(num_cells={num_cells}, num_values={num_values})"
+
+    @classmethod
+    def from_encoded(
+        cls,
+        dimensions: pd.DataFrame,
+        offset_codes: np.ndarray,
+        num_values: int,
+    ) -> "CountCube":
+        """Create the cube from the ``dimensions`` and encoded statistics of a table.
+
+        The ``dimensions`` table is returned by `get_dimensions_table` and the
+        ``offset_codes`` are the codes from `query.encode_statistics_table` shifted
+        by `query.get_code_offsets`, such that each of the ``num_values`` values of
+        every statistic has its own code.
+        """
+        dimension_codes = np.column_stack(
+            [
+                pd.factorize(column, use_na_sentinel=False)[0]
+                for _, column in dimensions.items()
+            ]
+        )
+        _, first_rows, cell_ids = np.unique(
+            dimension_codes,
+            axis=0,
+            return_index=True,
+            return_inverse=True,
+        )
+        num_cells = len(first_rows)
+        cell_ids = cell_ids.reshape(-1, 1)
+        counts = np.bincount(
+            (cell_ids * num_values + offset_codes).ravel(),
+            minlength=num_cells * num_values,
+        ).reshape(num_cells, num_values)
+
+        cells = dimensions.iloc[first_rows].reset_index(drop=True)
+        return cls(cells, counts)
+
+    def count(self, query: CanExecute) -> np.ndarray:
+        """Sum up the counts of all cells that match the ``query``.
+
+        The ``query`` must only involve the `DIMENSIONS` and the `DATASET_COLUMN`.
+        Otherwise, the underlying `BitmapIndex` raises a `KeyError`.
+        """
+        start_time = time.perf_counter()
+        is_selected = self.index.execute(query)
+        counts = self.counts[is_selected].sum(axis=0)
+        end_time = time.perf_counter()
+        num_cells = is_selected.sum()
+        logger.info(f"Summed {num_cells} cells in {end_time - start_time:.4f} seconds.")
+        return counts
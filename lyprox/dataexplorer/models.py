@@ -2,7 +2,9 @@
 
 import logging
 import time
+from pathlib import Path
 
+import joblib
 import lydata.utils as lyutils
 import pandas as pd
 from django.db import models
@@ -12,7 +14,8 @@ from lydata.validator import cast_dtypes
 
 from lyprox import loggers
 from lyprox.accounts.models import Institution
-from lyprox.settings import GITHUB_TOKEN, JOBLIB_MEMORY, LNLS
+from lyprox.dataexplorer.store import get_or_create_store, has_store
+from lyprox.settings import DATASET_STORE_DIR, GITHUB_TOKEN, LNLS
 from lyprox.utils import cached_get_repo
 
 logger = logging.getLogger(__name__)
@@ -44,15 +47,14 @@ def ensure_lnls_in_modalities(dataset: pd.DataFrame) -> pd.DataFrame:
     return dataset
 
 
-@JOBLIB_MEMORY.cache
-def cached_load_dataframe(
+def fetch_dataframe(
     year: int,
     institution: str,
     subsite: str,
     repo_name: str,
     ref: str,
 ) -> pd.DataFrame:
-    """Load an enhanced dataset into a pandas DataFrame using a persistent cache."""
+    """Fetch an enhanced dataset from GitHub and load it into a pandas DataFrame."""
     lydataset = LyDataset(
         year=year,
         institution=institution,
@@ -67,6 +69,51 @@ def cached_load_dataframe(
     return df
 
 
+def get_dataset_store_location(
+    year: int,
+    institution: str,
+    subsite: str,
+    repo_name: str,
+    ref: str,
+) -> tuple[str, Path]:
+    """Return the name and root directory of a dataset's columnar `store`.
+
+    Every dataset gets its own root directory, and the name of the store within it is
+    a hash of the ``repo_name`` and ``ref``. This way, creating the store of a new
+    ``ref`` removes the stores of all previous refs of the same dataset.
+    """
+    root = DATASET_STORE_DIR / f"{year}-{institution}-{subsite}"
+    return joblib.hash((repo_name, ref)), root
+
+
+def cached_load_dataframe(
+    year: int,
+    institution: str,
+    subsite: str,
+    repo_name: str,
+    ref: str,
+) -> pd.DataFrame:
+    """Load an enhanced dataset into a pandas DataFrame using a persistent cache.
+
+    The first call fetches the dataset via `fetch_dataframe` and writes it to a
+    columnar, memory-mapped `store`. All subsequent calls only attach to the store's
+    files.
+    """
+    kwargs = {
+        "year": year,
+        "institution": institution,
+        "subsite": subsite,
+        "repo_name": repo_name,
+        "ref": ref,
+    }
+    name, root = get_dataset_store_location(**kwargs)
+    return get_or_create_store(
+        name=name,
+        build=lambda: fetch_dataframe(**kwargs),
+        root=root,
+    )
+
+
 class DatasetModel(loggers.ModelLoggerMixin, models.Model):
     """Minimal model representing a dataset.
 
@@ -74,8 +121,8 @@ class DatasetModel(loggers.ModelLoggerMixin, models.Model):
 
     Its `DatasetModel.load_dataframe` method makes use of the function
     `cached_load_dataframe` to load the dataset into a pandas DataFrame.
-    Note that this function uses `joblib` to cache the results of the function call
-    in a persistent location given by the ``JOBLIB_CACHE_DIR`` setting.
+    Note that this function caches the dataset as a columnar `store` in a persistent
+    location given by the ``DATASET_STORE_DIR`` setting.
     """
 
     year: int = models.IntegerField()
@@ -137,7 +184,7 @@ class DatasetModel(loggers.ModelLoggerMixin, models.Model):
         ``kwargs`` and returns the resulting `pd.DataFrame`.
         """
         kwargs = self.get_kwargs()
-        is_in_cache = cached_load_dataframe.check_call_in_cache(**kwargs)
+        is_in_cache = has_store(*get_dataset_store_location(**kwargs))
 
         msg_add = "from cache." if is_in_cache else "from GitHub."
 
@@ -9,6 +9,13 @@ In the `views`, the `execute_query` function is called with the cleaned data fro
 the fancy `lydata.querier.C` objects from `lydata`_. These classes allow arbitrary
 combinations of deferred queries to be created and only later be executed.
 
+To avoid loading, joining, and scanning the patient tables on every request, the
+query is not executed on a table of the selected datasets. Instead, the tables of all
+datasets are joined once per process, and a `bitmap.BitmapIndex` is built for this
+table once per selection of modalities and combination method. The query, including
+the selection of datasets, is then answered using bitwise operations on the index's
+packed bitsets.
+
 After executing the query, the filtered dataset is used to compute `Statistics` using
 the `from_table` classmethod. This `pydantic.BaseModel` has similar fields to the
 `DataexplorerForm` and is used to display the aggregated information of the filtered
@@ -19,24 +26,40 @@ patient table in the dashboard.
 
 import logging
 import time
-from collections.abc import Callable, Sequence
+from collections.abc import Callable, Hashable, Iterator, Sequence
+from threading import Lock
 from typing import Annotated, Any, Literal, TypeVar
 
+import joblib
 import lydata  # noqa: F401
 import lydata.schema as lyschema
 import lydata.utils as lyutils
 import lydata.validator as lyvalidator
+import numpy as np
 import pandas as pd
+from cachetools import LRUCache, cached
 from django.db.models import QuerySet
 from lydata import C, LyDataFrame
 from lydata.augmentor import combine_and_augment_levels
 from lydata.querier import CanExecute, NoneQ
 from pydantic import AfterValidator, BaseModel, computed_field, create_model
 
+from lyprox.dataexplorer.bitmap import DATASET_COLUMN, BitmapIndex, to_python_scalar
+from lyprox.dataexplorer.cube import CountCube, get_dimensions_table
 from lyprox.dataexplorer.models import DatasetModel
+from lyprox.dataexplorer.store import get_or_create_store
 from lyprox.dataexplorer.subsites import Subsites
 from lyprox.dataexplorer.utils import get_nested_fields
-from lyprox.settings import LNLS
+from lyprox.settings import LNLS, PATIENT_STORE_DIR
+
+COMBINED_INVOLVEMENT_CACHE_SIZE = 256 * 1024**2
+"""Maximum number of bytes the cached combined involvement tables may occupy."""
+
+QUERY_RESULT_CACHE_SIZE = 64 * 1024**2
+"""Maximum number of bytes the cached row selections of executed queries may occupy."""
+
+STATISTICS_CACHE_SIZE = 4096
+"""Maximum number of `Statistics` of executed queries to keep in memory."""
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +73,37 @@ def assemble_selected_modalities(names: list[str]) -> dict[str, lyutils.Modality
     }
 
 
+def combine_involvement(
+    table: pd.DataFrame,
+    modalities: dict[str, lyutils.ModalityConfig],
+    method: Literal["max_llh", "rank"] = "max_llh",
+) -> pd.DataFrame:
+    """Compute the consensus involvement of the ``modalities`` in the ``table``.
+
+    This wraps `lydata.augmentor.combine_and_augment_levels` and returns its result
+    with the ``method`` as the top-level column and the same index as the ``table``.
+    The combined columns are returned with the nullable ``"boolean"`` dtype, just like
+    the involvement columns of the individual modalities. `combine_and_augment_levels`
+    returns them as ``object`` columns, which are slow to count and to index.
+    """
+    combined = combine_and_augment_levels(
+        diagnoses=[table[modality] for modality in modalities.keys()],
+        specificities=[modality.spec for modality in modalities.values()],
+        sensitivities=[modality.sens for modality in modalities.values()],
+        method=method,
+    )
+    values = combined.to_numpy(dtype=object)
+    is_involved, is_missing = np.equal(values, True), np.equal(values, None)
+    combined = pd.DataFrame(
+        data={
+            column: pd.arrays.BooleanArray(is_involved[:, i], is_missing[:, i])
+            for i, column in enumerate(combined.columns)
+        },
+        index=table.index,
+    )
+    return pd.concat({method: combined}, axis="columns")
+
+
 def get_risk_factor_query(cleaned_form: dict[str, Any]) -> CanExecute:
     """Create a query for the risk factors based on the cleaned form data."""
     risk_factor_query = C("t_stage").isin(cleaned_form["t_stage"])
@@ -66,6 +120,12 @@ def get_risk_factor_query(cleaned_form: dict[str, Any]) -> CanExecute:
     return risk_factor_query
 
 
+def get_dataset_query(cleaned_form: dict[str, Any]) -> CanExecute:
+    """Create a query for the datasets selected in the cleaned form data."""
+    selected_names = [dataset.name for dataset in cleaned_form["datasets"]]
+    return C(*DATASET_COLUMN).isin(selected_names)
+
+
 def get_lnl_query(cleaned_form: dict[str, Any]) -> CanExecute:
     """Create a query for the LNLs based on the cleaned form data."""
     lnl_query = NoneQ()
@@ -85,19 +145,18 @@ def join_dataset_tables(datasets: QuerySet | Sequence[DatasetModel]) -> pd.DataF
     """Join the tables of the selected datasets into a single table.
 
     This iterates through the datasets and loads their respective `pd.DataFrame` tables.
-    It also adds a column ``["dataset", "core", "name"]`` to the table to keep track of
-    which dataset a row belongs to. Finally, it concatenates all tables into a single
-    table and returns it.
+    It concatenates all tables into a single table and adds the categorical column
+    ``["dataset", "core", "name"]`` (see `bitmap.DATASET_COLUMN`) to keep track of
+    which dataset a row belongs to.
 
     In case the ``datasets`` are empty, a likewise empty table is created with all the
     columns necessary to create a `Statistics` object. These columns are in turn
     constructed from the schema of the `lydata.validator` module.
     """
-    tables = []
+    tables, names = [], []
     for dataset in datasets:
-        table = dataset.load_dataframe()
-        table["dataset", "core", "name"] = dataset.name
-        tables.append(table)
+        tables.append(dataset.load_dataframe())
+        names.append(dataset.name)
 
     if len(tables) == 0:
         modalities = list(lyutils.get_default_modalities().keys())
@@ -106,50 +165,308 @@ def join_dataset_tables(datasets: QuerySet | Sequence[DatasetModel]) -> pd.DataF
         nested_field_info = get_nested_fields(schema)
         columns = lyvalidator.flatten(nested_field_info)
         empty_table = pd.DataFrame(columns=columns)
-        empty_table["dataset", "core", "name"] = []
+        empty_table[DATASET_COLUMN] = []
         return empty_table
 
-    return pd.concat(tables, ignore_index=True)
+    joined_table = pd.concat(tables, ignore_index=True)
+    codes = np.repeat(np.arange(len(tables)), [len(table) for table in tables])
+    joined_table[DATASET_COLUMN] = pd.Categorical.from_codes(codes, categories=names)
+    return joined_table
 
 
-def execute_query(cleaned_form_data: dict[str, Any]) -> pd.DataFrame:
-    """Execute the query defined by the `DataexplorerForm`.
+def get_datasets_fingerprint(
+    datasets: QuerySet | Sequence[DatasetModel],
+) -> tuple[tuple[str, str, Any], ...]:
+    """Return a hashable fingerprint of the ``datasets``, their refs and push dates.
 
-    After validating a `DataexplorerForm` by calling ``form.is_valid()``, the cleaned
-    data is accessible as the attribute ``form.cleaned_data``. The returned dictionary
-    should be passed to this function as the ``cleaned_form_data`` argument.
+    The order of the datasets is kept, because it determines the order of the rows in
+    the table returned by `join_dataset_tables`.
+    """
+    return tuple(
+        (dataset.name, dataset.ref, dataset.last_pushed) for dataset in datasets
+    )
 
-    Based on
-    this cleaned form data, the involvement data from different modalities is combined
-    using the `lydata`_ accessor method `lydata.accessor.LyDataAccessor.combine`. Then,
-    a query is created using the `lydata.querier.C` objects and executed on the
-    dataset using the `lydata.accessor.LyDataAccessor.query` method. The resulting
-    filtered dataset is returned.
 
-    .. _lydata: https://lydata.readthedocs.io/stable/
+def get_all_datasets() -> QuerySet:
+    """Return all `DatasetModel` instances in a fixed order.
+
+    Their institutions are fetched in the same database query, because the
+    `DatasetModel.name` of each dataset depends on it.
+    """
+    return DatasetModel.objects.select_related("institution").order_by("pk")
+
+
+@cached(
+    cache=LRUCache(maxsize=1),
+    key=lambda fingerprint, *_args, **_kwargs: (fingerprint,),
+    lock=Lock(),
+)
+def cached_join_dataset_tables(
+    fingerprint: tuple[tuple[str, str, Any], ...],
+    datasets: QuerySet | Sequence[DatasetModel],
+) -> pd.DataFrame:
+    """Call `join_dataset_tables` for all ``datasets`` and keep the result in memory.
+
+    This table of all patients is built once and only rebuilt when the
+    ``fingerprint`` changes, i.e. when a dataset is added or removed, or when its
+    ``ref`` or ``last_pushed`` date changes. Like the other caches in this module,
+    the cache key is a tuple whose first element is the datasets' fingerprint, which
+    is what `evict_dataset` expects.
+
+    The joined table is written to the memory-mapped `store` once and then attached by
+    every process, such that all gunicorn workers share the same copy of the data.
     """
     start_time = time.perf_counter()
-    method = cleaned_form_data["modality_combine"]
-    joined_table = join_dataset_tables(cleaned_form_data["datasets"])
+    table = get_or_create_store(
+        name=joblib.hash(fingerprint),
+        build=lambda: join_dataset_tables(datasets),
+        root=PATIENT_STORE_DIR,
+    )
+    end_time = time.perf_counter()
+    logger.info(f"Joined {len(fingerprint)} datasets in {end_time - start_time:.2f} s.")
+    return table
+
+
+def get_table_size(table: pd.DataFrame) -> int:
+    """Return the number of bytes the ``table``'s columns occupy in memory."""
+    return int(table.memory_usage(index=False).sum())
+
+
+@cached(
+    cache=LRUCache(maxsize=COMBINED_INVOLVEMENT_CACHE_SIZE, getsizeof=get_table_size),
+    key=lambda fingerprint, *_args, **_kwargs: fingerprint,
+    lock=Lock(),
+)
+def cached_combine_involvement(
+    fingerprint: Hashable,
+    table: pd.DataFrame,
+    modalities: dict[str, lyutils.ModalityConfig],
+    method: Literal["max_llh", "rank"],
+) -> pd.DataFrame:
+    """Call `combine_involvement` and cache the result under the ``fingerprint``.
+
+    Just like for the `cached_build_bitmap_index` function, the ``fingerprint`` must
+    uniquely identify the ``table`` and the selected ``modalities`` and ``method``.
+    The cache is bounded by the memory the cached tables occupy (see
+    `COMBINED_INVOLVEMENT_CACHE_SIZE`) and evicts the least recently used entries
+    first. Entries of a dataset whose ``ref`` changed are removed by `evict_dataset`.
+    """
+    start_time = time.perf_counter()
+    combined = combine_involvement(table, modalities, method)
+    end_time = time.perf_counter()
+    logger.info(f"Combined involvement in {end_time - start_time:.2f} seconds.")
+    return combined
+
+
+@cached(
+    cache=LRUCache(maxsize=32),
+    key=lambda fingerprint, *_args, **_kwargs: fingerprint,
+    lock=Lock(),
+)
+def cached_build_bitmap_index(
+    fingerprint: Hashable,
+    table: pd.DataFrame,
+    combined_inv_table: pd.DataFrame,
+    method: Literal["max_llh", "rank"],
+) -> BitmapIndex:
+    """Build a `BitmapIndex` for the ``table``, cached under the ``fingerprint``.
+
+    The ``fingerprint`` must uniquely identify the content of the ``table`` and the
+    ``combined_inv_table`` computed from it, which is why `execute_query` assembles it
+    from the `get_datasets_fingerprint`, the selected modalities, and the combination
+    ``method``. The two tables are only concatenated if the index is not yet cached.
+    """
+    start_time = time.perf_counter()
+    table = pd.concat([table, combined_inv_table], axis="columns")
+    index = BitmapIndex.from_table(table, method=method)
+    end_time = time.perf_counter()
+    logger.info(f"Built {index} in {end_time - start_time:.2f} seconds.")
+    return index
+
+
+def evict_dataset(name: str) -> int:
+    """Remove all cached tables and indices that contain the dataset ``name``.
+
+    Since the fingerprints of `cached_join_dataset_tables`,
+    `cached_combine_involvement`, `cached_build_bitmap_index`, and
+    `cached_build_count_cube` contain the ``ref`` of every dataset, outdated entries
+    would never be hit again. But they would still occupy memory until the LRU cache
+    evicts them. This function drops them right away and returns how many entries
+    were removed. Cached query results and statistics are dropped entirely.
+    """
+    num_evicted = 0
+    for cached_func in [
+        cached_join_dataset_tables,
+        cached_combine_involvement,
+        cached_build_bitmap_index,
+        cached_build_count_cube,
+    ]:
+        with cached_func.cache_lock:
+            for key in list(cached_func.cache.keys()):
+                datasets_fingerprint, *_ = key
+                if any(name == cached_name for cached_name, *_ in datasets_fingerprint):
+                    del cached_func.cache[key]
+                    num_evicted += 1
+
+    # keys of these caches are hashes, but they become outdated with any dataset
+    for cached_func in [cached_execute_packed, cached_compute_statistics]:
+        with cached_func.cache_lock:
+            num_evicted += len(cached_func.cache)
+            cached_func.cache.clear()
+
+    logger.info(f"Evicted {num_evicted} cached entries of dataset {name}.")
+    return num_evicted
+
+
+def evict_dataset_receiver(sender, instance: DatasetModel, **kwargs) -> None:
+    """Call `evict_dataset` when a `DatasetModel` is saved or deleted.
+
+    This is connected to Django's ``post_save`` and ``post_delete`` signals in the
+    `apps.DataExplorerConfig.ready` method.
+    """
+    evict_dataset(instance.name)
+
 
-    if len(joined_table) == 0:
-        return joined_table
+def get_query_key(
+    cleaned_form_data: dict[str, Any],
+    datasets_fingerprint: tuple[tuple[str, str, Any], ...],
+) -> str:
+    """Return a canonical hash of the ``cleaned_form_data`` and the datasets' refs.
 
+    The order of the form fields and of the values in multiple choice fields (e.g.
+    the selected ``t_stage`` values) does not matter. The selected datasets enter via
+    their names, while the ``datasets_fingerprint`` (see `get_datasets_fingerprint`)
+    makes sure that the hash changes when any dataset is updated.
+    """
+    canonical = {}
+    for name, value in cleaned_form_data.items():
+        if name == "datasets":
+            value = sorted(dataset.name for dataset in value)
+        elif isinstance(value, list | tuple | set):
+            value = sorted(value, key=repr)
+        canonical[name] = value
+
+    return joblib.hash((canonical, datasets_fingerprint))
+
+
+@cached(
+    cache=LRUCache(maxsize=QUERY_RESULT_CACHE_SIZE, getsizeof=lambda mask: mask.nbytes),
+    key=lambda query_key, *_args, **_kwargs: query_key,
+    lock=Lock(),
+)
+def cached_execute_packed(
+    query_key: str,
+    index: BitmapIndex,
+    query: CanExecute,
+) -> np.ndarray:
+    """Execute the ``query`` on the ``index`` and cache the packed row selection.
+
+    The ``query_key`` is computed by `get_query_key`. Storing the row selection as a
+    packed bitset needs only one bit per patient, independent of how many patients
+    are selected. The cache is shared by all views that call `execute_query`, which
+    means that e.g. paging through the table view or downloading the CSV after a
+    dashboard query does not execute the query again.
+    """
+    return index.execute_packed(query)
+
+
+def get_combined_tables(
+    cleaned_form_data: dict[str, Any],
+    all_datasets: QuerySet | Sequence[DatasetModel],
+    datasets_fingerprint: tuple[tuple[str, str, Any], ...],
+) -> tuple[Hashable, pd.DataFrame, pd.DataFrame]:
+    """Return the joined table of ``all_datasets`` and its combined involvement.
+
+    The consensus involvement is computed for the modalities and the combination
+    method selected in the ``cleaned_form_data``. Both tables are cached (see
+    `cached_join_dataset_tables` and `cached_combine_involvement`). Also returned is
+    the fingerprint under which they and everything derived from them are cached.
+    """
+    method = cleaned_form_data["modality_combine"]
+    joined_table = cached_join_dataset_tables(datasets_fingerprint, all_datasets)
     assembled_modalities = assemble_selected_modalities(cleaned_form_data["modalities"])
-    combined_inv_subtable = combine_and_augment_levels(
-        diagnoses=[joined_table[mod] for mod in assembled_modalities.keys()],
-        specificities=[mod.spec for mod in assembled_modalities.values()],
-        sensitivities=[mod.sens for mod in assembled_modalities.values()],
-        method=method,
+    fingerprint = (
+        datasets_fingerprint,
+        tuple(sorted(assembled_modalities.keys())),
+        method,
+    )
+    combined_inv_table = cached_combine_involvement(
+        fingerprint, joined_table, assembled_modalities, method
     )
-    combined_inv_table = pd.concat({method: combined_inv_subtable}, axis="columns")
-    combined_inv_table.index = joined_table.index
-    combined_table: LyDataFrame = pd.concat(
-        [joined_table, combined_inv_table],
+    return fingerprint, joined_table, combined_inv_table
+
+
+def select_patients(
+    cleaned_form_data: dict[str, Any],
+) -> tuple[pd.DataFrame, pd.DataFrame, np.ndarray]:
+    """Return the tables of all patients and the positions of the selected ones.
+
+    The first two returned tables are the joined table of all datasets and its
+    combined involvement (see `get_combined_tables`). The returned positions are the
+    rows of these tables that match the query defined by the ``cleaned_form_data``.
+    The query is answered by the `BitmapIndex` and its result is cached (see
+    `cached_execute_packed`).
+
+    If there are no datasets at all, an empty table with all necessary columns is
+    returned (see `join_dataset_tables`).
+    """
+    method = cleaned_form_data["modality_combine"]
+    all_datasets = get_all_datasets()
+    datasets_fingerprint = get_datasets_fingerprint(all_datasets)
+
+    if len(datasets_fingerprint) == 0:
+        empty_table = join_dataset_tables(all_datasets)
+        return empty_table, pd.DataFrame(), np.array([], dtype=np.intp)
+
+    fingerprint, joined_table, combined_inv_table = get_combined_tables(
+        cleaned_form_data, all_datasets, datasets_fingerprint
+    )
+    index = cached_build_bitmap_index(
+        fingerprint, joined_table, combined_inv_table, method
+    )
+    query = get_dataset_query(cleaned_form_data)
+    query &= get_risk_factor_query(cleaned_form_data) & get_lnl_query(cleaned_form_data)
+    query_key = get_query_key(cleaned_form_data, datasets_fingerprint)
+    packed_mask = cached_execute_packed(query_key, index, query)
+    mask = np.unpackbits(packed_mask, count=index.num_rows)
+    return joined_table, combined_inv_table, np.flatnonzero(mask)
+
+
+def take_patients(
+    joined_table: pd.DataFrame,
+    combined_inv_table: pd.DataFrame,
+    positions: np.ndarray,
+) -> LyDataFrame:
+    """Copy the rows at the ``positions`` of both tables into one table."""
+    return pd.concat(
+        [joined_table.take(positions), combined_inv_table.take(positions)],
         axis="columns",
     )
-    query = get_risk_factor_query(cleaned_form_data) & get_lnl_query(cleaned_form_data)
-    queried_table = combined_table.ly.query(query)
+
+
+def execute_query(cleaned_form_data: dict[str, Any]) -> pd.DataFrame:
+    """Execute the query defined by the `DataexplorerForm`.
+
+    After validating a `DataexplorerForm` by calling ``form.is_valid()``, the cleaned
+    data is accessible as the attribute ``form.cleaned_data``. The returned dictionary
+    should be passed to this function as the ``cleaned_form_data`` argument.
+
+    The query is not executed on a table of only the selected datasets. Instead, all
+    datasets are joined into one table that is kept in memory (see
+    `cached_join_dataset_tables`). For this table, the involvement data from the
+    selected modalities is combined using the `lydata`_ function
+    `lydata.augmentor.combine_and_augment_levels` (see `cached_combine_involvement`).
+    Then, a query is created using the `lydata.querier.C` objects, including the
+    selection of datasets, and executed on the table's `BitmapIndex` (see
+    `cached_build_bitmap_index`). This yields the same result as the
+    `lydata.accessor.LyDataAccessor.query` method. Only the rows of the resulting
+    filtered dataset are copied and returned.
+
+    .. _lydata: https://lydata.readthedocs.io/stable/
+    """
+    start_time = time.perf_counter()
+    joined_table, combined_inv_table, positions = select_patients(cleaned_form_data)
+    queried_table = take_patients(joined_table, combined_inv_table, positions)
     end_time = time.perf_counter()
 
     logger.info(f"Query executed in {end_time - start_time:.2f} seconds.")
@@ -158,22 +475,156 @@ def execute_query(cleaned_form_data: dict[str, Any]) -> pd.DataFrame:
     return queried_table
 
 
-def safe_value_counts(column: pd.Series) -> dict[Any, int]:
-    """Return the value counts of a column, including missing values as ``None``.
+def iter_query_chunks(
+    cleaned_form_data: dict[str, Any],
+    chunk_size: int = 1000,
+) -> Iterator[LyDataFrame]:
+    """Execute the query like `execute_query`, but return the result in chunks.
 
-    >>> column = pd.Series(['a', 'b', 'c', np.nan, 'a', 'b', 'c', 'a', 'b', 'c'])
-    >>> safe_value_counts(column)
-    {'a': 3, 'b': 3, 'c': 3, None: 1}
+    Each yielded table has at most ``chunk_size`` rows and only these rows are copied
+    from the joined table of all datasets. At least one (possibly empty) table is
+    yielded, such that e.g. a CSV header can always be written.
     """
-    result = {}
+    joined_table, combined_inv_table, positions = select_patients(cleaned_form_data)
+
+    for start in range(0, max(len(positions), 1), chunk_size):
+        chunk_positions = positions[start : start + chunk_size]
+        yield take_patients(joined_table, combined_inv_table, chunk_positions)
+
 
-    for key, value in column.value_counts(dropna=False).to_dict().items():
-        key = key if not pd.isna(key) else None
-        result[key] = value
+def get_statistics_column(
+    table: pd.DataFrame,
+    name: str,
+    method: Literal["max_llh", "rank"] = "max_llh",
+) -> pd.Series:
+    """Return the column of the ``table`` from which the statistic ``name`` is counted.
+
+    Most statistics are named after the short codes provided by the `lydata` package.
+    The exceptions are the LNL fields (e.g. ``ipsi_II``), which are read from the
+    consensus involvement computed with ``method``, the ``datasets``, and the
+    ``is_n_plus`` field.
+    """
+    # these fields deal with the LNLs
+    if "ipsi" in name or "contra" in name:
+        side, lnl = name.split("_")
+        return table[method, side, lnl]
+
+    # key `datasets` is not a shorthand code provided by the `lydata` package
+    if name == "datasets":
+        return table[DATASET_COLUMN]
+
+    # key `is_n_plus` is not a shorthand code provided by the `lydata` package
+    if name == "is_n_plus":
+        return table.ly["n_stage"] > 0
+
+    return table.ly[name]
+
+
+def encode_column(column: pd.Series) -> tuple[np.ndarray, list[Any]]:
+    """Encode a ``column`` as integer codes and the list of values they stand for.
+
+    Missing values are encoded with the last code, which stands for ``None``. Columns
+    with the nullable ``"boolean"`` dtype are encoded without hashing, since their
+    possible values are known in advance.
+
+    >>> codes, values = encode_column(pd.Series(["a", "b", None, "a"]))
+    >>> codes, values
+    (array([0, 1, 2, 0]), ['a', 'b', None])
+    """
+    if isinstance(column.dtype, pd.BooleanDtype):
+        array = column.array
+        codes = np.where(array.isna(), 2, array.to_numpy(bool, na_value=False))
+        return codes, [False, True, None]
+
+    codes, uniques = pd.factorize(column)
+    values = [to_python_scalar(value) for value in uniques]
+
+    if np.any(is_missing := codes < 0):
+        codes[is_missing] = len(values)
+        values.append(None)
+
+    return codes, values
+
+
+def encode_statistics_table(
+    table: pd.DataFrame,
+    names: Sequence[str],
+    method: Literal["max_llh", "rank"] = "max_llh",
+) -> tuple[np.ndarray, dict[str, list[Any]]]:
+    """Encode the columns of all statistics ``names`` into one small integer matrix.
+
+    The returned matrix has one row per patient and one column per statistic. Its
+    entries are the codes returned by `encode_column` for the respective column. The
+    returned dictionary maps every statistic's name to the values the codes stand for.
+    """
+    encoded_columns, values = [], {}
+    for name in names:
+        column = get_statistics_column(table, name, method)
+        codes, values[name] = encode_column(column)
+        encoded_columns.append(codes)
+
+    max_num_values = max((len(vals) for vals in values.values()), default=1)
+    dtype = np.min_scalar_type(max_num_values)
+    encoded = np.empty(shape=(len(table), len(names)), dtype=dtype)
+    for i, codes in enumerate(encoded_columns):
+        encoded[:, i] = codes
+
+    return encoded, values
+
+
+def get_code_offsets(values: dict[str, list[Any]]) -> np.ndarray:
+    """Return the offsets that make the codes of all encoded columns unique.
+
+    The codes of the i-th column returned by `encode_statistics_table` are shifted by
+    the i-th offset, which is the number of values of all previous columns.
+
+    >>> get_code_offsets({"a": [True, False, None], "b": [1, 2], "c": ["x"]})
+    array([0, 3, 5])
+    """
+    sizes = [len(vals) for vals in values.values()]
+    return np.cumsum([0, *sizes[:-1]], dtype=np.intp)
+
+
+def decode_counts(
+    counts: np.ndarray,
+    values: dict[str, list[Any]],
+) -> dict[str, dict[Any, int]]:
+    """Turn the ``counts`` of all offset codes into value counts per statistic.
+
+    Only values that occur at least once are returned, which mirrors what
+    ``column.value_counts(dropna=False)`` returns.
+    """
+    counts = np.asarray(counts).tolist()
+    offsets = get_code_offsets(values)
+    result = {}
+    for (name, vals), offset in zip(values.items(), offsets, strict=True):
+        column_counts = counts[offset : offset + len(vals)]
+        result[name] = {
+            value: count
+            for value, count in zip(vals, column_counts, strict=True)
+            if count > 0
+        }
 
     return result
 
 
+def count_encoded_table(
+    encoded: np.ndarray,
+    values: dict[str, list[Any]],
+) -> dict[str, dict[Any, int]]:
+    """Count how often each value occurs in every column of the ``encoded`` matrix.
+
+    This shifts the codes of every column by the `get_code_offsets` such that all
+    codes of all columns are unique and then counts all of them with a single
+    `numpy.bincount` call. The counts are then split up by `decode_counts`.
+    """
+    counts = np.bincount(
+        (encoded + get_code_offsets(values)).ravel(),
+        minlength=sum(len(vals) for vals in values.values()),
+    )
+    return decode_counts(counts, values)
+
+
 KT = TypeVar("KT")
 EnsureKeysSignature = Callable[[dict[KT, int]], dict[KT, int]]
 
@@ -183,8 +634,8 @@ def make_ensure_keys_validator(keys: list[KT]) -> EnsureKeysSignature:
 
     This creates a function that can be used with pydantic's `AfterValidator` to ensure
     that all ``keys`` are present in the validated data. pydantic first receives the
-    value counts from the `safe_value_counts` function, validates it, and then calls the
-    function created by this wrapper to ensure that all keys are present.
+    value counts from the `count_encoded_table` function, validates it, and then calls
+    the function created by this wrapper to ensure that all keys are present.
     """
 
     def ensure_keys(data: dict[KT, int]) -> dict[KT, int]:
@@ -269,28 +720,19 @@ class BaseStatistics(BaseModel):
         computed from the queried table and passed to the context of the
         `dataexplorer.views`. From there, the statistics can be displayed in the
         rendered HTML or JSON response.
+
+        Instead of calling ``value_counts()`` on every column separately, all columns
+        are encoded into one small integer matrix via `encode_statistics_table` and
+        counted in a single pass by `count_encoded_table`.
         """
         start_time = time.perf_counter()
 
-        stats = {}
-        for name in cls.model_fields:
-            # these fields deal with the LNLs
-            if "ipsi" in name or "contra" in name:
-                side, lnl = name.split("_")
-                stats[name] = safe_value_counts(table[method, side, lnl])
-                continue
-
-            # key `datasets` is not a shorthand code provided by the `lydata` package
-            if name == "datasets":
-                stats[name] = safe_value_counts(table["dataset", "core", "name"])
-                continue
-
-            # key `is_n_plus` is not a shorthand code provided by the `lydata` package
-            if name == "is_n_plus":
-                stats[name] = safe_value_counts(table.ly["n_stage"] > 0)
-                continue
-
-            stats[name] = safe_value_counts(table.ly[name])
+        encoded, values = encode_statistics_table(
+            table=table,
+            names=list(cls.model_fields),
+            method=method,
+        )
+        stats = count_encoded_table(encoded, values)
 
         end_time = time.perf_counter()
         logger.info(f"Statistics computed in {end_time - start_time:.2f} seconds.")
@@ -326,3 +768,103 @@ By design, this class's fields mirror the fields of the `DataexplorerForm` class
 is obviously necessary, since any information data might be queried on is also
 information that one can compute statistics on.
 """
+
+
+@cached(
+    cache=LRUCache(maxsize=32),
+    key=lambda fingerprint, *_args, **_kwargs: fingerprint,
+    lock=Lock(),
+)
+def cached_build_count_cube(
+    fingerprint: Hashable,
+    table: pd.DataFrame,
+    combined_inv_table: pd.DataFrame,
+    method: Literal["max_llh", "rank"],
+) -> tuple[CountCube, dict[str, list[Any]]]:
+    """Build a `CountCube` of all `Statistics` fields, cached under the ``fingerprint``.
+
+    This works like `cached_build_bitmap_index`. Along with the cube, the values that
+    the codes of every statistic stand for are returned (see `decode_counts`).
+    """
+    start_time = time.perf_counter()
+    table = pd.concat([table, combined_inv_table], axis="columns")
+    encoded, values = encode_statistics_table(
+        table=table,
+        names=list(Statistics.model_fields),
+        method=method,
+    )
+    cube = CountCube.from_encoded(
+        dimensions=get_dimensions_table(table),
+        offset_codes=encoded + get_code_offsets(values),
+        num_values=sum(len(vals) for vals in values.values()),
+    )
+    end_time = time.perf_counter()
+    logger.info(f"Built {cube} in {end_time - start_time:.2f} seconds.")
+    return cube, values
+
+
+def has_lnl_query(cleaned_form: dict[str, Any]) -> bool:
+    """Check if any LNL involvement is selected in the cleaned form data."""
+    return not isinstance(get_lnl_query(cleaned_form), NoneQ)
+
+
+def compute_statistics_from_cube(cleaned_form_data: dict[str, Any]) -> BaseStatistics:
+    """Compute the `Statistics` of a query without LNL involvement from a `CountCube`.
+
+    Instead of selecting the matching patients, this selects the matching cells of
+    the cube built by `cached_build_count_cube` and sums their counts. The result is
+    the same as computing the statistics from the table returned by `execute_query`.
+    """
+    start_time = time.perf_counter()
+    method = cleaned_form_data["modality_combine"]
+    all_datasets = get_all_datasets()
+    fingerprint, joined_table, combined_inv_table = get_combined_tables(
+        cleaned_form_data, all_datasets, get_datasets_fingerprint(all_datasets)
+    )
+    cube, values = cached_build_count_cube(
+        fingerprint, joined_table, combined_inv_table, method
+    )
+    query = get_dataset_query(cleaned_form_data)
+    query &= get_risk_factor_query(cleaned_form_data)
+    stats = decode_counts(cube.count(query), values)
+    end_time = time.perf_counter()
+    logger.info(f"Statistics computed from cube in {end_time - start_time:.2f} s.")
+    return Statistics(**stats)
+
+
+@cached(
+    cache=LRUCache(maxsize=STATISTICS_CACHE_SIZE),
+    key=lambda query_key, *_args, **_kwargs: query_key,
+    lock=Lock(),
+)
+def cached_compute_statistics(
+    query_key: str,
+    cleaned_form_data: dict[str, Any],
+) -> BaseStatistics:
+    """Compute the `Statistics` of the query, cached under the ``query_key``.
+
+    If no LNL involvement is selected in the ``cleaned_form_data``, the statistics
+    are computed from the `CountCube` via `compute_statistics_from_cube`. Otherwise,
+    the query is executed and the statistics are computed from the queried table.
+    """
+    if not has_lnl_query(cleaned_form_data) and len(get_all_datasets()) > 0:
+        return compute_statistics_from_cube(cleaned_form_data)
+
+    patients = execute_query(cleaned_form_data)
+    return Statistics.from_table(
+        table=patients,
+        method=cleaned_form_data["modality_combine"],
+    )
+
+
+def compute_statistics(cleaned_form_data: dict[str, Any]) -> BaseStatistics:
+    """Return the `Statistics` of the patients matching the ``cleaned_form_data``.
+
+    This is equivalent to calling `Statistics.from_table` with the table returned by
+    `execute_query`. But the statistics are cached under the key returned by
+    `get_query_key`, so repeated dashboard queries neither execute the query nor
+    compute the statistics again.
+    """
+    datasets_fingerprint = get_datasets_fingerprint(get_all_datasets())
+    query_key = get_query_key(cleaned_form_data, datasets_fingerprint)
+    return cached_compute_statistics(query_key, cleaned_form_data)
@@ -0,0 +1,174 @@
+"""Memory-mapped columnar store of patient tables.
+
+Every gunicorn worker is a separate process. If each of them kept its own copy of the
+table of all patients (see `query.cached_join_dataset_tables`), the resident memory
+would grow linearly with the number of workers.
+
+To avoid this, the joined table is written to a directory under `PATIENT_STORE_DIR`
+with one NumPy ``.npy`` file per column array. Every worker then attaches to these
+files via `numpy.load` with ``mmap_mode="r"``. The operating system's page cache
+holds the data only once, no matter how many workers read it.
+
+The same format is used to cache the tables of the individual datasets in the
+location given by the ``DATASET_STORE_DIR`` setting (see
+`models.cached_load_dataframe`).
+
+Since NumPy cannot memory-map ``object`` arrays, the columns are stored depending on
+their dtype:
+
+- Columns with a plain NumPy dtype (e.g. ``float64`` or ``datetime64[ns]``) are stored
+  as they are.
+- Nullable columns (``"boolean"``, ``"Int64"``, ...) are stored as their data and
+  their mask of missing values.
+- Categorical columns are stored as their codes. All other columns (e.g. ``object``
+  columns of strings) are converted to categoricals first. Hence, they are loaded as
+  categorical columns again.
+
+The categories and dtypes are kept in a small manifest that is written with `joblib`.
+A store is written to a temporary directory first and then atomically renamed, so
+concurrently starting workers never see half-written stores.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import joblib
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_extension_array_dtype
+
+from lyprox.settings import PATIENT_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.joblib"
+"""Name of the file that describes the stored columns."""
+
+MASKED_ARRAY_TYPES = (
+    pd.arrays.BooleanArray,
+    pd.arrays.IntegerArray,
+    pd.arrays.FloatingArray,
+)
+"""Nullable arrays that are stored as their data and their mask of missing values."""
+
+
+def write_store(table: pd.DataFrame, directory: Path) -> None:
+    """Write the columns of the ``table`` as ``.npy`` files into the ``directory``.
+
+    The ``directory`` must already exist. See the module docstring for how the columns
+    of the different dtypes are stored.
+    """
+    entries = []
+    for i, (column_name, column) in enumerate(table.items()):
+        array = column.array
+        entry: dict[str, Any] = {"name": column_name}
+
+        if isinstance(array, MASKED_ARRAY_TYPES):
+            entry["kind"] = "masked"
+            entry["dtype"] = column.dtype
+            data = array.to_numpy(dtype=column.dtype.numpy_dtype, na_value=0)
+            np.save(directory / f"{i}_data.npy", data)
+            np.save(directory / f"{i}_mask.npy", array.isna())
+
+        elif not is_extension_array_dtype(column.dtype) and column.dtype != object:
+            entry["kind"] = "numpy"
+            np.save(directory / f"{i}_data.npy", column.to_numpy())
+
+        else:
+            categorical = (
+                array if isinstance(array, pd.Categorical) else pd.Categorical(column)
+            )
+            entry["kind"] = "categorical"
+            entry["categories"] = categorical.categories
+            entry["ordered"] = categorical.ordered
+            np.save(directory / f"{i}_codes.npy", categorical.codes)
+
+        entries.append(entry)
+
+    joblib.dump({"columns": entries, "num_rows": len(table)}, directory / MANIFEST_NAME)
+
+
+def load_store(directory: Path) -> pd.DataFrame:
+    """Load the table stored in the ``directory`` without copying its columns.
+
+    All column arrays are memory-mapped read-only. The returned table can be queried
+    and sliced as usual, but its columns cannot be modified in place.
+    """
+    manifest = joblib.load(directory / MANIFEST_NAME)
+    arrays = {}
+
+    for i, entry in enumerate(manifest["columns"]):
+        if entry["kind"] == "masked":
+            data = np.load(directory / f"{i}_data.npy", mmap_mode="r")
+            mask = np.load(directory / f"{i}_mask.npy", mmap_mode="r")
+            array_type = entry["dtype"].construct_array_type()
+            arrays[entry["name"]] = array_type(data, mask, copy=False)
+
+        elif entry["kind"] == "numpy":
+            arrays[entry["name"]] = np.load(directory / f"{i}_data.npy", mmap_mode="r")
+
+        else:
+            codes = np.load(directory / f"{i}_codes.npy", mmap_mode="r")
+            dtype = pd.CategoricalDtype(entry["categories"], entry["ordered"])
+            arrays[entry["name"]] = pd.Categorical.from_codes(codes, dtype=dtype)
+
+    table = pd.DataFrame(arrays, index=pd.RangeIndex(manifest["num_rows"]), copy=False)
+    if len(arrays) > 0:
+        table.columns = pd.MultiIndex.from_tuples(table.columns)
+    return table
+
+
+def remove_stale_stores(root: Path, keep: str) -> None:
+    """Remove all stores in the ``root`` directory, except the one named ``keep``.
+
+    Workers that still have the files of a removed store memory-mapped can keep using
+    them, because the data is only freed once the last mapping is closed.
+    """
+    for path in root.iterdir():
+        if path.is_dir() and path.name != keep and not path.name.startswith("."):
+            logger.info(f"Removing stale patient store {path}.")
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def has_store(name: str, root: Path = PATIENT_STORE_DIR) -> bool:
+    """Check if a complete store with the given ``name`` exists in ``root``."""
+    return (root / name / MANIFEST_NAME).exists()
+
+
+def get_or_create_store(
+    name: str,
+    build: Callable[[], pd.DataFrame],
+    root: Path = PATIENT_STORE_DIR,
+) -> pd.DataFrame:
+    """Load the store ``name`` from the ``root`` directory or create it first.
+
+    If no complete store with the given ``name`` exists, the table returned by
+    ``build()`` is written to a temporary directory, which is then renamed to
+    ``root / name``. If another process was faster, its store is used instead. After
+    creating a new store, all other stores in ``root`` are removed.
+    """
+    directory = root / name
+
+    if not has_store(name, root):
+        start_time = time.perf_counter()
+        root.mkdir(parents=True, exist_ok=True)
+        tmp_directory = Path(tempfile.mkdtemp(prefix=f".{name}-", dir=root))
+        write_store(build(), tmp_directory)
+
+        try:
+            os.rename(tmp_directory, directory)
+        except OSError:
+            logger.info(f"Patient store {name} was created by another process.")
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+        else:
+            remove_stale_stores(root, keep=name)
+            end_time = time.perf_counter()
+            logger.info(f"Wrote patient store in {end_time - start_time:.2f} seconds.")
+
+    return load_store(directory)
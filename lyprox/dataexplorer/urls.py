@@ -17,7 +17,7 @@ urlpatterns = [
     path("help/", views.help_view, name="help"),
 ]
 """
-Contains four URL patterns:
+Contains five URL patterns:
 
 1. The default URL pattern is an empty string (i.e.,
    ``https://lyprox.org/dataexplorer/``), which is handled by the `render_data_stats`.
@@ -30,5 +30,8 @@ Contains four URL patterns:
    request to the server.
 3. The table URL pattern is ``/table/``, which is handled by the `render_data_table`.
    It displays a (possibly filtered) `pandas.DataFrame` as HTML.
-4. The help URL pattern is ``/help/``, which is handled by the `help_view`.
+4. The download URL pattern is ``/download/``, which is handled by the
+   `make_csv_download`. It streams the (possibly filtered) patients as CSV file,
+   optionally gzip-compressed.
+5. The help URL pattern is ``/help/``, which is handled by the `help_view`.
 """
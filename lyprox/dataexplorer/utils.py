@@ -1,12 +1,14 @@
 """Utility functions for data exploration and visualization."""
 
+import html
+import itertools
 import logging
 import time
 from typing import Any
 
 import lydata.utils as lyutils
+import numpy as np
 import pandas as pd
-from pandas.io.formats.style import Styler
 from pydantic import BaseModel
 
 from lyprox.accounts.models import Institution
@@ -34,31 +36,65 @@ def split_and_capitalize(value: str) -> str:
     return " ".join([smart_capitalize(word) for word in value.split("_")])
 
 
-def map_to_cell_classes(patients: pd.DataFrame) -> pd.DataFrame:
-    """Return a class for each cell of the ``patients`` table."""
+INVOLVEMENT_CLASSES = {
+    True: "is-danger has-text-weight-bold has-text-white",
+    False: "is-success has-text-weight-bold has-text-white",
+    None: "is-info has-text-weight-bold",
+}
+"""CSS classes of the involvement cells for involved, healthy, and unknown LNLs."""
+
+COLUMN_CLASSES = {("tumor", "core", "location"): "is-wide"}
+"""CSS classes for all cells of some columns (see ``table.css``)."""
+
+COLUMNS_TO_DROP = [
+    ("patient", "#", "id"),
+    ("patient", "info", "id"),
+    ("dataset", "info", "name"),
+    # the cols above are deprecated, but may still show up in the datasets
+    ("patient", "core", "id"),
+    ("dataset", "core", "name"),
+    "total_dissected",
+    "positive_dissected",
+    "enbloc_dissected",
+    "enbloc_positive",
+]
+"""Columns that are not displayed in the table view."""
+
+MISSING = "-"
+"""String that is displayed in place of missing values."""
+
+
+def get_involvement_columns(patients: pd.DataFrame) -> list[tuple[str, str, str]]:
+    """Return the columns of the ``patients`` that contain LNL involvement."""
     consensus = "max_llh" if "max_llh" in patients.columns else "rank"
-    classes_map = pd.DataFrame().reindex_like(patients).fillna("")
     modalities = [consensus, "sonography"] + list(lyutils.get_default_modalities())
+    return [
+        column
+        for column in patients.columns
+        if column[0] in modalities and column[1] in ["ipsi", "contra"]
+    ]
+
 
-    for modality in modalities:
-        if modality not in patients:
-            continue
-        for side in ["ipsi", "contra"]:
-            classes_map[modality, side] = (
-                pd.DataFrame()
-                .reindex_like(patients[modality, side])
-                .fillna("is-danger has-text-weight-bold has-text-white")
-            )
-            classes_map[modality, side] = classes_map[modality, side].where(
-                cond=patients[modality, side] == True,  # noqa: E712
-                other="is-success has-text-weight-bold has-text-white",
-            )
-            classes_map[modality, side] = classes_map[modality, side].where(
-                cond=patients[modality, side].notna(),
-                other="is-info has-text-weight-bold",
-            )
-
-    return pd.DataFrame(classes_map, columns=patients.columns, index=patients.index)
+def get_cell_classes(patients: pd.DataFrame) -> np.ndarray:
+    """Return a 2D array with the CSS classes for each cell of the ``patients``."""
+    classes = np.full(patients.shape, "", dtype=object)
+    positions = [
+        patients.columns.get_loc(column) for column in get_involvement_columns(patients)
+    ]
+    values = patients.iloc[:, positions].to_numpy(dtype=object)
+    is_missing = pd.isna(values)
+    is_involved = np.where(is_missing, False, values).astype(bool)
+    classes[:, positions] = np.select(
+        condlist=[is_missing, is_involved],
+        choicelist=[INVOLVEMENT_CLASSES[None], INVOLVEMENT_CLASSES[True]],
+        default=INVOLVEMENT_CLASSES[False],
+    )
+
+    for column, css_class in COLUMN_CLASSES.items():
+        if column in patients.columns:
+            classes[:, patients.columns.get_loc(column)] = css_class
+
+    return classes
 
 
 def bring_consensus_col_to_left(patients: pd.DataFrame) -> pd.DataFrame:
@@ -74,69 +110,90 @@ def bring_consensus_col_to_left(patients: pd.DataFrame) -> pd.DataFrame:
     return patients[ordered_cols]
 
 
-def get_institution_shortname(value: str) -> str:
-    """Replace the institution names with their abbreviations."""
-    return Institution.objects.get(name=value).shortname
+def get_institution_shortnames() -> dict[str, str]:
+    """Map the names of all institutions to their abbreviations in one query."""
+    return dict(Institution.objects.values_list("name", "shortname"))
 
 
-def replace_nan(value: Any, replacement: str = "-") -> str:
-    """Replace NaN values with ``replacement`` in the table view."""
-    if pd.isna(value) or str(value).lower() in ["nan", "none"]:
-        return replacement
+def escape_strings(strings: np.ndarray) -> np.ndarray:
+    """HTML-escape the ``strings``, calling `html.escape` once per unique value."""
+    codes, uniques = pd.factorize(strings.ravel())
+    escaped = np.array([html.escape(value) for value in uniques], dtype=object)
+    return escaped[codes].reshape(strings.shape)
 
-    return value
 
+def format_cells(patients: pd.DataFrame, shortnames: dict[str, str]) -> np.ndarray:
+    """Return a 2D array with the escaped strings of all cells of the ``patients``.
 
-def style_table(patients: pd.DataFrame) -> Styler:
-    """Style the `pandas.DataFrame` HTML for better readability."""
+    Missing values (and strings like ``"nan"`` or ``"None"``) become `MISSING`, dates
+    are formatted as ``YYYY-MM-DD``, and institution names are replaced with their
+    ``shortnames`` (see `get_institution_shortnames`).
+    """
+    values = patients.to_numpy(dtype=object)
+    for position, (name, column) in enumerate(patients.items()):
+        if name == ("patient", "core", "institution"):
+            values[:, position] = column.map(shortnames).fillna(column)
+        elif name[-1] in ["date", "diagnose_date"]:
+            dates = pd.to_datetime(column, errors="coerce")
+            values[:, position] = dates.dt.strftime("%Y-%m-%d")
+
+    strings = values.astype(str).astype(object)
+    is_missing = pd.isna(values) | np.isin(
+        np.char.lower(strings.astype(str)), ["nan", "none"]
+    )
+    strings[is_missing] = MISSING
+    return escape_strings(strings)
+
+
+def render_header(columns: pd.MultiIndex) -> str:
+    """Render the ``columns`` as one header row per level.
+
+    Neighbouring columns that share the same name on a level (and on all levels above)
+    are merged into one header cell spanning these columns.
+    """
+    rows = []
+    for level in range(columns.nlevels):
+        prefixes = [column[: level + 1] for column in columns]
+        cells = ['<th class="blank">&nbsp;</th>']
+        for prefix, group in itertools.groupby(prefixes):
+            span = len(list(group))
+            colspan = f' colspan="{span}"' if span > 1 else ""
+            name = html.escape(split_and_capitalize(str(prefix[-1])))
+            cells.append(f'<th class="col_heading level{level}"{colspan}>{name}</th>')
+        rows.append(f"<tr>{''.join(cells)}</tr>")
+
+    return f"<thead>{''.join(rows)}</thead>"
+
+
+def render_table(patients: pd.DataFrame) -> str:
+    """Render the ``patients`` as HTML table for better readability.
+
+    The strings and CSS classes of all cells are computed as 2D arrays at once (see
+    `format_cells` and `get_cell_classes`) and institution names are resolved from a
+    single database query. The table is then assembled from these arrays directly,
+    without any per-cell Python formatters. The first column holds the row index and
+    is sticky (see ``table.css``).
+    """
     start_time = time.perf_counter()
     patients = bring_consensus_col_to_left(patients)
-    cols_to_drop = [
-        ("patient", "#", "id"),
-        ("patient", "info", "id"),
-        ("dataset", "info", "name"),
-        # the cols above are deprecated, but may still show up in the datasets
-        ("patient", "core", "id"),
-        ("patient", "core", "id"),
-        ("dataset", "core", "name"),
-        ("total_dissected"),
-        ("positive_dissected"),
-        ("enbloc_dissected"),
-        ("enbloc_positive"),
+    patients = patients.drop(columns=COLUMNS_TO_DROP, errors="ignore")
+    row_headings = patients.index.to_numpy().astype(str).astype(object)
+    headings = '<th class="row_heading">' + escape_strings(row_headings) + "</th>"
+    strings = format_cells(patients, shortnames=get_institution_shortnames())
+    cells = '<td class="' + get_cell_classes(patients) + '">' + strings + "</td>"
+    rows = [
+        f"<tr>{heading}{''.join(row)}</tr>"
+        for heading, row in zip(headings, cells, strict=True)
     ]
     result = (
-        patients.drop(columns=cols_to_drop, errors="ignore")
-        .style.format_index(
-            formatter=split_and_capitalize,
-            level=[0, 1, 2],
-            axis=1,
-        )
-        .format(
-            formatter=replace_nan,
-        )
-        .format(
-            formatter=get_institution_shortname,
-            subset=[("patient", "core", "institution")],
-        )
-        .format(
-            formatter=lambda d: d.strftime("%Y-%m-%d") if pd.notna(d) else "-",
-            subset=[
-                (modality, "core", "date")
-                for modality in lyutils.get_default_modalities()
-            ]
-            + [("patient", "core", "diagnose_date")],
-        )
-        .set_sticky(axis="index")
-        .set_table_attributes("class='table'")
-        .set_td_classes(map_to_cell_classes(patients))
-        .set_properties(
-            **{"min-width": "6rem"},
-            subset=[("tumor", "core", "location")],
-        )
+        '<table class="table patients-table">'
+        f"{render_header(patients.columns)}"
+        f"<tbody>{''.join(rows)}</tbody>"
+        "</table>"
     )
     stop_time = time.perf_counter()
     logger.info(
-        f"Styling the table took {stop_time - start_time:.2f} seconds. "
+        f"Rendering the table took {stop_time - start_time:.4f} seconds. "
         f"Number of rows: {len(patients)}",
     )
     return result
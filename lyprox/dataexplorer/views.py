@@ -20,8 +20,9 @@ the updated queries from the user. The form is validated and cleaned (using
 that match the query.
 
 From the returned queried patients, the `Statistics` class is used to compute the
-statistics, which are then returned as JSON data to the frontend. The frontend then
-updates the dashboard with the new statistics without reloading the entire page.
+statistics (see `compute_statistics`, which also caches them), which are then
+returned as JSON data to the frontend. The frontend then updates the dashboard with
+the new statistics without reloading the entire page.
 
 Read more about how views work in Django, what responses they return and how to use
 the context they may provide in the `Django documentation`_.
@@ -32,20 +33,37 @@ the context they may provide in the `Django documentation`_.
 
 import json
 import logging
+import zlib
+from collections.abc import Iterable, Iterator
+from typing import Any
 
-import pandas as pd
 from django.core.paginator import Paginator
 from django.http import HttpRequest, HttpResponseBadRequest
-from django.http.response import HttpResponse, JsonResponse
+from django.http.response import (
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import render
 from lydata.utils import get_default_modalities
 
 from lyprox.dataexplorer.forms import DataexplorerForm
-from lyprox.dataexplorer.query import Statistics, execute_query
-from lyprox.dataexplorer.utils import style_table
+from lyprox.dataexplorer.query import (
+    compute_statistics,
+    iter_query_chunks,
+    select_patients,
+    take_patients,
+)
+from lyprox.dataexplorer.utils import render_table
 
 logger = logging.getLogger(__name__)
 
+DOWNLOAD_CHUNK_SIZE = 1000
+"""Number of patients that are serialized at once when streaming a download."""
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+"""Window bits that make `zlib.compressobj` write a gzip header and trailer."""
+
 
 def help_view(request) -> HttpResponse:
     """Simply display the dashboard help text."""
@@ -54,11 +72,8 @@ def help_view(request) -> HttpResponse:
     return render(request, template_name, context)
 
 
-FormAndPatients = tuple[DataexplorerForm, pd.DataFrame]
-
-
-def _get_form_and_patients_from_request(request: HttpRequest) -> FormAndPatients:
-    """Prepare the form from the request and execute the query."""
+def _get_form_from_request(request: HttpRequest) -> DataexplorerForm:
+    """Prepare the form from the request, falling back to the initial form data."""
     request_data = request.GET
     form = DataexplorerForm(request_data, user=request.user)
 
@@ -72,7 +87,7 @@ def _get_form_and_patients_from_request(request: HttpRequest) -> FormAndPatients
         )
         return HttpResponseBadRequest("Form is not valid.")
 
-    return form, execute_query(cleaned_form_data=form.cleaned_data)
+    return form
 
 
 def render_data_stats(request: HttpRequest) -> HttpResponse:
@@ -85,17 +100,15 @@ def render_data_stats(request: HttpRequest) -> HttpResponse:
     The view creates a `DataexplorerForm` instance with the data from a GET request or
     with the default initial values. It then calls `execute_query` with
     ``form.cleaned_data`` and returns the `Statistics` ``from_dataset()`` using the
-    queried dataset to the frontend.
+    queried dataset to the frontend. Both steps are done by `compute_statistics`,
+    which caches the statistics of previously seen queries.
     """
-    form, patients = _get_form_and_patients_from_request(request)
+    form = _get_form_from_request(request)
 
     context = {
         "form": form,
         "modalities": get_default_modalities(),
-        "stats": Statistics.from_table(
-            table=patients,
-            method=form.cleaned_data["modality_combine"],
-        ),
+        "stats": compute_statistics(cleaned_form_data=form.cleaned_data),
     }
 
     return render(request, "dataexplorer/layout.html", context)
@@ -124,22 +137,27 @@ def update_data_stats(request: HttpRequest) -> JsonResponse:
         logger.error("Form is not valid.")
         return JsonResponse(data={"error": "Something went wrong."}, status=400)
 
-    patients = execute_query(cleaned_form_data=form.cleaned_data)
-    stats = Statistics.from_table(
-        table=patients,
-        method=form.cleaned_data["modality_combine"],
-    ).model_dump()
+    stats = compute_statistics(cleaned_form_data=form.cleaned_data).model_dump()
     stats["type"] = "stats"
     return JsonResponse(data=stats)
 
 
 def render_data_table(request: HttpRequest, page_idx: int) -> HttpResponse:
-    """Render the `pandas.DataFrame` currently displayed in the dashboard."""
-    _, patients = _get_form_and_patients_from_request(request)
-    patients["tumor", "core", "extension"] = patients.ly.midext.astype("boolean")
+    """Render the `pandas.DataFrame` currently displayed in the dashboard.
+
+    Only the positions of the selected patients are paginated (see
+    `select_patients`), which are cached for the query. The rows of the requested page
+    are then copied from the joined table of all datasets (see `take_patients`), such
+    that paging through a large selection costs the same for every page.
+    """
+    form = _get_form_from_request(request)
+    tables_and_positions = select_patients(cleaned_form_data=form.cleaned_data)
+    joined_table, combined_inv_table, positions = tables_and_positions
 
-    paginator = Paginator(object_list=patients, per_page=15)
+    paginator = Paginator(object_list=positions, per_page=15)
     page = paginator.get_page(page_idx)
+    patients = take_patients(joined_table, combined_inv_table, page.object_list)
+    patients["tumor", "core", "extension"] = patients.ly.midext.astype("boolean")
 
     return render(
         request=request,
@@ -149,19 +167,47 @@ def render_data_table(request: HttpRequest, page_idx: int) -> HttpResponse:
             "previous_range": range(1, page.number),
             "next_range": range(page.number + 1, paginator.num_pages + 1),
             "num_next_pages": paginator.num_pages - page.number,
-            "table": style_table(page.object_list).to_html(),
+            "table": render_table(patients),
         },
     )
 
 
-def make_csv_download(request: HttpRequest) -> HttpResponse:
-    """Return a CSV file with the selected patients."""
-    _, patients = _get_form_and_patients_from_request(request)
+def _iter_csv_chunks(cleaned_form_data: dict[str, Any]) -> Iterator[bytes]:
+    """Serialize the queried patients to CSV, one chunk of rows at a time."""
+    chunks = iter_query_chunks(cleaned_form_data, chunk_size=DOWNLOAD_CHUNK_SIZE)
+    for i, chunk in enumerate(chunks):
+        yield chunk.to_csv(index=False, header=(i == 0)).encode()
 
-    return HttpResponse(
-        patients.to_csv(index=False),
-        content_type="text/csv",
-        headers={
-            "Content-Disposition": 'attachment; filename="patients.csv"',
-        },
+
+def _gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a stream of byte ``chunks`` into a stream of gzip data."""
+    compressor = zlib.compressobj(wbits=GZIP_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
+def make_csv_download(request: HttpRequest) -> StreamingHttpResponse:
+    """Stream a CSV file with the selected patients.
+
+    The CSV is serialized in chunks of `DOWNLOAD_CHUNK_SIZE` rows (see
+    `iter_query_chunks`), such that the server starts sending data right away and
+    never holds the entire CSV in memory. If the request contains the GET parameter
+    ``compression=gzip``, the stream is gzip-compressed.
+    """
+    form = _get_form_from_request(request)
+    content = _iter_csv_chunks(form.cleaned_data)
+    filename = "patients.csv"
+
+    if request.GET.get("compression") == "gzip":
+        content = _gzip_stream(content)
+        filename += ".gz"
+
+    return StreamingHttpResponse(
+        content,
+        content_type="text/csv" if filename.endswith(".csv") else "application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
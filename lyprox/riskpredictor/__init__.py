@@ -28,7 +28,8 @@ What happens in this "little" app now, is that one defines where it should look
 the YAML files that define a model and a sampling pipeline. This definition is stored
 as a `CheckpointModel` in the `SQLite`_ database. From instances of this class, one
 can then validate the config files, fetch the samples from the remote storage using
-`DVC`_, and precompute prior state distributions from the trained model. See the docs
+`DVC`_, and precompute prior state distributions from the trained model (for all
+samples at once, see the `priors` module). See the docs
 of the `CheckpointModel` for a list of all the available methods and how they cache
 their intermediate results using `joblib`.
 
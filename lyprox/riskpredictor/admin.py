@@ -1,8 +1,9 @@
-"""Boilerplate code to register the CheckpointModel with the Django admin interface."""
+"""Boilerplate code to register the models with the Django admin interface."""
 
 from django.contrib import admin
 
-from .models import CheckpointModel
+from .models import CheckpointModel, PrecomputeJob
 
 # Register your models here.
 admin.site.register(CheckpointModel)
+admin.site.register(PrecomputeJob)
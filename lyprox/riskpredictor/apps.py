@@ -1,6 +1,16 @@
-"""Boilerplate Django configuration for the riskpredictor app."""
+"""Boilerplate Django configuration for the riskpredictor app.
+
+When the app is ready, its `RiskConfig.ready` method connects the
+`registry.evict_checkpoint_receiver` to the signals that are sent when a
+`models.CheckpointModel` is saved or deleted. This way, models, samples, and priors of
+outdated checkpoints are dropped from memory. It also connects the
+`jobs.queue_precompute_receiver`, such that the priors of a saved checkpoint are
+precomputed in the background, and the `store.remove_priors_receiver`, which removes
+the stored priors of deleted checkpoints.
+"""
 
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class RiskConfig(AppConfig):
@@ -9,3 +19,32 @@ class RiskConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "lyprox.riskpredictor"
     add_to_navbar = True
+
+    def ready(self) -> None:
+        """Connect the receivers of the signals for saved and deleted checkpoints."""
+        from lyprox.riskpredictor.jobs import queue_precompute_receiver
+        from lyprox.riskpredictor.models import CheckpointModel
+        from lyprox.riskpredictor.registry import evict_checkpoint_receiver
+        from lyprox.riskpredictor.store import remove_priors_receiver
+
+        post_save.connect(
+            evict_checkpoint_receiver,
+            sender=CheckpointModel,
+            dispatch_uid="evict_checkpoint_on_save",
+        )
+        post_delete.connect(
+            evict_checkpoint_receiver,
+            sender=CheckpointModel,
+            dispatch_uid="evict_checkpoint_on_delete",
+        )
+        # connected after the eviction, such that jobs run inline fill a clean registry
+        post_save.connect(
+            queue_precompute_receiver,
+            sender=CheckpointModel,
+            dispatch_uid="queue_precompute_on_save",
+        )
+        post_delete.connect(
+            remove_priors_receiver,
+            sender=CheckpointModel,
+            dispatch_uid="remove_priors_on_delete",
+        )
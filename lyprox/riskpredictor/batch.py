@@ -0,0 +1,226 @@
+"""Score the risks of whole cohorts of diagnoses for one `CheckpointModel`.
+
+The dashboard computes the risks of one diagnosis at a time. To audit treatment
+decisions for entire cohorts, the functions in this module take many diagnoses, read
+from JSON lines (see `read_jsonl`) or CSV (see `read_csv`), and return the mean and
+standard deviation of the risk of every LNL for each of them.
+
+Every row is validated by the `RiskpredictorForm`, with missing fields taking their
+initial values from the dashboard. The valid diagnoses of a chunk are then grouped by
+T-stage, midline extension, and (quantized) specificity and sensitivity, since these
+determine the priors and the observation matrices. The risks of every group are
+computed with stacked array operations (see `predict.compute_stacked_risk_stats`).
+Results are produced chunk by chunk, such that they can be streamed back (see
+`iter_scored_chunks` and `serialize_chunk`).
+"""
+
+import csv
+import itertools
+import json
+import logging
+import time
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from typing import Any, NamedTuple
+
+import numpy as np
+from lymph.types import Model
+from lyscripts.configs import DiagnosisConfig
+
+from lyprox.riskpredictor.forms import RiskpredictorForm
+from lyprox.riskpredictor.models import CheckpointModel
+from lyprox.riskpredictor.predict import (
+    RISKS_DECIMALS,
+    assemble_diagnosis,
+    compute_side_likelihoods,
+    compute_stacked_risk_stats,
+    select_midext_priors,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_CHUNK_SIZE = 1000
+"""Number of diagnoses that are validated, scored, and returned together."""
+
+BATCH_MAX_BYTES = 64 * 1024**2
+"""Maximum number of bytes of the intermediate arrays in one stacked operation."""
+
+BATCH_MAX_ROWS = 10_000
+"""Maximum number of diagnoses that may be sent to `views.batch_risk_prediction`."""
+
+
+class GroupKey(NamedTuple):
+    """Everything except the LNL involvement that the risks of a diagnosis depend on."""
+
+    t_stage: str | int
+    midext: bool | None
+    specificity: float
+    sensitivity: float
+
+
+def read_jsonl(lines: Iterable[str | bytes]) -> Iterator[dict[str, Any]]:
+    """Parse one diagnosis per non-empty line of JSON.
+
+    >>> list(read_jsonl(['{"ipsi_II": true, "t_stage": "early"}', ""]))
+    [{'ipsi_II': True, 't_stage': 'early'}]
+    """
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(lines: Iterable[str]) -> Iterator[dict[str, Any]]:
+    """Parse one diagnosis per row of a CSV with a header.
+
+    The involvement must be given as ``True``, ``False``, or ``None`` (or an empty
+    cell), which is what the `ThreeWayToggle` fields of the form accept.
+
+    >>> list(read_csv(["id,ipsi_II,ipsi_III", "a,True,"]))
+    [{'id': 'a', 'ipsi_II': 'True', 'ipsi_III': ''}]
+    """
+    yield from csv.DictReader(lines)
+
+
+def compute_risk_stats_in_batches(
+    model: Model,
+    priors: np.ndarray,
+    side_likelihoods: list[np.ndarray],
+) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """Call `predict.compute_stacked_risk_stats` on batches of the ``side_likelihoods``.
+
+    The batches are chosen such that the intermediate arrays do not exceed
+    `BATCH_MAX_BYTES`. The returned mean and std have one row per likelihood.
+    """
+    num_states = sum(likelihoods.shape[1] for likelihoods in side_likelihoods)
+    bytes_per_likelihood = 2 * len(priors) * num_states * priors.itemsize
+    batch_size = max(1, BATCH_MAX_BYTES // bytes_per_likelihood)
+    num_likelihoods = len(side_likelihoods[0])
+    means, stds = [], []
+
+    for start in range(0, num_likelihoods, batch_size):
+        keys, mean, std = compute_stacked_risk_stats(
+            model=model,
+            priors=priors,
+            side_likelihoods=[
+                likelihoods[start : start + batch_size]
+                for likelihoods in side_likelihoods
+            ],
+        )
+        means.append(mean)
+        stds.append(std)
+
+    return keys, np.concatenate(means), np.concatenate(stds)
+
+
+def compute_group_risks(
+    model: Model,
+    priors: np.ndarray,
+    diagnoses: list[DiagnosisConfig],
+    key: GroupKey,
+) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """Compute the risk stats of all ``diagnoses`` that share the same group ``key``.
+
+    The ``priors`` must belong to the ``key``'s T-stage. The likelihoods of all
+    ``diagnoses`` are stacked per side and passed to `compute_risk_stats_in_batches`.
+    """
+    priors = select_midext_priors(priors=priors, midext=key.midext)
+    likelihoods_per_diagnosis = [
+        compute_side_likelihoods(
+            model=model,
+            diagnosis=diagnosis,
+            specificity=key.specificity,
+            sensitivity=key.sensitivity,
+        )
+        for diagnosis in diagnoses
+    ]
+    side_likelihoods = [
+        np.stack(likelihoods)
+        for likelihoods in zip(*likelihoods_per_diagnosis, strict=True)
+    ]
+    return compute_risk_stats_in_batches(model, priors, side_likelihoods)
+
+
+def score_chunk(
+    checkpoint: CheckpointModel,
+    rows: list[tuple[int, dict[str, Any]]],
+    initial_data: dict[str, Any],
+    lnls: list[str],
+) -> list[dict[str, Any]]:
+    """Validate and score a chunk of enumerated ``rows``.
+
+    Every result contains the row's ``id`` (or its index, if it has none). Invalid
+    rows get the form's ``errors``, valid rows get a ``{"mean": ..., "std": ...}``
+    dictionary for every key like ``ipsi_II``. The results are in the same order as
+    the ``rows``.
+    """
+    model = checkpoint.construct_model()
+    results = {}
+    groups = defaultdict(list)
+
+    for index, row in rows:
+        results[index] = {"id": row.get("id", index)}
+        form = RiskpredictorForm({**initial_data, **row}, checkpoint=checkpoint)
+        if not form.is_valid():
+            results[index]["errors"] = form.errors.get_json_data()
+            continue
+
+        form_data = form.cleaned_data
+        key = GroupKey(
+            t_stage=form_data["t_stage"],
+            midext=form_data.get("midext"),
+            specificity=round(form_data["specificity"], RISKS_DECIMALS),
+            sensitivity=round(form_data["sensitivity"], RISKS_DECIMALS),
+        )
+        groups[key].append((index, assemble_diagnosis(form_data, lnls=lnls)))
+
+    for key, members in groups.items():
+        indices, diagnoses = zip(*members, strict=True)
+        keys, means, stds = compute_group_risks(
+            model=model,
+            priors=checkpoint.compute_priors(t_stage=key.t_stage),
+            diagnoses=list(diagnoses),
+            key=key,
+        )
+        for index, mean, std in zip(indices, means, stds, strict=True):
+            for risk_key, risk_mean, risk_std in zip(keys, mean, std, strict=True):
+                results[index][risk_key] = {
+                    "mean": float(risk_mean),
+                    "std": float(risk_std),
+                }
+
+    return [results[index] for index, _ in rows]
+
+
+def iter_scored_chunks(
+    checkpoint: CheckpointModel,
+    rows: Iterable[dict[str, Any]],
+    chunk_size: int = BATCH_CHUNK_SIZE,
+) -> Iterator[list[dict[str, Any]]]:
+    """Score the diagnoses in ``rows`` and yield the results in chunks.
+
+    The ``rows`` are consumed lazily, ``chunk_size`` at a time, and each chunk is
+    scored with `score_chunk`.
+    """
+    initial_form = RiskpredictorForm.from_initial(checkpoint=checkpoint)
+    initial_data = initial_form.data
+    lnls = list(initial_form.get_lnls())
+    enumerated_rows = enumerate(rows)
+
+    while chunk := list(itertools.islice(enumerated_rows, chunk_size)):
+        start_time = time.perf_counter()
+        results = score_chunk(checkpoint, chunk, initial_data=initial_data, lnls=lnls)
+        end_time = time.perf_counter()
+        logger.info(
+            f"Scored {len(chunk)} diagnoses for {checkpoint} "
+            f"in {end_time - start_time:.2f} seconds."
+        )
+        yield results
+
+
+def serialize_chunk(results: list[dict[str, Any]]) -> str:
+    r"""Serialize a chunk of results to JSON lines.
+
+    >>> serialize_chunk([{"id": 0}, {"id": 1}])
+    '{"id": 0}\n{"id": 1}\n'
+    """
+    return "".join(json.dumps(result) + "\n" for result in results)
@@ -0,0 +1,139 @@
+"""Compare the risks of one diagnosis under several `CheckpointModel` instances.
+
+Researchers often want to know how the risks of the same diagnosis differ between
+checkpoints, e.g. between different ``ref`` values of the same lynference repository.
+`compute_comparison_payload` validates the diagnosis against every checkpoint's
+`RiskpredictorForm` (with missing fields taking their initial values, like in
+`batch.iter_scored_chunks`) and gets each checkpoint's risks via
+`predict.get_risks_payload` in a shared pool of ``COMPARE_MAX_WORKERS`` threads (see
+`get_executor`).
+
+Threads are used instead of processes, because the constructed models, the
+memory-mapped priors, and the computed risks are kept in this process's `registry`.
+So, every checkpoint that was already used in this process is scored from warm
+caches, and the matrix products of `predict.compute_risks` release the GIL. The result
+is one table that is aligned by the keys of the LNLs (see `align_payloads`).
+"""
+
+import functools
+import logging
+import time
+from concurrent import futures
+from typing import Any
+
+from lyprox.riskpredictor import predict
+from lyprox.riskpredictor.forms import RiskpredictorForm
+from lyprox.riskpredictor.models import CheckpointModel
+from lyprox.settings import COMPARE_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+COMPARE_MAX_CHECKPOINTS = 10
+"""Maximum number of checkpoints that may be sent to `views.compare_risk_prediction`."""
+
+
+@functools.cache
+def get_executor() -> futures.ThreadPoolExecutor:
+    """Return the pool of ``COMPARE_MAX_WORKERS`` threads, created on first use."""
+    return futures.ThreadPoolExecutor(
+        max_workers=COMPARE_MAX_WORKERS,
+        thread_name_prefix="compare",
+    )
+
+
+def validate_diagnosis(
+    checkpoint: CheckpointModel,
+    diagnosis: dict[str, Any],
+) -> RiskpredictorForm:
+    """Validate the ``diagnosis`` against the ``checkpoint``'s form.
+
+    Fields that are missing in the ``diagnosis`` take their initial values. Fields for
+    LNLs that the ``checkpoint``'s model does not have are ignored.
+    """
+    initial_data = RiskpredictorForm.from_initial(checkpoint=checkpoint).data
+    return RiskpredictorForm({**initial_data, **diagnosis}, checkpoint=checkpoint)
+
+
+def align_payloads(
+    payloads: list[dict[str, dict] | None],
+) -> dict[str, list[dict[str, float] | None]]:
+    """Align the risks ``payloads`` of several checkpoints by the keys of the LNLs.
+
+    Every key (like ``ipsi_II``) maps to one ``{"mean": ..., "std": ...}`` entry per
+    payload. It is ``None`` where the payload is missing or lacks the key. The keys
+    are sorted by their first appearance in the ``payloads``.
+
+    >>> align_payloads([{"ipsi_II": {True: 20., None: 10., False: 70.}}, None])
+    {'ipsi_II': [{'mean': 25.0, 'std': 10.0}, None]}
+    """
+    keys = [key for payload in payloads if payload is not None for key in payload]
+    keys = list(dict.fromkeys(keys))
+    table = {key: [] for key in keys}
+
+    for payload in payloads:
+        for key in keys:
+            if payload is None or key not in payload:
+                table[key].append(None)
+                continue
+
+            stats = payload[key]
+            table[key].append(
+                {"mean": stats[True] + stats[None] / 2, "std": stats[None]},
+            )
+
+    return table
+
+
+def get_risks_payload(kwargs: dict[str, Any]) -> dict[str, dict]:
+    """Call `predict.get_risks_payload` with the ``kwargs`` of one checkpoint."""
+    return predict.get_risks_payload(**kwargs)
+
+
+def compute_comparison_payload(
+    checkpoints: list[CheckpointModel],
+    diagnosis: dict[str, Any],
+) -> dict[str, Any]:
+    """Compute the risks of the ``diagnosis`` under every one of the ``checkpoints``.
+
+    Returns the ``checkpoints`` (with an ``error`` for those that are not ready or for
+    which the ``diagnosis`` is invalid) and the risks of every LNL, aligned with them
+    by `align_payloads`. If ``COMPARE_MAX_WORKERS`` is one or less, the risks are
+    computed one after the other in this thread.
+    """
+    start_time = time.perf_counter()
+    columns, tasks = [], {}
+
+    for i, checkpoint in enumerate(checkpoints):
+        column = {"pk": checkpoint.pk, "name": str(checkpoint), "ref": checkpoint.ref}
+        columns.append(column)
+
+        if not checkpoint.is_ready:
+            column["error"] = f"Model is not ready ({checkpoint.status})."
+            continue
+
+        form = validate_diagnosis(checkpoint, diagnosis)
+        if not form.is_valid():
+            column["error"] = form.errors.get_json_data()
+            continue
+
+        tasks[i] = {
+            "checkpoint": checkpoint,
+            "form_data": form.cleaned_data,
+            "lnls": list(form.get_lnls()),
+        }
+
+    if COMPARE_MAX_WORKERS > 1 and len(tasks) > 1:
+        results = get_executor().map(get_risks_payload, tasks.values())
+    else:
+        results = map(get_risks_payload, tasks.values())
+
+    payloads = [None] * len(checkpoints)
+    for i, payload in zip(tasks, results, strict=True):
+        payloads[i] = payload
+
+    end_time = time.perf_counter()
+    logger.info(
+        f"Compared the risks of {len(checkpoints)} checkpoints "
+        f"in {end_time - start_time:.2f} seconds."
+    )
+    return {"checkpoints": columns, "risks": align_payloads(payloads)}
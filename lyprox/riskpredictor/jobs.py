@@ -0,0 +1,268 @@
+"""Precompute everything a saved `CheckpointModel` needs in background processes.
+
+Fetching the samples of a checkpoint from the DVC remote and computing its priors for
+every T-stage may take minutes. Instead of doing this while the checkpoint is saved
+(which blocked the `views.AddCheckpointModelView` and the ``add_riskmodels`` command),
+a saved checkpoint is marked as ``"warming"``. The `queue_precompute_receiver`, which
+is connected in `apps.RiskConfig.ready`, then creates a `PrecomputeJob` in the
+database. Once the transaction that saved the checkpoint is committed, the job is
+submitted to a local pool of ``PRECOMPUTE_MAX_WORKERS`` processes (see
+`get_executor`).
+
+The job runs through the `PRECOMPUTE_STEPS` and records its progress in the database,
+where the `views.ChooseCheckpointModelView` reads it. At the end, it marks the
+checkpoint as ``"ready"`` (or ``"failed"``). Since all results are cached on disk
+(by `joblib` and in the ``SAMPLES_STORE_DIR``), every web worker can then use them.
+Until then, the views of the dashboard report that the checkpoint is not ready,
+instead of starting a cold computation inside a request.
+
+The jobs of different checkpoints run in parallel. The priors of all T-stages of one
+checkpoint are computed together in one step, because the stacked evolution of the
+samples is shared by all T-stages (see `priors.compute_stacked_priors`).
+
+A gunicorn worker that is recycled gracefully waits for the jobs it submitted. But if
+the server is stopped or a worker is killed, their jobs stay ``"queued"`` or
+``"running"``. Once the server is ready, gunicorn runs the ``resume_precompute``
+command in the background, which queues new jobs for these checkpoints (see
+`resume_precompute_jobs`) while the site already serves requests. If the pool of a
+worker breaks (e.g. because a process ran out of memory), its jobs are marked as
+failed and a new pool is created for the next job.
+"""
+
+import functools
+import logging
+import multiprocessing
+import time
+from collections.abc import Callable
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from threading import Condition, Lock
+from typing import Any
+
+import django
+from django.db import transaction
+from django.utils import timezone
+
+from lyprox.riskpredictor import registry
+from lyprox.riskpredictor.models import CheckpointModel, PrecomputeJob
+from lyprox.settings import PRECOMPUTE_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTE_STEPS: list[tuple[str, Callable[[CheckpointModel], Any]]] = [
+    ("fetch configs", CheckpointModel.validate_configs),
+    ("construct model", CheckpointModel.construct_model),
+    ("fetch samples", CheckpointModel.fetch_samples),
+    ("compute priors", CheckpointModel.precompute_priors),
+]
+"""Names and methods of the steps a `PrecomputeJob` runs through."""
+
+PENDING_FUTURES: set[futures.Future] = set()
+"""Futures of the submitted jobs that are not done yet."""
+
+EXECUTOR: futures.ProcessPoolExecutor | None = None
+"""Pool of processes that run the jobs, created on first use (see `get_executor`)."""
+
+EXECUTOR_LOCK = Lock()
+"""Lock that guards the `EXECUTOR` and the `PENDING_FUTURES`."""
+
+JOBS_DONE = Condition(EXECUTOR_LOCK)
+"""Condition that is notified whenever a job is removed from the `PENDING_FUTURES`."""
+
+
+def get_executor() -> futures.ProcessPoolExecutor:
+    """Return the pool of ``PRECOMPUTE_MAX_WORKERS`` processes, created on first use.
+
+    The processes are spawned instead of forked, because the web workers run threads
+    (e.g. those of `compare.get_executor`) that may hold locks while forking. Every
+    process sets up Django before it imports this module to run a job. Must be called
+    while holding the `EXECUTOR_LOCK`.
+    """
+    global EXECUTOR
+    if EXECUTOR is None:
+        EXECUTOR = futures.ProcessPoolExecutor(
+            max_workers=PRECOMPUTE_MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+
+    return EXECUTOR
+
+
+def finish_job(job_pk: int, status: str, **fields: Any) -> None:
+    """Record the final ``status`` and other ``fields`` of the job ``job_pk``.
+
+    The job's checkpoint is marked as ready or failed accordingly, but only if no newer
+    job has been queued for it in the meantime (e.g. because it was saved again).
+    """
+    job = PrecomputeJob.objects.get(pk=job_pk)
+    PrecomputeJob.objects.filter(pk=job_pk).update(
+        status=status,
+        finished=timezone.now(),
+        **fields,
+    )
+    if status == PrecomputeJob.Status.DONE:
+        checkpoint_status = CheckpointModel.Status.READY
+    else:
+        checkpoint_status = CheckpointModel.Status.FAILED
+
+    if not PrecomputeJob.objects.filter(
+        checkpoint_id=job.checkpoint_id,
+        pk__gt=job_pk,
+    ).exists():
+        checkpoint_query = CheckpointModel.objects.filter(pk=job.checkpoint_id)
+        checkpoint_query.update(status=checkpoint_status)
+
+
+def run_precompute_job(job_pk: int, evict: bool = False) -> str:
+    """Run the `PrecomputeJob` with primary key ``job_pk`` and return its status.
+
+    Every step of the `PRECOMPUTE_STEPS` is recorded in the job, such that other
+    processes can follow its progress. Errors are recorded instead of being raised.
+    At the end, the job and its checkpoint are updated by `finish_job`.
+
+    If ``evict`` is set, the results are dropped from this process's `registry`
+    afterwards. This is done in the pool's workers, which never serve requests.
+    """
+    start_time = time.perf_counter()
+    job = PrecomputeJob.objects.select_related("checkpoint").get(pk=job_pk)
+    checkpoint = job.checkpoint
+    job_query = PrecomputeJob.objects.filter(pk=job_pk)
+
+    try:
+        for num_steps_done, (step, method) in enumerate(PRECOMPUTE_STEPS):
+            job_query.update(
+                status=PrecomputeJob.Status.RUNNING,
+                step=step,
+                num_steps_done=num_steps_done,
+            )
+            method(checkpoint)
+    except Exception as exc:
+        logger.exception(f"{job} failed in step '{step}'.")
+        status = PrecomputeJob.Status.FAILED
+        finish_job(job_pk, status, error=f"{type(exc).__name__}: {exc}")
+    else:
+        status = PrecomputeJob.Status.DONE
+        finish_job(job_pk, status, step="", num_steps_done=len(PRECOMPUTE_STEPS))
+    finally:
+        if evict:
+            registry.evict_checkpoint(pk=checkpoint.pk)
+
+    end_time = time.perf_counter()
+    logger.info(f"Ran {job} in {end_time - start_time:.2f} seconds: {status}.")
+    return status
+
+
+def submit_precompute_job(job_pk: int) -> futures.Future:
+    """Submit the `PrecomputeJob` with primary key ``job_pk`` to the pool."""
+    with EXECUTOR_LOCK:
+        future = get_executor().submit(run_precompute_job, job_pk, evict=True)
+        PENDING_FUTURES.add(future)
+
+    future.add_done_callback(functools.partial(discard_future, job_pk))
+    logger.info(f"Submitted PrecomputeJob {job_pk} to the pool.")
+    return future
+
+
+def discard_future(job_pk: int, future: futures.Future) -> None:
+    """Remove a done ``future`` from the `PENDING_FUTURES`.
+
+    If the pool broke while running the job with primary key ``job_pk``, the job is
+    marked as failed and the pool is dropped, such that the next job gets a new one.
+    """
+    global EXECUTOR
+    exc = future.exception()
+    if isinstance(exc, BrokenProcessPool):
+        logger.error(f"Pool broke while running PrecomputeJob {job_pk}: {exc}")
+        with EXECUTOR_LOCK:
+            EXECUTOR = None
+
+        error = f"BrokenProcessPool: {exc}"
+        finish_job(job_pk, PrecomputeJob.Status.FAILED, error=error)
+
+    with JOBS_DONE:
+        PENDING_FUTURES.discard(future)
+        JOBS_DONE.notify_all()
+
+
+def wait_for_jobs(timeout: float | None = None) -> None:
+    """Wait until all jobs submitted by this process are done and recorded."""
+    with JOBS_DONE:
+        JOBS_DONE.wait_for(lambda: not PENDING_FUTURES, timeout=timeout)
+
+
+def queue_precompute_job(checkpoint: CheckpointModel) -> PrecomputeJob:
+    """Create a `PrecomputeJob` for the ``checkpoint`` and submit it to the pool.
+
+    The job is submitted once the current transaction is committed, such that the
+    worker finds it in the database. If ``PRECOMPUTE_MAX_WORKERS`` is zero, the job is
+    run right away in this process instead.
+    """
+    job = PrecomputeJob.objects.create(
+        checkpoint=checkpoint,
+        num_steps=len(PRECOMPUTE_STEPS),
+    )
+    if PRECOMPUTE_MAX_WORKERS == 0:
+        run_precompute_job(job.pk)
+        checkpoint.refresh_from_db(fields=["status"])
+    else:
+        transaction.on_commit(functools.partial(submit_precompute_job, job.pk))
+
+    return job
+
+
+def queue_precompute_receiver(sender, instance, raw=False, **kwargs) -> None:
+    """Receive the ``post_save`` signal of a `CheckpointModel` and queue a job for it.
+
+    Nothing is queued if the checkpoint's priors need not be precomputed again (see
+    `CheckpointModel.save`).
+    """
+    if raw or not getattr(instance, "needs_precompute", True):
+        return
+
+    queue_precompute_job(instance)
+
+
+def resume_precompute_jobs(
+    include_failed: bool = False,
+    before: datetime | None = None,
+) -> list[PrecomputeJob]:
+    """Queue new jobs for all checkpoints whose latest job never finished.
+
+    Jobs that are still ``"queued"`` or ``"running"`` and were created ``before`` the
+    server was started must have been interrupted. They are marked as failed. Newer
+    jobs (e.g. of checkpoints saved since) are left alone, and so are their
+    checkpoints. With ``include_failed``, checkpoints whose latest job failed are
+    retried, too. Returns the newly queued jobs.
+    """
+    before = before or timezone.now()
+    interrupted = PrecomputeJob.objects.filter(
+        status__in=[PrecomputeJob.Status.QUEUED, PrecomputeJob.Status.RUNNING],
+        created__lt=before,
+    )
+    resumed_pks = set(interrupted.values_list("checkpoint_id", flat=True))
+    interrupted.update(
+        status=PrecomputeJob.Status.FAILED,
+        error="Interrupted before it finished.",
+        finished=timezone.now(),
+    )
+    active_pks = PrecomputeJob.objects.filter(created__gte=before).values_list(
+        "checkpoint_id",
+        flat=True,
+    )
+
+    queued = []
+    for checkpoint in CheckpointModel.objects.exclude(
+        status=CheckpointModel.Status.READY,
+    ).exclude(pk__in=active_pks):
+        if checkpoint.pk not in resumed_pks and not include_failed:
+            continue
+
+        CheckpointModel.objects.filter(pk=checkpoint.pk).update(
+            status=CheckpointModel.Status.WARMING,
+        )
+        queued.append(queue_precompute_job(checkpoint))
+        logger.info(f"Resumed precomputing {checkpoint}.")
+
+    return queued
@@ -2,7 +2,9 @@
 
 Adds definitions of risk models to the database. As with the `add_datasets` command,
 this does not actually load and store the model samples in the database. Instead, those
-are fetched and computed on demand using `joblib`.
+are fetched and the priors are precomputed by the background jobs of the `jobs` module,
+for all added risk models in parallel. The command waits for these jobs to finish and
+reports whether the risk models are ready.
 
 The structure of the command is similar to the `add_institutions`, `add_users`, and
 `add_datasets` commands. The command can be called with a JSON file containing a list
@@ -69,6 +71,7 @@ from pathlib import Path
 from django.core.management import base
 from django.db import IntegrityError
 
+from lyprox.riskpredictor import jobs
 from lyprox.riskpredictor.models import CheckpointModel
 
 
@@ -158,9 +161,10 @@ class Command(base.BaseCommand):
                 },
             ]
 
+        created = []
         for config in riskmodel_configs:
             try:
-                CheckpointModel.objects.create(**config)
+                created.append(CheckpointModel.objects.create(**config))
                 self.stdout.write(
                     self.style.SUCCESS(f"CheckpointModel '{config['ref']}' created."),
                 )
@@ -178,3 +182,18 @@ class Command(base.BaseCommand):
                         f"ref='{config['ref']}' could not be created due to {exc}",
                     ),
                 )
+
+        jobs.wait_for_jobs()
+        for checkpoint in created:
+            checkpoint.refresh_from_db(fields=["status"])
+            if checkpoint.is_ready:
+                self.stdout.write(
+                    self.style.SUCCESS(f"CheckpointModel '{checkpoint.ref}' is ready."),
+                )
+            else:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"CheckpointModel '{checkpoint.ref}' is {checkpoint.status}: "
+                        f"{checkpoint.latest_job.error}",
+                    ),
+                )
@@ -0,0 +1,157 @@
+"""Command to prefill the cache of risks with the most common diagnoses.
+
+Most users of the risk predictor enter one of only a few diagnoses: No involvement at
+all, or involvement of one or two LNLs, with the sliders for specificity and
+sensitivity at their initial values. This opt-in command computes the risks of these
+diagnoses for every T-stage (and midline extension status) of the selected checkpoints
+and stores them on disk (see `predict.get_risks_payload`). The web app then only needs
+to look them up, even in newly started worker processes.
+
+The command iterates over all combinations of up to ``--max-involved`` involved LNLs,
+while all other LNLs are healthy. The output of ``lyprox prefill_risks --help`` is:
+
+.. code-block:: text
+
+    usage: lyprox prefill_risks [-h] [--checkpoints CHECKPOINTS [CHECKPOINTS ...]]
+                                [--max-involved MAX_INVOLVED]
+                                [--specificities SPECIFICITIES [SPECIFICITIES ...]]
+                                [--sensitivities SENSITIVITIES [SENSITIVITIES ...]]
+                                [--version] [-v {0,1,2,3}] [--settings SETTINGS]
+                                [--pythonpath PYTHONPATH] [--traceback]
+                                [--no-color] [--force-color] [--skip-checks]
+
+    Command to prefill the cache of risks with the most common diagnoses.
+
+    options:
+      -h, --help            show this help message and exit
+      --checkpoints CHECKPOINTS [CHECKPOINTS ...]
+                            Primary keys of the checkpoints. Defaults to all.
+      --max-involved MAX_INVOLVED
+                            Maximum number of involved LNLs per diagnosis.
+      --specificities SPECIFICITIES [SPECIFICITIES ...]
+                            Specificities to prefill. Defaults to the initial one.
+      --sensitivities SENSITIVITIES [SENSITIVITIES ...]
+                            Sensitivities to prefill. Defaults to the initial one.
+      --version             Show program's version number and exit.
+      -v {0,1,2,3}, --verbosity {0,1,2,3}
+                            Verbosity level; 0=minimal output, 1=normal output,
+                            2=verbose output, 3=very verbose output
+      --settings SETTINGS   The Python path to a settings module, e.g.
+                            "myproject.settings.main". If this isn't provided, the
+                            DJANGO_SETTINGS_MODULE environment variable will be
+                            used.
+      --pythonpath PYTHONPATH
+                            A directory to add to the Python path, e.g.
+                            "/home/djangoprojects/myproject".
+      --traceback           Raise on CommandError exceptions.
+      --no-color            Don't colorize the command output.
+      --force-color         Force colorization of the command output.
+      --skip-checks         Skip system checks.
+"""
+
+import itertools
+from collections.abc import Generator, Sequence
+from typing import Any
+
+from django.core.management import base
+
+from lyprox.riskpredictor import predict
+from lyprox.riskpredictor.forms import RiskpredictorForm
+from lyprox.riskpredictor.models import CheckpointModel
+
+
+def generate_common_form_data(
+    form: RiskpredictorForm,
+    max_involved: int,
+    specificities: Sequence[float] | None = None,
+    sensitivities: Sequence[float] | None = None,
+) -> Generator[dict[str, Any], None, None]:
+    """Generate the cleaned form data of the most common diagnoses.
+
+    The ``form`` must be valid and bound to the initial data. Its cleaned data is
+    updated with every combination of T-stage, midline extension (if the model has
+    it), specificity, sensitivity, and up to ``max_involved`` involved LNLs.
+    """
+    lnl_keys = [name for name in form.fields if name.startswith(("ipsi_", "contra_"))]
+    t_stages = [t_stage for t_stage, _ in form.fields["t_stage"].choices]
+    midexts = [True, False] if "midext" in form.fields else [None]
+    specificities = specificities or [form.cleaned_data["specificity"]]
+    sensitivities = sensitivities or [form.cleaned_data["sensitivity"]]
+
+    for num_involved in range(max_involved + 1):
+        for involved in itertools.combinations(lnl_keys, num_involved):
+            for t_stage, midext, spec, sens in itertools.product(
+                t_stages, midexts, specificities, sensitivities
+            ):
+                yield {
+                    **form.cleaned_data,
+                    **{key: key in involved for key in lnl_keys},
+                    "t_stage": t_stage,
+                    "midext": midext,
+                    "specificity": spec,
+                    "sensitivity": sens,
+                }
+
+
+class Command(base.BaseCommand):
+    """Command to prefill the cache of risks with the most common diagnoses."""
+
+    help = __doc__.split("\n")[0]
+
+    def add_arguments(self, parser):
+        """Add arguments to command."""
+        parser.add_argument(
+            "--checkpoints",
+            type=int,
+            nargs="+",
+            help="Primary keys of the checkpoints. Defaults to all.",
+        )
+        parser.add_argument(
+            "--max-involved",
+            type=int,
+            default=1,
+            help="Maximum number of involved LNLs per diagnosis.",
+        )
+        parser.add_argument(
+            "--specificities",
+            type=float,
+            nargs="+",
+            help="Specificities to prefill. Defaults to the initial one.",
+        )
+        parser.add_argument(
+            "--sensitivities",
+            type=float,
+            nargs="+",
+            help="Sensitivities to prefill. Defaults to the initial one.",
+        )
+
+    def handle(self, *args, **options):
+        """Execute command."""
+        checkpoints = CheckpointModel.objects.all()
+        if options["checkpoints"]:
+            checkpoints = checkpoints.filter(pk__in=options["checkpoints"])
+
+        for checkpoint in checkpoints:
+            form = RiskpredictorForm.from_initial(checkpoint=checkpoint)
+            if not form.is_valid():
+                self.stdout.write(
+                    self.style.ERROR(f"Initial form of {checkpoint} is not valid."),
+                )
+                continue
+
+            lnls = list(form.get_lnls())
+            num_diagnoses = 0
+            for form_data in generate_common_form_data(
+                form=form,
+                max_involved=options["max_involved"],
+                specificities=options["specificities"],
+                sensitivities=options["sensitivities"],
+            ):
+                predict.get_risks_payload(checkpoint, form_data, lnls, store=True)
+                num_diagnoses += 1
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Prefilled risks of {num_diagnoses} diagnoses for {checkpoint}.",
+                ),
+            )
@@ -0,0 +1,97 @@
+"""Command to resume precomputing checkpoints whose jobs were interrupted.
+
+The priors of saved checkpoints are precomputed by the background jobs of the `jobs`
+module. If the server is stopped (or a worker is killed) while such a job is queued or
+running, the checkpoint would stay ``"warming"`` forever. Therefore, gunicorn runs
+this command in the background once the server is ready (see the ``when_ready`` hook
+in the ``gunicorn.conf.py``), passing the time it was started as ``--before``. It
+queues new jobs for these checkpoints (see `jobs.resume_precompute_jobs`), including
+those that were migrated from before the jobs existed. Meanwhile, the site serves
+requests and reports the checkpoints as warming. The command waits for the jobs to
+finish and reports whether the checkpoints are ready. The output of
+``lyprox resume_precompute --help`` is:
+
+.. code-block:: text
+
+    usage: lyprox resume_precompute [-h] [--failed] [--before BEFORE] [--version]
+                                    [-v {0,1,2,3}] [--settings SETTINGS]
+                                    [--pythonpath PYTHONPATH] [--traceback]
+                                    [--no-color] [--force-color] [--skip-checks]
+
+    Command to resume precomputing checkpoints whose jobs were interrupted.
+
+    options:
+      -h, --help            show this help message and exit
+      --failed              Also retry checkpoints whose latest job failed.
+      --before BEFORE       ISO timestamp of the server start. Only jobs created
+                            before it are considered interrupted (default: now).
+      --version             Show program's version number and exit.
+      -v {0,1,2,3}, --verbosity {0,1,2,3}
+                            Verbosity level; 0=minimal output, 1=normal output,
+                            2=verbose output, 3=very verbose output
+      --settings SETTINGS   The Python path to a settings module, e.g.
+                            "myproject.settings.main". If this isn't provided, the
+                            DJANGO_SETTINGS_MODULE environment variable will be
+                            used.
+      --pythonpath PYTHONPATH
+                            A directory to add to the Python path, e.g.
+                            "/home/djangoprojects/myproject".
+      --traceback           Raise on CommandError exceptions.
+      --no-color            Don't colorize the command output.
+      --force-color         Force colorization of the command output.
+      --skip-checks         Skip system checks.
+"""
+
+from datetime import datetime
+
+from django.core.management import base
+
+from lyprox.riskpredictor import jobs
+
+
+class Command(base.BaseCommand):
+    """Command to resume precomputing checkpoints whose jobs were interrupted."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add arguments to command."""
+        parser.add_argument(
+            "--failed",
+            action="store_true",
+            help="Also retry checkpoints whose latest job failed.",
+        )
+        parser.add_argument(
+            "--before",
+            type=datetime.fromisoformat,
+            help=(
+                "ISO timestamp of the server start. Only jobs created before it are "
+                "considered interrupted (default: now)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        """Execute command."""
+        queued = jobs.resume_precompute_jobs(
+            include_failed=options["failed"],
+            before=options["before"],
+        )
+        if not queued:
+            self.stdout.write("No checkpoints to resume.")
+            return
+
+        jobs.wait_for_jobs()
+        for job in queued:
+            checkpoint = job.checkpoint
+            checkpoint.refresh_from_db(fields=["status"])
+            if checkpoint.is_ready:
+                self.stdout.write(
+                    self.style.SUCCESS(f"CheckpointModel '{checkpoint.ref}' is ready."),
+                )
+            else:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"CheckpointModel '{checkpoint.ref}' is {checkpoint.status}: "
+                        f"{checkpoint.latest_job.error}",
+                    ),
+                )
@@ -0,0 +1,135 @@
+"""Command to score the risks of a whole cohort of diagnoses.
+
+This reads many diagnoses from a JSON lines or CSV file (or from stdin) and computes
+the mean and standard deviation of the risk of every LNL for each of them, using the
+risk model of one `CheckpointModel`. Like the ``<checkpoint_pk>/batch/`` endpoint of
+the `riskpredictor` app, it uses the `batch` module and writes the results as JSON
+lines, one chunk at a time. The output of ``lyprox score_cohort --help`` is:
+
+.. code-block:: text
+
+    usage: lyprox score_cohort [-h] [--input INPUT] [--output OUTPUT]
+                               [--format {jsonl,csv}] [--chunk-size CHUNK_SIZE]
+                               [--version] [-v {0,1,2,3}] [--settings SETTINGS]
+                               [--pythonpath PYTHONPATH] [--traceback]
+                               [--no-color] [--force-color] [--skip-checks]
+                               checkpoint
+
+    Command to score the risks of a whole cohort of diagnoses.
+
+    positional arguments:
+      checkpoint            Primary key of the checkpoint to use.
+
+    options:
+      -h, --help            show this help message and exit
+      --input INPUT         Path to the diagnoses. Reads from stdin if omitted.
+      --output OUTPUT       Path to write the results to. Writes to stdout if
+                            omitted.
+      --format {jsonl,csv}  Format of the diagnoses. Inferred from the input's
+                            suffix if omitted.
+      --chunk-size CHUNK_SIZE
+                            Number of diagnoses scored at once.
+      --version             Show program's version number and exit.
+      -v {0,1,2,3}, --verbosity {0,1,2,3}
+                            Verbosity level; 0=minimal output, 1=normal output,
+                            2=verbose output, 3=very verbose output
+      --settings SETTINGS   The Python path to a settings module, e.g.
+                            "myproject.settings.main". If this isn't provided, the
+                            DJANGO_SETTINGS_MODULE environment variable will be
+                            used.
+      --pythonpath PYTHONPATH
+                            A directory to add to the Python path, e.g.
+                            "/home/djangoprojects/myproject".
+      --traceback           Raise on CommandError exceptions.
+      --no-color            Don't colorize the command output.
+      --force-color         Force colorization of the command output.
+      --skip-checks         Skip system checks.
+"""
+
+import sys
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.core.management import base
+
+from lyprox.riskpredictor import batch
+from lyprox.riskpredictor.models import CheckpointModel
+
+
+class Command(base.BaseCommand):
+    """Command to score the risks of a whole cohort of diagnoses."""
+
+    help = __doc__.split("\n")[0]
+
+    def add_arguments(self, parser):
+        """Add arguments to command."""
+        parser.add_argument(
+            "checkpoint",
+            type=int,
+            help="Primary key of the checkpoint to use.",
+        )
+        parser.add_argument(
+            "--input",
+            type=Path,
+            help="Path to the diagnoses. Reads from stdin if omitted.",
+        )
+        parser.add_argument(
+            "--output",
+            type=Path,
+            help="Path to write the results to. Writes to stdout if omitted.",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["jsonl", "csv"],
+            help="Format of the diagnoses. Inferred from the input's suffix if "
+            "omitted.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=batch.BATCH_CHUNK_SIZE,
+            help="Number of diagnoses scored at once.",
+        )
+
+    def handle(self, *args, **options):
+        """Execute command."""
+        try:
+            checkpoint = CheckpointModel.objects.get(pk=options["checkpoint"])
+        except CheckpointModel.DoesNotExist as dne_err:
+            raise base.CommandError(
+                f"CheckpointModel {options['checkpoint']} does not exist."
+            ) from dne_err
+
+        input_path, output_path = options["input"], options["output"]
+        input_format = options["format"]
+        if input_format is None:
+            is_csv = input_path is not None and input_path.suffix == ".csv"
+            input_format = "csv" if is_csv else "jsonl"
+
+        with ExitStack() as stack:
+            if input_path is None:
+                input_file = sys.stdin
+            else:
+                input_file = stack.enter_context(
+                    open(input_path, encoding="utf-8", newline="")
+                )
+
+            if output_path is None:
+                output_file = self.stdout
+            else:
+                output_file = base.OutputWrapper(
+                    stack.enter_context(open(output_path, mode="w", encoding="utf-8"))
+                )
+
+            if input_format == "csv":
+                rows = batch.read_csv(input_file)
+            else:
+                rows = batch.read_jsonl(input_file)
+
+            chunks = batch.iter_scored_chunks(
+                checkpoint=checkpoint,
+                rows=rows,
+                chunk_size=options["chunk_size"],
+            )
+            for chunk in chunks:
+                output_file.write(batch.serialize_chunk(chunk), ending="")
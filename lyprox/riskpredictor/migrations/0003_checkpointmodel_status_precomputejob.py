@@ -0,0 +1,84 @@
+# Generated by Django 4.2.20 on 2026-10-18 20:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def queue_precompute_jobs(apps, schema_editor):
+    """Queue a job for every existing checkpoint.
+
+    The caches of samples and priors have changed, so existing checkpoints are not
+    ready. The ``resume_precompute`` command treats these jobs as interrupted and
+    queues new ones.
+    """
+    CheckpointModel = apps.get_model("riskpredictor", "CheckpointModel")  # noqa: N806
+    PrecomputeJob = apps.get_model("riskpredictor", "PrecomputeJob")  # noqa: N806
+    PrecomputeJob.objects.bulk_create(
+        # one job per step: fetch configs, construct model, fetch samples, priors
+        PrecomputeJob(checkpoint=checkpoint, num_steps=4)
+        for checkpoint in CheckpointModel.objects.all()
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("riskpredictor", "0002_checkpointmodel_description"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="checkpointmodel",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("warming", "warming"),
+                    ("ready", "ready"),
+                    ("failed", "failed"),
+                ],
+                default="warming",
+                max_length=10,
+            ),
+        ),
+        migrations.CreateModel(
+            name="PrecomputeJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "queued"),
+                            ("running", "running"),
+                            ("done", "done"),
+                            ("failed", "failed"),
+                        ],
+                        default="queued",
+                        max_length=10,
+                    ),
+                ),
+                ("step", models.CharField(blank=True, default="", max_length=50)),
+                ("num_steps_done", models.PositiveIntegerField(default=0)),
+                ("num_steps", models.PositiveIntegerField(default=0)),
+                ("error", models.TextField(blank=True, default="")),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("finished", models.DateTimeField(blank=True, null=True)),
+                (
+                    "checkpoint",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="precompute_jobs",
+                        to="riskpredictor.checkpointmodel",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(queue_precompute_jobs, migrations.RunPython.noop),
+    ]
@@ -10,10 +10,9 @@ instances, the personalized risk estimates can be computed.
 """
 
 import logging
-import tempfile
-from typing import Any
+from collections.abc import Callable
+from typing import Any, NamedTuple
 
-import emcee
 import numpy as np
 import yaml
 from django.db import models
@@ -31,6 +30,10 @@ from lyscripts.configs import (
 from pydantic import TypeAdapter
 
 from lyprox import loggers
+from lyprox.riskpredictor.priors import compute_priors
+from lyprox.riskpredictor.registry import registered
+from lyprox.riskpredictor.samples import get_or_fetch_samples
+from lyprox.riskpredictor.store import get_or_compute_priors
 from lyprox.settings import JOBLIB_MEMORY
 
 logger = logging.getLogger(__name__)
@@ -81,8 +84,31 @@ def validate_configs(merged_yaml: dict[str, Any]) -> ConfigAndVersionTupleType:
     return graph_config, model_config, dist_configs, version
 
 
-@JOBLIB_MEMORY.cache
-def cached_construct_model_and_add_dists(
+class ConfigKey(NamedTuple):
+    """Lightweight identifier of the configs that define a model."""
+
+    repo_name: str
+    ref: str
+    graph_config_path: str
+    model_config_path: str
+    dist_configs_path: str
+
+
+class SamplesKey(NamedTuple):
+    """Lightweight identifier of a model and the subset of its samples."""
+
+    config_key: ConfigKey
+    samples_path: str
+    num_samples: int
+    remote: str | None
+    seed: int
+
+
+SAMPLES_SEED = 42
+"""Seed for randomly choosing the subset of samples to compute the priors with."""
+
+
+def construct_model_and_add_dists(
     graph_config: GraphConfig,
     model_config: ModelConfig,
     dist_configs: dict[str | int, DistributionConfig],
@@ -107,50 +133,70 @@ def cached_construct_model_and_add_dists(
     return model
 
 
-@JOBLIB_MEMORY.cache
+@JOBLIB_MEMORY.cache(ignore=["get_configs"])
+def cached_construct_model_and_add_dists(
+    config_key: ConfigKey,
+    get_configs: Callable[[], ConfigAndVersionTupleType],
+) -> Model:
+    """Construct the lymph model and add the distributions to it.
+
+    The cache is keyed only on the lightweight ``config_key``. The validated configs
+    are only requested from ``get_configs`` when the cache misses.
+    """
+    graph_config, model_config, dist_configs, version = get_configs()
+    return construct_model_and_add_dists(
+        graph_config=graph_config,
+        model_config=model_config,
+        dist_configs=dist_configs,
+        version=version,
+    )
+
+
 def cached_fetch_model_samples(
     repo_name: str,
     ref: str,
     samples_path: str,
     num_samples: int,
     remote: str | None = None,
-    seed: int = 42,
+    seed: int = SAMPLES_SEED,
 ) -> np.ndarray:
-    """Fetch the model samples from the HDF5 file in the DVC repo."""
-    repo_url = f"https://github.com/{repo_name}"
-    dvc_fs = DVCFileSystem(url=repo_url, rev=ref, remote=remote)
+    """Fetch a subset of the model samples from the HDF5 file in the DVC repo.
 
-    with tempfile.NamedTemporaryFile() as temp_file:
-        dvc_fs.get_file(samples_path, temp_file.name)
-        hdf5_backend = emcee.backends.HDFBackend(
-            filename=temp_file.name,
-            read_only=True,
-        )
-        samples = hdf5_backend.get_chain(flat=True)
-
-    rng = np.random.default_rng(seed)
-    rand_idx = rng.choice(
-        a=len(samples),
-        size=num_samples,
-        replace=False,
+    Only the randomly chosen rows are read from the remote file and stored as a
+    ``.npy`` file. See `samples.get_or_fetch_samples` for details.
+    """
+    return get_or_fetch_samples(
+        repo_name=repo_name,
+        ref=ref,
+        samples_path=samples_path,
+        num_samples=num_samples,
+        remote=remote,
+        seed=seed,
     )
-    return samples[rand_idx]
 
 
-@JOBLIB_MEMORY.cache
 def cached_compute_priors(
-    model: Model,
-    samples: np.ndarray,
-    t_stage: str | int,
-) -> np.ndarray:
-    """Compute the prior state dists for the given model, samples, and t_stage."""
-    priors = []
-
-    for sample in samples:
-        model.set_named_params(*sample)
-        priors.append(model.state_dist(t_stage=t_stage))
-
-    return np.stack(priors)
+    checkpoint_pk: int,
+    samples_key: SamplesKey,
+    get_model: Callable[[], Model],
+    get_samples: Callable[[], np.ndarray],
+) -> dict[str | int, np.ndarray]:
+    """Compute the prior state dists for the model and samples behind ``samples_key``.
+
+    The priors are stored as memory-mapped files of the checkpoint with primary key
+    ``checkpoint_pk`` (see `store.get_or_compute_priors`), together with the
+    ``samples_key``. The model and samples are only requested from ``get_model`` and
+    ``get_samples`` when nothing is stored for this ``samples_key``.
+
+    The priors are computed for every T-stage of the model at once, because the
+    time evolution of the samples is the same for all T-stages. See
+    `priors.compute_priors` for how this is done for all samples at once.
+    """
+    return get_or_compute_priors(
+        pk=checkpoint_pk,
+        samples_key=samples_key,
+        compute=lambda: compute_priors(model=get_model(), samples=get_samples()),
+    )
 
 
 class CheckpointModel(loggers.ModelLoggerMixin, models.Model):
@@ -164,8 +210,13 @@ class CheckpointModel(loggers.ModelLoggerMixin, models.Model):
     repository, but are referenced by `DVC`_ to be found in a remote storage) and can
     `precompute_priors` for all T-stages and a subset of the samples.
 
-    Much of what this class sets up and precomputes is cached using `joblib` for
-    faster computation of the actual risks later on.
+    Much of what this class sets up and precomputes is cached on disk (using `joblib`
+    and, for the priors, memory-mapped files of the `store`) for faster computation of
+    the actual risks later on. On top of that, the results of
+    its methods are kept in memory by the process-local `registry`.
+
+    Since precomputing may take long, a saved checkpoint is ``"warming"`` until a
+    `PrecomputeJob` has filled the caches in the background (see `jobs`).
 
     .. _DVC: https://dvc.org/
     """
@@ -192,6 +243,20 @@ class CheckpointModel(loggers.ModelLoggerMixin, models.Model):
     description = models.TextField(blank=True, null=True)
     """Description of the model, supports Markdown formatting."""
 
+    class Status(models.TextChoices):
+        """Whether the caches of a checkpoint are filled and risks can be computed."""
+
+        WARMING = "warming", "warming"
+        READY = "ready", "ready"
+        FAILED = "failed", "failed"
+
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.WARMING,
+    )
+    """Set to ``"ready"`` by the `PrecomputeJob` once everything is precomputed."""
+
     class Meta:
         """Meta options for the `CheckpointModel`."""
 
@@ -218,6 +283,7 @@ class CheckpointModel(loggers.ModelLoggerMixin, models.Model):
             dist_configs_path=self.dist_configs_path,
         )
 
+    @registered
     def validate_configs(self) -> ConfigAndVersionTupleType:
         """Validate the `pydantic`_ configs necessary for constructing the model.
 
@@ -226,16 +292,46 @@ class CheckpointModel(loggers.ModelLoggerMixin, models.Model):
         merged_yaml = self.get_merged_yaml()
         return validate_configs(merged_yaml)
 
+    @property
+    def config_key(self) -> ConfigKey:
+        """Identify the configs that define the model of this checkpoint."""
+        return ConfigKey(
+            repo_name=self.repo_name,
+            ref=self.ref,
+            graph_config_path=self.graph_config_path,
+            model_config_path=self.model_config_path,
+            dist_configs_path=self.dist_configs_path,
+        )
+
+    @property
+    def samples_key(self) -> SamplesKey:
+        """Identify the model and the subset of samples used for the priors."""
+        return SamplesKey(
+            config_key=self.config_key,
+            samples_path=self.samples_path,
+            num_samples=self.num_samples,
+            remote=self.remote,
+            seed=SAMPLES_SEED,
+        )
+
+    @registered
     def construct_model(self) -> Model:
         """Create one of the `lymph.models` as specified in the validated configs."""
-        graph_config, model_config, dist_configs, version = self.validate_configs()
         return cached_construct_model_and_add_dists(
-            graph_config=graph_config,
-            model_config=model_config,
-            dist_configs=dist_configs,
-            version=version,
+            config_key=self.config_key,
+            get_configs=self.validate_configs,
         )
 
+    @property
+    def is_ready(self) -> bool:
+        """Check if everything is precomputed, such that risks can be computed."""
+        return self.status == self.Status.READY
+
+    @property
+    def latest_job(self) -> "PrecomputeJob | None":
+        """Return the most recently created `PrecomputeJob` of this checkpoint."""
+        return self.precompute_jobs.order_by("-created", "-pk").first()
+
     @property
     def is_unilateral(self) -> bool:
         """Check if the model is a `Unilateral` model."""
@@ -246,6 +342,7 @@ class CheckpointModel(loggers.ModelLoggerMixin, models.Model):
         """Check if the model is a `Midline` model."""
         return isinstance(self.construct_model(), Midline)
 
+    @registered
     def fetch_samples(self) -> np.ndarray:
         """Fetch the model samples from the `HDF5`_ file in the `DVC`_ repo.
 
@@ -258,25 +355,97 @@ class CheckpointModel(loggers.ModelLoggerMixin, models.Model):
             samples_path=self.samples_path,
             num_samples=self.num_samples,
             remote=self.remote,
+            seed=SAMPLES_SEED,
         )
 
+    @registered
     def compute_priors(self, t_stage: int | str) -> np.ndarray:
-        """Compute priors for every T-stage using the model samples."""
-        return cached_compute_priors(
-            model=self.construct_model(),
-            samples=self.fetch_samples(),
-            t_stage=t_stage,
+        """Compute priors for the given T-stage using the model samples."""
+        priors = cached_compute_priors(
+            checkpoint_pk=self.pk,
+            samples_key=self.samples_key,
+            get_model=self.construct_model,
+            get_samples=self.fetch_samples,
         )
+        return priors[t_stage]
 
     def precompute_priors(self) -> None:
-        """Precompute the priors for all T-stages and cache them using `joblib`."""
-        for t_stage in self.construct_model().get_all_distributions():
-            priors = self.compute_priors(t_stage=t_stage)
+        """Precompute the priors for all T-stages and store them as `numpy` files."""
+        priors = cached_compute_priors(
+            checkpoint_pk=self.pk,
+            samples_key=self.samples_key,
+            get_model=self.construct_model,
+            get_samples=self.fetch_samples,
+        )
+        for t_stage, t_stage_priors in priors.items():
             self.logger.info(
-                f"{self} precomputed prior for {t_stage=} with {priors.shape=}.",
+                f"{self} precomputed prior for {t_stage=} "
+                f"with {t_stage_priors.shape=}.",
             )
 
     def save(self, *args: Any, **kwargs: Any) -> None:
-        """Fill the cache with precomputed priors before saving the instance."""
-        self.precompute_priors()
+        """Save the instance, as warming if its priors must be precomputed (again).
+
+        This is the case for new instances, if any field of the `samples_key` changed,
+        or if the stored instance is not ready (e.g. because its last job failed).
+        Precomputing happens in a `PrecomputeJob` that is queued by
+        `jobs.queue_precompute_receiver` when the instance has been saved. Other
+        changes (like a new description) keep a ready checkpoint online.
+        """
+        stored = None
+        if self.pk is not None:
+            stored = type(self).objects.filter(pk=self.pk).first()
+
+        self.needs_precompute = (
+            stored is None
+            or stored.samples_key != self.samples_key
+            or not stored.is_ready
+        )
+        # the status in memory may be outdated, e.g. if a job finished meanwhile
+        self.status = self.Status.WARMING if self.needs_precompute else stored.status
         return super().save(*args, **kwargs)
+
+
+class PrecomputeJob(models.Model):
+    """Background job that precomputes everything a `CheckpointModel` needs.
+
+    The job runs through the `jobs.PRECOMPUTE_STEPS` and records its progress in the
+    database, such that other processes can display it.
+    """
+
+    class Status(models.TextChoices):
+        """State of the job."""
+
+        QUEUED = "queued", "queued"
+        RUNNING = "running", "running"
+        DONE = "done", "done"
+        FAILED = "failed", "failed"
+
+    checkpoint = models.ForeignKey(
+        CheckpointModel,
+        on_delete=models.CASCADE,
+        related_name="precompute_jobs",
+    )
+    """The checkpoint whose caches are filled by this job."""
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.QUEUED,
+    )
+    """Whether the job is queued, running, done, or failed."""
+    step = models.CharField(max_length=50, blank=True, default="")
+    """Name of the step the job is currently running."""
+    num_steps_done = models.PositiveIntegerField(default=0)
+    """Number of steps that are finished."""
+    num_steps = models.PositiveIntegerField(default=0)
+    """Total number of steps of the job."""
+    error = models.TextField(blank=True, default="")
+    """Error message, if the job failed."""
+    created = models.DateTimeField(auto_now_add=True)
+    """When the job was queued."""
+    finished = models.DateTimeField(null=True, blank=True)
+    """When the job was done or failed."""
+
+    def __str__(self) -> str:
+        """Return the string representation of the instance."""
+        return f"PrecomputeJob {self.pk} for {self.checkpoint} ({self.status})"
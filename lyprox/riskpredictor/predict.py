@@ -3,22 +3,33 @@
 The code in this module is utilized by the `views.render_risk_prediction` and
 `views.render_risk_prediction` functions of the `riskpredictor` app to compute the
 risk of lymphatic progression for a given diagnosis.
+
+Since the input space of the dashboard is small, the same diagnoses are entered over
+and over again. The views therefore call `get_risks_payload`, which returns the
+serialized risks from an LRU cache if the same canonical diagnosis (see
+`canonicalize_form_data`) was already computed for the checkpoint. Common diagnoses
+can be computed ahead of time and stored on disk using the ``prefill_risks`` command.
 """
 
 import logging
 import time
-from collections.abc import Container
+from collections.abc import Callable, Container, Sequence
+from threading import Lock
 from typing import Annotated, Any, Literal, TypeVar
 
 import numpy as np
-from lydata.utils import ModalityConfig
+from cachetools import LRUCache, cached
+from lymph import matrix
+from lymph.modalities import Clinical
 from lymph.models import HPVUnilateral, Midline, Unilateral
 from lymph.types import Model
-from lyscripts.configs import DiagnosisConfig, add_modalities
+from lyscripts.configs import DiagnosisConfig
 from pydantic import AfterValidator, BaseModel, create_model
 
 from lyprox.dataexplorer.query import make_ensure_keys_validator
-from lyprox.riskpredictor.models import CheckpointModel
+from lyprox.riskpredictor.models import CheckpointModel, SamplesKey
+from lyprox.riskpredictor.registry import REGISTRY_LOCK, RISKS_CACHE
+from lyprox.settings import JOBLIB_MEMORY
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +40,143 @@ NullableBoolPercents = Annotated[
 ]
 """Keys may be ``True``, ``False``, or ``None``, while values are the counts of each."""
 
+RISKS_DECIMALS = 2
+"""Decimals that specificity and sensitivity are rounded to (the sliders' step)."""
+
+CanonicalFormData = tuple[tuple[str, Any], ...]
+"""Sorted ``(field, value)`` pairs of the form data that determine the risks."""
+
+
+def get_side_models(model: Model) -> dict[str, Unilateral]:
+    """Return the unilateral models of the ``model``'s sides, keyed by side.
+
+    The `HPVUnilateral` model's HPV+ and HPV- submodels share the same graph and
+    modalities, so its HPV- submodel is returned. For the `Midline` model, the sides of
+    the model with midline extension are returned, since they have the same graph as
+    those without.
+    """
+    if isinstance(model, HPVUnilateral):
+        model = model.nohpv
+
+    if isinstance(model, Midline):
+        model = model.ext
+
+    if isinstance(model, Unilateral):
+        return {"ipsi": model}
+
+    return {"ipsi": model.ipsi, "contra": model.contra}
+
+
+@cached(cache=LRUCache(maxsize=256), lock=Lock())
+def get_observation_matrix(
+    num_lnls: int,
+    base: int,
+    specificity: float,
+    sensitivity: float,
+) -> np.ndarray:
+    """Return the observation matrix of a clinical modality for one side of a model.
+
+    The matrix has one row per hidden state of a unilateral model with ``num_lnls``
+    LNLs and ``base`` states per LNL, and one column per possible diagnosis. It only
+    depends on these four arguments. Thus, it is computed once for every (quantized,
+    see `RISKS_DECIMALS`) pair of ``specificity`` and ``sensitivity`` and then shared
+    by all models with the same number of LNLs.
+
+    >>> get_observation_matrix(num_lnls=1, base=2, specificity=0.9, sensitivity=0.8)
+    array([[0.9, 0.1],
+           [0.2, 0.8]])
+    """
+    modality = Clinical(spec=specificity, sens=sensitivity, is_trinary=base == 3)
+    observation_matrix = matrix.generate_observation(
+        modalities=(modality,),
+        num_lnls=num_lnls,
+        base=base,
+    )
+    observation_matrix.flags.writeable = False
+    return observation_matrix
+
+
+def compute_side_likelihoods(
+    model: Model,
+    diagnosis: DiagnosisConfig,
+    specificity: float = 0.9,
+    sensitivity: float = 0.9,
+    modality: str = "D",
+) -> list[np.ndarray]:
+    """Compute the likelihood of the ``diagnosis`` given each state of every side.
+
+    Returns one vector per side of the ``model`` (see `get_side_models`). Only the
+    entries of the ``diagnosis`` under the given ``modality`` are considered. Instead
+    of adding the ``modality`` to (a copy of) the ``model``, the observation matrix of
+    every side is looked up via `get_observation_matrix`.
+    """
+    specificity = round(specificity, RISKS_DECIMALS)
+    sensitivity = round(sensitivity, RISKS_DECIMALS)
+    diagnosis = diagnosis.model_dump()
+    likelihoods = []
+
+    for side, side_model in get_side_models(model).items():
+        lnls = tuple(side_model.graph.lnls.keys())
+        observation_matrix = get_observation_matrix(
+            num_lnls=len(lnls),
+            base=3 if side_model.is_trinary else 2,
+            specificity=specificity,
+            sensitivity=sensitivity,
+        )
+        encoding = matrix.compute_encoding(
+            lnls=lnls,
+            pattern=diagnosis[side].get(modality, {}),
+            base=2,
+        )
+        likelihoods.append(observation_matrix @ encoding)
+
+    return likelihoods
+
+
+def compute_diagnosis_likelihood(
+    model: Model,
+    diagnosis: DiagnosisConfig,
+    specificity: float = 0.9,
+    sensitivity: float = 0.9,
+    modality: str = "D",
+) -> np.ndarray:
+    """Compute the likelihood of the ``diagnosis`` given each hidden state.
+
+    For unilateral models, this is a vector with one entry per state. For the
+    `Bilateral` and `Midline` models, it is a matrix with the ipsilateral states along
+    the first and the contralateral states along the second axis: The outer product
+    of the `compute_side_likelihoods`. The likelihood does not depend on the model's
+    parameters and can be reused for all samples.
+    """
+    likelihoods = compute_side_likelihoods(
+        model=model,
+        diagnosis=diagnosis,
+        specificity=specificity,
+        sensitivity=sensitivity,
+        modality=modality,
+    )
+    if len(likelihoods) == 1:
+        return likelihoods[0]
+
+    return np.outer(*likelihoods)
+
+
+def select_midext_priors(priors: np.ndarray, midext: bool | None) -> np.ndarray:
+    """Select the `Midline` ``priors`` for the given midline extension status.
+
+    The `Midline` model's (non-central) priors have the shape ``(num_samples, 2,
+    num_states, num_states)``, where the second axis is the midline extension. If
+    ``midext`` is ``None``, it is marginalized over. Priors without this axis (e.g.
+    from the central model) are returned unchanged.
+    """
+    if priors.ndim != 4:
+        return priors
+
+    if midext is None:
+        return priors.sum(axis=1)
+
+    return priors[:, int(midext)]
+
 
 def compute_posteriors(
     model: Model,
@@ -38,26 +186,30 @@ def compute_posteriors(
     specificity: float = 0.9,
     sensitivity: float = 0.9,
 ) -> np.ndarray:
-    """Compute the posterior state dists for the given model, priors, and diagnosis."""
-    modality_config = ModalityConfig(spec=specificity, sens=sensitivity)
-    model = add_modalities(model=model, modalities={"D": modality_config})
-    posteriors = []
-    midext_kwarg = {"midext": midext} if isinstance(model, Midline) else {}
-
-    if isinstance(model, Unilateral | HPVUnilateral):
-        diagnosis = diagnosis.ipsi
-    else:
-        diagnosis = diagnosis.model_dump()
+    """Compute the posterior state dists for the given model, priors, and diagnosis.
+
+    Instead of calling the model's ``posterior_state_dist`` method once per prior, the
+    likelihood of the ``diagnosis`` is computed only once (see
+    `compute_diagnosis_likelihood`) and multiplied with the entire stack of
+    ``priors`` at once. Every resulting joint distribution is then normalized to
+    obtain the posteriors. The ``priors`` have one state distribution per sample
+    along the first axis and the returned posteriors have the same shape (except for
+    the midline extension axis of the `Midline` model, see `select_midext_priors`).
+    """
+    likelihood = compute_diagnosis_likelihood(
+        model=model,
+        diagnosis=diagnosis,
+        specificity=specificity,
+        sensitivity=sensitivity,
+    )
 
-    for prior in priors:
-        posterior = model.posterior_state_dist(
-            given_state_dist=prior,
-            given_diagnosis=diagnosis,
-            **midext_kwarg,
-        )
-        posteriors.append(posterior)
+    if isinstance(model, Midline):
+        priors = select_midext_priors(priors=priors, midext=midext)
 
-    return np.stack(posteriors)
+    joint_diagnosis_and_state = priors * likelihood
+    state_axes = tuple(range(1, joint_diagnosis_and_state.ndim))
+    norm = joint_diagnosis_and_state.sum(axis=state_axes, keepdims=True)
+    return joint_diagnosis_and_state / norm
 
 
 def assemble_diagnosis(
@@ -80,9 +232,13 @@ def assemble_diagnosis(
 
 def collect_risk_stats(
     risk_values: np.ndarray,
-) -> dict[Literal[True, None, False], float]:
+) -> dict[Literal[True, None, False], float | np.ndarray]:
     """For an array of ``risk_values``, collect the mean and std for each risk type.
 
+    The mean and std are computed over the first axis, i.e. over the samples. If
+    ``risk_values`` is 2D, the risks of every column are summarized at once and the
+    returned dictionary contains arrays instead of floats.
+
     The format is chosen like the `lyprox.dataexplorer.query.Statistics` object that
     collects how many patients had ``True``, ``None``, or ``False`` involvement for a
     given LNL. In this case, we construct the returned dictionary like this:
@@ -108,35 +264,136 @@ def collect_risk_stats(
     }
 
 
+@cached(cache=LRUCache(maxsize=32), lock=Lock())
+def get_involvement_indicators(lnls: tuple[str, ...], base: int = 2) -> np.ndarray:
+    """Return a matrix that indicates in which states each of the ``lnls`` is involved.
+
+    The matrix has one row per hidden state of a unilateral model with the ``lnls``
+    (in the same order as the model's graph) and one column per LNL. Column ``k`` is
+    ``True`` for all states where ``lnls[k]`` is involved. Hence, multiplying a stack
+    of state distributions with this matrix computes the marginal risk of involvement
+    for every LNL and every distribution at once.
+
+    >>> get_involvement_indicators(("II", "III")).astype(int)
+    array([[0, 0],
+           [0, 1],
+           [1, 0],
+           [1, 1]])
+    """
+    indicators = np.column_stack(
+        [
+            matrix.compute_encoding(lnls=lnls, pattern={lnl: True}, base=base)
+            for lnl in lnls
+        ]
+    )
+    indicators.flags.writeable = False
+    return indicators
+
+
+def compute_marginal_risks(
+    model: Model,
+    state_dists: np.ndarray,
+) -> tuple[list[str], np.ndarray]:
+    """Compute the risk of involvement for every side, LNL, and state dist at once.
+
+    Returns a list of keys like ``ipsi_II`` and an array with one row per state dist
+    in ``state_dists`` (e.g. the output of `compute_posteriors`) and one column per
+    key. For bilateral models, the state dists are first marginalized over the
+    respective other side. Then, the risks of all LNLs on one side are computed with
+    a single matrix product (see `get_involvement_indicators`).
+    """
+    side_models = get_side_models(model)
+    if len(side_models) == 1:
+        side_dists = {"ipsi": state_dists}
+    else:
+        side_dists = {
+            "ipsi": state_dists.sum(axis=2),
+            "contra": state_dists.sum(axis=1),
+        }
+
+    keys, risks = [], []
+    for side, side_model in side_models.items():
+        lnls = tuple(side_model.graph.lnls.keys())
+        base = 3 if side_model.is_trinary else 2
+        risks.append(side_dists[side] @ get_involvement_indicators(lnls, base=base))
+        keys += [f"{side}_{lnl}" for lnl in lnls]
+
+    return keys, np.concatenate(risks, axis=1)
+
+
+def compute_stacked_risk_stats(
+    model: Model,
+    priors: np.ndarray,
+    side_likelihoods: list[np.ndarray],
+) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """Compute the mean and std of the risks for a stack of diagnoses at once.
+
+    The ``side_likelihoods`` hold one array per side of the ``model``, with one row
+    per diagnosis (i.e. the stacked outputs of `compute_side_likelihoods`). Returned
+    are the keys (like ``ipsi_II``) and the mean and std (in percent) of the risks
+    over all ``priors``, each with one row per diagnosis and one column per key.
+
+    The posteriors are never computed explicitly. Since the likelihood of a bilateral
+    diagnosis is the outer product of the two sides' likelihoods, the joint
+    probability of each side's states and the diagnosis can be computed with a single
+    matrix product over the other side's states, for all samples and diagnoses at
+    once. The marginal risks then follow from `get_involvement_indicators`.
+    """
+    keys, indicators = [], []
+    for side, side_model in get_side_models(model).items():
+        lnls = tuple(side_model.graph.lnls.keys())
+        base = 3 if side_model.is_trinary else 2
+        indicators.append(get_involvement_indicators(lnls, base=base))
+        keys += [f"{side}_{lnl}" for lnl in lnls]
+
+    # all joints have the shape (num_samples, num_states, num_diagnoses)
+    if len(side_likelihoods) == 1:
+        side_joints = [priors[:, :, None] * side_likelihoods[0].T]
+    else:
+        ipsi_likelihoods, contra_likelihoods = side_likelihoods
+        num_samples, num_ipsi, num_contra = priors.shape
+        ipsi_joint = priors.reshape(-1, num_contra) @ contra_likelihoods.T
+        contra_joint = priors.transpose(0, 2, 1).reshape(-1, num_ipsi)
+        contra_joint = contra_joint @ ipsi_likelihoods.T
+        side_joints = [
+            ipsi_joint.reshape(num_samples, num_ipsi, -1) * ipsi_likelihoods.T,
+            contra_joint.reshape(num_samples, num_contra, -1) * contra_likelihoods.T,
+        ]
+
+    norm = side_joints[0].sum(axis=1)
+    risks = np.concatenate(
+        [
+            np.tensordot(joint, indicator, axes=(1, 0))
+            for joint, indicator in zip(side_joints, indicators, strict=True)
+        ],
+        axis=2,
+    )
+    risks = 100 * risks / norm[..., None]
+    return keys, risks.mean(axis=0), risks.std(axis=0)
+
+
 def create_risks_fields_and_kwargs(
     model: Model,
     state_dists: np.ndarray,
     lnls: list[str],
     keys_to_consider: Container[str],
 ) -> tuple[dict[str, tuple[type, ...]], dict[str, dict]]:
-    """Create the fields and kwargs for dynamically created pydantic ``Risks`` model."""
+    """Create the fields and kwargs for dynamically created pydantic ``Risks`` model.
+
+    The marginal risks of all LNLs are computed at once using `compute_marginal_risks`
+    and summarized for all of them at once with `collect_risk_stats`.
+    """
+    keys, risks = compute_marginal_risks(model=model, state_dists=state_dists)
+    risk_stats = collect_risk_stats(risks)
+    requested_keys = {f"{side}_{lnl}" for side in ["ipsi", "contra"] for lnl in lnls}
+
     fields, kwargs = {}, {}
-    for side in ["ipsi", "contra"]:
-        for lnl in lnls:
-            key = f"{side}_{lnl}"
-            if key not in keys_to_consider:
-                continue
+    for i, key in enumerate(keys):
+        if key not in requested_keys or key not in keys_to_consider:
+            continue
 
-            if isinstance(model, Unilateral | HPVUnilateral):
-                involvement = {lnl: True}
-            else:
-                involvement = {side: {lnl: True}}
-
-            kwargs[key] = collect_risk_stats(
-                [
-                    model.marginalize(
-                        involvement=involvement,
-                        given_state_dist=dist,
-                    )
-                    for dist in state_dists
-                ]
-            )
-            fields[key] = (NullableBoolPercents, ...)
+        kwargs[key] = {value: stats[i] for value, stats in risk_stats.items()}
+        fields[key] = (NullableBoolPercents, ...)
 
     return fields, kwargs
 
@@ -181,3 +438,155 @@ def compute_risks(
     stop_time = time.perf_counter()
     logger.info(f"Risk computation took {stop_time - start_time:.2f}s.")
     return risks
+
+
+def risks_from_payload(payload: dict[str, dict]) -> BaseModelT:
+    """Recreate the pydantic ``Risks`` instance from its serialized ``payload``.
+
+    The ``payload`` is the output of `get_risks_payload`. This is necessary for the
+    HTML templates, which access the risks of every LNL as attributes.
+    """
+    fields = dict.fromkeys(payload, (NullableBoolPercents, ...))
+    Risks = create_model("Risks", __base__=BaseModel, **fields)  # noqa: N806
+    return Risks(**payload)
+
+
+def canonicalize_form_data(
+    form_data: dict[str, Any],
+    lnls: Sequence[str],
+) -> CanonicalFormData:
+    """Reduce the cleaned ``form_data`` to the sorted fields that the risks depend on.
+
+    These are the T-stage, the midline extension (``None`` for models without it), the
+    specificity and sensitivity rounded to `RISKS_DECIMALS`, and the involvement of the
+    ``lnls`` on every side that is present in the ``form_data``. Diagnoses with the
+    same canonical form data have the same risks.
+
+    >>> canonical_form_data = canonicalize_form_data(
+    ...     {"t_stage": "early", "specificity": 0.8000001, "sensitivity": 0.81,
+    ...      "ipsi_II": True, "ipsi_III": None, "is_submitted": True},
+    ...     lnls=["II", "III"],
+    ... )
+    >>> canonical_form_data[:3]
+    (('ipsi_II', True), ('ipsi_III', None), ('midext', None))
+    >>> canonical_form_data[3:]
+    (('sensitivity', 0.81), ('specificity', 0.8), ('t_stage', 'early'))
+    """
+    canonical_form_data = {
+        "t_stage": form_data["t_stage"],
+        "midext": form_data.get("midext"),
+        "specificity": round(form_data["specificity"], RISKS_DECIMALS),
+        "sensitivity": round(form_data["sensitivity"], RISKS_DECIMALS),
+    }
+    for side in ["ipsi", "contra"]:
+        for lnl in lnls:
+            if (key := f"{side}_{lnl}") in form_data:
+                canonical_form_data[key] = form_data[key]
+
+    return tuple(sorted(canonical_form_data.items()))
+
+
+@JOBLIB_MEMORY.cache(ignore=["get_payload"])
+def stored_risks_payload(
+    samples_key: SamplesKey,
+    canonical_form_data: CanonicalFormData,
+    get_payload: Callable[[], dict[str, dict]],
+) -> dict[str, dict]:
+    """Store the risks payload of a diagnosis on disk, keyed by the ``samples_key``.
+
+    Only the ``prefill_risks`` command writes to this cache, such that the disk is not
+    filled with every diagnosis ever entered. Since the cache directory is shared, all
+    processes can read the prefilled payloads.
+    """
+    return get_payload()
+
+
+def get_risks_cache_key(
+    checkpoint: CheckpointModel,
+    canonical_form_data: CanonicalFormData,
+) -> tuple:
+    """Return the key of the risks of a diagnosis in the `registry.RISKS_CACHE`.
+
+    Like the keys of the `registry.registered` results, it starts with the primary key
+    (for eviction) and the `models.SamplesKey` of the checkpoint.
+    """
+    return (checkpoint.pk, checkpoint.samples_key, canonical_form_data)
+
+
+def lookup_risks_payload(
+    checkpoint: CheckpointModel,
+    canonical_form_data: CanonicalFormData,
+) -> dict[str, dict] | None:
+    """Return the cached or prefilled risks payload, or ``None`` if there is none.
+
+    Payloads found on disk (see `stored_risks_payload`) are added to the
+    `registry.RISKS_CACHE`. Nothing is computed here.
+    """
+    if checkpoint.pk is None:
+        return None
+
+    key = get_risks_cache_key(checkpoint, canonical_form_data)
+    with REGISTRY_LOCK:
+        if key in RISKS_CACHE:
+            return RISKS_CACHE[key]
+
+    args = (checkpoint.samples_key, canonical_form_data, None)
+    if not stored_risks_payload.check_call_in_cache(*args):
+        return None
+
+    payload = stored_risks_payload(*args)
+    cache_risks_payload(checkpoint, canonical_form_data, payload)
+    return payload
+
+
+def cache_risks_payload(
+    checkpoint: CheckpointModel,
+    canonical_form_data: CanonicalFormData,
+    payload: dict[str, dict],
+) -> None:
+    """Add the risks ``payload`` of a diagnosis to the `registry.RISKS_CACHE`."""
+    if checkpoint.pk is None:
+        return
+
+    key = get_risks_cache_key(checkpoint, canonical_form_data)
+    with REGISTRY_LOCK:
+        RISKS_CACHE[key] = payload
+
+
+def get_risks_payload(
+    checkpoint: CheckpointModel,
+    form_data: dict[str, Any],
+    lnls: list[str],
+    store: bool = False,
+) -> dict[str, dict]:
+    """Return the serialized risks for the given checkpoint and form data.
+
+    The payload is the ``model_dump`` of the risks returned by `compute_risks`. It is
+    looked up in the `registry.RISKS_CACHE` by the checkpoint and the
+    `canonicalize_form_data`. On a miss, the payloads prefilled on disk are checked
+    (see `lookup_risks_payload`) before the risks are computed. With ``store=True``,
+    computed payloads are also stored on disk.
+
+    The returned payload is shared between requests and must not be modified.
+    """
+    canonical_form_data = canonicalize_form_data(form_data=form_data, lnls=lnls)
+
+    def get_payload() -> dict[str, dict]:
+        risks = compute_risks(checkpoint, dict(canonical_form_data), lnls)
+        return risks.model_dump()
+
+    if checkpoint.pk is None:
+        return get_payload()
+
+    payload = lookup_risks_payload(checkpoint, canonical_form_data)
+    if payload is not None:
+        return payload
+
+    if store:
+        args = (checkpoint.samples_key, canonical_form_data, get_payload)
+        payload = stored_risks_payload(*args)
+    else:
+        payload = get_payload()
+
+    cache_risks_payload(checkpoint, canonical_form_data, payload)
+    return payload
@@ -0,0 +1,313 @@
+"""Compute the prior state distributions for many parameter samples at once.
+
+The `CheckpointModel` stores (a subset of) the parameter samples drawn during the
+inference of a `lymph.models` instance. For every sample and T-stage, a prior state
+distribution must be computed. Doing this via ``model.state_dist(t_stage)`` for every
+sample is slow, since the model regenerates its transition matrix in every time step.
+
+Instead, the functions in this module set each sample's parameters only once to
+collect the transition matrices of the model's unilateral parts and the distributions
+over diagnosis times of all T-stages (see `stack_sample_params`). The hidden Markov
+model is then evolved for all samples together using stacked matrix products (see
+`evolve_stacked`). Since the evolution does not depend on the T-stage, it is done only
+once and every T-stage's prior is a weighted sum over its time steps (see
+`marginalize_over_time`).
+
+Model types for which this is not implemented (e.g. the `HPVUnilateral` model or the
+central part of the `Midline` model) fall back to calling ``model.state_dist`` for
+every sample, optionally distributed over a pool of processes (see
+`compute_priors_in_pool`).
+"""
+
+import logging
+import time
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from typing import NamedTuple
+
+import numpy as np
+from lymph.models import Bilateral, Midline, Unilateral
+from lymph.types import Model
+
+from lyprox.settings import PRIORS_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+def get_unilateral_parts(model: Model) -> dict[str, Unilateral] | None:
+    """Return the unilateral parts of the ``model`` that need to be evolved.
+
+    For a `Unilateral` model, this is only the model itself. For a `Bilateral` model,
+    it is the ipsi- and contralateral side. For a `Midline` model, it is the
+    ipsilateral side and the contralateral side with and without midline extension.
+    Returns ``None`` if the ``model`` cannot be evolved in a stacked way.
+    """
+    if isinstance(model, Unilateral):
+        return {"ipsi": model}
+
+    if isinstance(model, Bilateral):
+        return {"ipsi": model.ipsi, "contra": model.contra}
+
+    if isinstance(model, Midline):
+        return {
+            "ipsi": model.ext.ipsi,
+            "noext_contra": model.noext.contra,
+            "ext_contra": model.ext.contra,
+        }
+
+    return None
+
+
+class StackedParams(NamedTuple):
+    """Quantities of every sample that are needed to compute the priors."""
+
+    transition_matrices: dict[str, np.ndarray]
+    """Transition matrices with shape ``(num_samples, num_states, num_states)``."""
+    time_priors: dict[str | int, np.ndarray]
+    """Diagnosis time dists per T-stage with shape ``(num_samples, max_time + 1)``."""
+    midext_probs: np.ndarray | None
+    """Midline extension probability of every sample (only for `Midline` models)."""
+
+
+def stack_sample_params(
+    model: Model,
+    samples: np.ndarray,
+    t_stages: Sequence[str | int],
+) -> StackedParams:
+    """Set the parameters of every sample and stack the resulting quantities.
+
+    This is the only place where the parameters are set sample by sample. For every
+    sample, the transition matrices of the unilateral parts (see
+    `get_unilateral_parts`) are generated once, together with the distributions over
+    diagnosis times of all ``t_stages`` (which may depend on the parameters).
+    """
+    parts = get_unilateral_parts(model)
+    transition_matrices = {name: [] for name in parts}
+    time_priors = {t_stage: [] for t_stage in t_stages}
+    midext_probs = []
+
+    for sample in samples:
+        model.set_named_params(*sample)
+        for name, part in parts.items():
+            transition_matrices[name].append(part.transition_matrix())
+        for t_stage in t_stages:
+            time_priors[t_stage].append(model.get_distribution(t_stage).pmf)
+        if isinstance(model, Midline):
+            midext_probs.append(model.midext_prob)
+
+    return StackedParams(
+        transition_matrices={
+            name: np.stack(matrices) for name, matrices in transition_matrices.items()
+        },
+        time_priors={
+            t_stage: np.stack(dists) for t_stage, dists in time_priors.items()
+        },
+        midext_probs=np.array(midext_probs) if isinstance(model, Midline) else None,
+    )
+
+
+def evolve_stacked(transition_matrices: np.ndarray, max_time: int) -> np.ndarray:
+    """Evolve the state distributions of all samples over ``max_time`` time steps.
+
+    The ``transition_matrices`` have the shape ``(num_samples, num_states,
+    num_states)``. Returned are the state distributions of every sample at every time
+    step, with shape ``(num_samples, max_time + 1, num_states)``. Every sample starts
+    in the healthy state (index 0) at time step 0.
+
+    >>> transition_matrices = np.array([[[0.5, 0.5], [0.0, 1.0]]])
+    >>> evolve_stacked(transition_matrices, max_time=2)
+    array([[[1.  , 0.  ],
+            [0.5 , 0.5 ],
+            [0.25, 0.75]]])
+    """
+    num_samples, num_states, _ = transition_matrices.shape
+    state_dists = np.zeros(shape=(num_samples, max_time + 1, num_states))
+    state_dists[:, 0, 0] = 1.0
+
+    for t in range(1, max_time + 1):
+        state_dists[:, t] = np.einsum(
+            "si,sij->sj", state_dists[:, t - 1], transition_matrices
+        )
+
+    return state_dists
+
+
+def evolve_midline_contra(
+    noext_contra_evo: np.ndarray,
+    ext_transition_matrices: np.ndarray,
+    midext_probs: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Evolve the contralateral side of a `Midline` model with midline extension.
+
+    This is the stacked equivalent of ``Midline.contra_state_dist_evo`` (for models
+    with ``use_midext_evo=True``). The returned evolutions are the joint probabilities
+    of the contralateral states and the absence or presence of midline extension.
+    """
+    max_time = noext_contra_evo.shape[1] - 1
+    time_steps = np.arange(max_time + 1)
+    midext_probs = midext_probs.reshape(-1, 1)
+    noext_probs = (1.0 - midext_probs) ** time_steps
+    noext_contra_evo = noext_contra_evo * noext_probs[..., None]
+    ext_contra_evo = np.zeros_like(noext_contra_evo)
+
+    for t in range(max_time):
+        ext_contra_evo[:, t + 1] = np.einsum(
+            "si,sij->sj",
+            midext_probs * noext_contra_evo[:, t] + ext_contra_evo[:, t],
+            ext_transition_matrices,
+        )
+
+    return noext_contra_evo, ext_contra_evo
+
+
+def compute_stacked_evolutions(
+    model: Model,
+    params: StackedParams,
+    max_time: int,
+) -> dict[str, np.ndarray]:
+    """Evolve the ``model``'s sides for all samples over ``max_time`` time steps.
+
+    Returns the evolution of the ``"ipsi"`` side and, for the `Bilateral` and
+    `Midline` models, the ``"contra"`` side. For the `Midline` model, the contralateral
+    evolution has an additional second axis for the absence and presence of midline
+    extension (as in ``Midline.contra_state_dist_evo``).
+    """
+    evos = {
+        name: evolve_stacked(matrices, max_time=max_time)
+        for name, matrices in params.transition_matrices.items()
+    }
+
+    if not isinstance(model, Midline):
+        return evos
+
+    if model.use_midext_evo:
+        noext_contra_evo, ext_contra_evo = evolve_midline_contra(
+            noext_contra_evo=evos["noext_contra"],
+            ext_transition_matrices=params.transition_matrices["ext_contra"],
+            midext_probs=params.midext_probs,
+        )
+    else:
+        midext_probs = params.midext_probs.reshape(-1, 1, 1)
+        noext_contra_evo = evos["noext_contra"] * (1.0 - midext_probs)
+        ext_contra_evo = evos["ext_contra"] * midext_probs
+
+    contra_evo = np.stack([noext_contra_evo, ext_contra_evo], axis=1)
+    return {"ipsi": evos["ipsi"], "contra": contra_evo}
+
+
+def marginalize_over_time(
+    evos: dict[str, np.ndarray],
+    time_prior: np.ndarray,
+) -> np.ndarray:
+    """Weight the evolutions ``evos`` of every sample with its ``time_prior``.
+
+    The ``evos`` are returned by `compute_stacked_evolutions` and the ``time_prior``
+    holds the distribution over diagnosis times of one T-stage for every sample. The
+    result are the priors of all samples for this T-stage.
+    """
+    if "contra" not in evos:
+        return np.einsum("st,sti->si", time_prior, evos["ipsi"])
+
+    if evos["contra"].ndim == 3:
+        return np.einsum("st,sti,stj->sij", time_prior, evos["ipsi"], evos["contra"])
+
+    return np.einsum("st,sti,smtj->smij", time_prior, evos["ipsi"], evos["contra"])
+
+
+def compute_stacked_priors(
+    model: Model,
+    samples: np.ndarray,
+    t_stages: Sequence[str | int],
+) -> dict[str | int, np.ndarray]:
+    """Compute the priors of all ``samples`` and ``t_stages`` with stacked evolutions.
+
+    The result is identical to stacking ``model.state_dist(t_stage)`` for every sample
+    after setting its parameters. But the samples are evolved only once for all
+    ``t_stages``. The ``model`` must be one of the types supported by
+    `get_unilateral_parts`.
+    """
+    params = stack_sample_params(model=model, samples=samples, t_stages=t_stages)
+    evos = compute_stacked_evolutions(model, params=params, max_time=model.max_time)
+    return {
+        t_stage: marginalize_over_time(evos, time_prior=time_prior)
+        for t_stage, time_prior in params.time_priors.items()
+    }
+
+
+def compute_priors_sequentially(
+    model: Model,
+    samples: np.ndarray,
+    t_stages: Sequence[str | int],
+) -> dict[str | int, np.ndarray]:
+    """Compute the priors by calling ``model.state_dist`` for every sample."""
+    priors = {t_stage: [] for t_stage in t_stages}
+
+    for sample in samples:
+        model.set_named_params(*sample)
+        for t_stage in t_stages:
+            priors[t_stage].append(model.state_dist(t_stage=t_stage))
+
+    return {t_stage: np.stack(dists) for t_stage, dists in priors.items()}
+
+
+def compute_priors_in_pool(
+    model: Model,
+    samples: np.ndarray,
+    t_stages: Sequence[str | int],
+    max_workers: int,
+) -> dict[str | int, np.ndarray]:
+    """Distribute `compute_priors_sequentially` over ``max_workers`` processes."""
+    chunks = np.array_split(samples, max_workers)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(compute_priors_sequentially, model, chunk, t_stages)
+            for chunk in chunks
+            if len(chunk) > 0
+        ]
+        results = [future.result() for future in futures]
+
+    return {
+        t_stage: np.concatenate([result[t_stage] for result in results])
+        for t_stage in t_stages
+    }
+
+
+def compute_priors(
+    model: Model,
+    samples: np.ndarray,
+    t_stages: Sequence[str | int] | None = None,
+    max_workers: int = PRIORS_MAX_WORKERS,
+) -> dict[str | int, np.ndarray]:
+    """Compute the prior state dists for the given model, samples, and T-stages.
+
+    If ``t_stages`` is not given, the priors are computed for all T-stages that have a
+    distribution over diagnosis times in the ``model``. The returned dictionary maps
+    every T-stage to the stacked priors of all samples.
+
+    If the ``model`` supports it, the priors are computed for all samples at once
+    using `compute_stacked_priors`. Otherwise, they are computed sample by sample,
+    using a pool of ``max_workers`` processes if that is larger than one.
+    """
+    start_time = time.perf_counter()
+    # the parameters are set on a copy, such that the given model stays untouched
+    model = deepcopy(model)
+    if t_stages is None:
+        t_stages = list(model.get_all_distributions())
+
+    if get_unilateral_parts(model) is not None:
+        priors = compute_stacked_priors(model, samples=samples, t_stages=t_stages)
+        method = "stacked"
+    elif max_workers > 1:
+        priors = compute_priors_in_pool(model, samples, t_stages, max_workers)
+        method = f"{max_workers} processes"
+    else:
+        priors = compute_priors_sequentially(model, samples, t_stages)
+        method = "sequentially"
+
+    end_time = time.perf_counter()
+    logger.info(
+        f"Computed priors of {len(samples)} samples for {t_stages=} ({method}) "
+        f"in {end_time - start_time:.2f} seconds."
+    )
+    return priors
@@ -0,0 +1,160 @@
+"""Stream progressively refined risk estimates of one diagnosis.
+
+`predict.compute_risks` processes the priors of every sample before the dashboard gets
+any answer. For checkpoints with many samples, `iter_progressive_payloads` instead
+yields a first estimate of the risks' mean and std from a small random subset of the
+precomputed priors. It then yields refined estimates as more batches of samples are
+processed, each twice as large as the one before (starting with
+`PROGRESSIVE_FIRST_BATCH` samples).
+
+The samples are visited in a random order that is fixed by `PROGRESSIVE_SEED` (see
+`get_sample_order`), such that every subset is an unbiased draw from all samples and
+the same diagnosis is always refined the same way. The risks of every sample are kept
+in their original position. Hence, the last payload summarizes all samples exactly
+like `predict.compute_risks` does. It is added to the `registry.RISKS_CACHE`, so the
+next request for the same diagnosis is answered right away.
+
+The payloads are serialized as JSON lines by `serialize_payload`, which the client can
+parse one by one from the streamed response.
+"""
+
+import json
+import logging
+import time
+from collections.abc import Iterator
+from typing import Any
+
+import numpy as np
+
+from lyprox.riskpredictor.models import CheckpointModel
+from lyprox.riskpredictor.predict import (
+    assemble_diagnosis,
+    cache_risks_payload,
+    canonicalize_form_data,
+    collect_risk_stats,
+    compute_marginal_risks,
+    compute_posteriors,
+    lookup_risks_payload,
+)
+
+logger = logging.getLogger(__name__)
+
+PROGRESSIVE_FIRST_BATCH = 100
+"""Number of samples the first estimate of the risks is computed from."""
+
+PROGRESSIVE_SEED = 42
+"""Seed of the random order in which the samples are processed."""
+
+
+def get_batch_bounds(num_samples: int, first_batch: int) -> list[tuple[int, int]]:
+    """Return start and stop of the batches, doubling in size after the first one.
+
+    >>> get_batch_bounds(num_samples=10, first_batch=2)
+    [(0, 2), (2, 6), (6, 10)]
+    >>> get_batch_bounds(num_samples=10, first_batch=20)
+    [(0, 10)]
+    """
+    bounds, start, size = [], 0, max(first_batch, 1)
+    while start < num_samples:
+        stop = min(start + size, num_samples)
+        bounds.append((start, stop))
+        start, size = stop, 2 * size
+
+    return bounds
+
+
+def get_sample_order(num_samples: int, seed: int = PROGRESSIVE_SEED) -> np.ndarray:
+    """Return the fixed random order in which the samples are processed."""
+    return np.random.default_rng(seed).permutation(num_samples)
+
+
+def create_payload(
+    keys: list[str],
+    risks: np.ndarray,
+    requested_keys: set[str],
+) -> dict[str, dict]:
+    """Summarize the ``risks`` of the ``requested_keys`` like `predict.compute_risks`.
+
+    The ``risks`` have one row per processed sample and one column per key in
+    ``keys``, as returned by `predict.compute_marginal_risks`.
+    """
+    risk_stats = collect_risk_stats(risks)
+    return {
+        key: {value: float(stats[i]) for value, stats in risk_stats.items()}
+        for i, key in enumerate(keys)
+        if key in requested_keys
+    }
+
+
+def iter_progressive_payloads(
+    checkpoint: CheckpointModel,
+    form_data: dict[str, Any],
+    lnls: list[str],
+    first_batch: int = PROGRESSIVE_FIRST_BATCH,
+) -> Iterator[dict[str, Any]]:
+    """Yield ever more refined risks of the diagnosis in the ``form_data``.
+
+    Every yielded payload has the format of `predict.get_risks_payload`, plus the
+    number of samples it was computed from (``num_samples``) and the number of all
+    samples (``num_total``). If the risks are already cached (see
+    `predict.lookup_risks_payload`), only the final payload is yielded.
+    """
+    canonical_form_data = canonicalize_form_data(form_data=form_data, lnls=lnls)
+    form_data = dict(canonical_form_data)
+    priors = checkpoint.compute_priors(t_stage=form_data["t_stage"])
+    num_total = len(priors)
+
+    payload = lookup_risks_payload(checkpoint, canonical_form_data)
+    if payload is not None:
+        yield {**payload, "num_samples": num_total, "num_total": num_total}
+        return
+
+    start_time = time.perf_counter()
+    model = checkpoint.construct_model()
+    diagnosis = assemble_diagnosis(form_data=form_data, lnls=lnls)
+    requested_keys = {f"{side}_{lnl}" for side in ["ipsi", "contra"] for lnl in lnls}
+    requested_keys &= form_data.keys()
+    order = get_sample_order(num_total)
+    risks = None
+
+    for start, stop in get_batch_bounds(num_total, first_batch):
+        # sorted indices read the memory-mapped priors in order
+        indices = np.sort(order[start:stop])
+        posteriors = compute_posteriors(
+            model=model,
+            priors=priors[indices],
+            diagnosis=diagnosis,
+            midext=form_data["midext"],
+            specificity=form_data["specificity"],
+            sensitivity=form_data["sensitivity"],
+        )
+        keys, batch_risks = compute_marginal_risks(model, state_dists=posteriors)
+        if risks is None:
+            risks = np.empty((num_total, len(keys)), dtype=batch_risks.dtype)
+
+        risks[indices] = batch_risks
+        is_final = stop == num_total
+        processed = risks if is_final else risks[np.sort(order[:stop])]
+        payload = create_payload(keys, processed, requested_keys)
+        if is_final:
+            cache_risks_payload(checkpoint, canonical_form_data, payload)
+
+        yield {**payload, "num_samples": stop, "num_total": num_total}
+
+    stop_time = time.perf_counter()
+    logger.info(f"Progressive risk computation took {stop_time - start_time:.2f}s.")
+
+
+def serialize_payload(payload: dict[str, Any]) -> str:
+    """Serialize one payload of `iter_progressive_payloads` as a line of JSON.
+
+    Like the response of `views.update_risk_prediction`, the line contains the
+    ``total`` and ``type`` of the risks, and whether it is the ``final`` estimate.
+    """
+    message = {
+        **payload,
+        "total": 100.0,
+        "type": "risk",
+        "final": payload["num_samples"] == payload["num_total"],
+    }
+    return json.dumps(message) + "\n"
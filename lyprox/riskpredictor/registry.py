@@ -0,0 +1,144 @@
+"""Process-local registry of everything derived from a `CheckpointModel`.
+
+During a single risk prediction request, the `CheckpointModel` is asked for its
+validated configs, its constructed `lymph.models` instance, its samples, and its
+priors several times (e.g. by the `RiskpredictorForm`, by `predict.compute_risks`,
+and by the template via the ``is_midline`` and ``is_unilateral`` properties). Even
+when the results are cached on disk by `joblib`, every call re-validates YAML and
+hashes large arguments.
+
+The methods of the `CheckpointModel` that are decorated with `registered` store their
+results in the `REGISTRY`, keyed by the checkpoint's primary key and its
+`models.SamplesKey` (which identifies the repository, git reference, configs, and
+samples), the method name, and the method's arguments. The registry is an LRU cache
+with a memory budget of `REGISTRY_SIZE` bytes. When a `CheckpointModel` is saved or
+deleted, all its entries are dropped (see `evict_checkpoint_receiver`, which is
+connected in `apps.RiskConfig.ready`).
+
+The serialized risks computed for a diagnosis (see `predict.get_risks_payload`) are
+stored separately in the `RISKS_CACHE`, because they are small and numerous. They are
+keyed the same way and evicted together with the checkpoint's other entries.
+
+Note that every worker process has its own registry, but the entries are only evicted
+in the process that saved the checkpoint. If another process changes anything that
+defines the model or its samples (e.g. the git reference, a config path, or the number
+of samples), the `models.SamplesKey` changes. So, the stale entries of the other
+processes are never used again and eventually drop out of their LRU caches. The primary
+key is only part of the keys such that a checkpoint's entries can be evicted.
+"""
+
+import functools
+import logging
+import pickle
+from collections.abc import Callable, Hashable
+from threading import Lock
+from typing import Any, ParamSpec, TypeVar
+
+import numpy as np
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_SIZE = 512 * 1024**2
+"""Maximum number of bytes the registry may hold in memory."""
+
+
+def get_entry_size(value: Any) -> int:
+    """Return the (approximate) number of bytes a registry entry occupies.
+
+    Memory-mapped arrays (like the priors from the `store`) do not count, because
+    their data is held by the operating system's page cache and shared by all
+    processes.
+
+    >>> get_entry_size(np.zeros(100))
+    800
+    """
+    if isinstance(value, np.memmap):
+        return 0
+
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+
+    return len(pickle.dumps(value))
+
+
+REGISTRY = LRUCache(maxsize=REGISTRY_SIZE, getsizeof=get_entry_size)
+"""LRU cache that holds the registered results of all checkpoints."""
+
+RISKS_CACHE_SIZE = 4096
+"""Maximum number of risk payloads (one per checkpoint and diagnosis) in memory."""
+
+RISKS_CACHE = LRUCache(maxsize=RISKS_CACHE_SIZE)
+"""LRU cache that holds the serialized risks of recently entered diagnoses."""
+
+REGISTRY_LOCK = Lock()
+"""Lock that guards every access to the `REGISTRY` and the `RISKS_CACHE`."""
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+def registered(method: Callable[P, R]) -> Callable[P, R]:
+    """Store the results of a `CheckpointModel` ``method`` in the `REGISTRY`.
+
+    The key consists of the instance's primary key and `models.SamplesKey`, the name
+    of the ``method``, and all its arguments (which must be hashable). Results of
+    unsaved instances are not registered. NumPy arrays are made read-only before they
+    are registered, since they are shared between all callers.
+
+    The lock is not held while the ``method`` is computed. So, two threads may compute
+    the same result at the same time, but a slow computation never blocks the lookup
+    of other entries.
+    """
+
+    @functools.wraps(method)
+    def wrapper(checkpoint, *args: P.args, **kwargs: P.kwargs) -> R:
+        if checkpoint.pk is None:
+            return method(checkpoint, *args, **kwargs)
+
+        key: Hashable = (
+            checkpoint.pk,
+            checkpoint.samples_key,
+            method.__name__,
+            args,
+            tuple(sorted(kwargs.items())),
+        )
+        with REGISTRY_LOCK:
+            if key in REGISTRY:
+                return REGISTRY[key]
+
+        result = method(checkpoint, *args, **kwargs)
+        if isinstance(result, np.ndarray):
+            result.flags.writeable = False
+
+        with REGISTRY_LOCK:
+            try:
+                REGISTRY[key] = result
+            except ValueError:
+                logger.warning(f"Result of {method.__name__} too large to register.")
+
+        return result
+
+    return wrapper
+
+
+def evict_checkpoint(pk: int) -> int:
+    """Drop all registered results and risks of the checkpoint with primary key ``pk``.
+
+    Returns the number of evicted entries.
+    """
+    num_evicted = 0
+    with REGISTRY_LOCK:
+        for cache in (REGISTRY, RISKS_CACHE):
+            stale_keys = [key for key in cache if key[0] == pk]
+            for key in stale_keys:
+                del cache[key]
+            num_evicted += len(stale_keys)
+
+    logger.info(f"Evicted {num_evicted} registry entries of checkpoint {pk}.")
+    return num_evicted
+
+
+def evict_checkpoint_receiver(sender, instance, **kwargs) -> None:
+    """Receive the ``post_save`` and ``post_delete`` signals of a `CheckpointModel`."""
+    evict_checkpoint(pk=instance.pk)
@@ -0,0 +1,162 @@
+"""Load a random subset of the parameter samples from an `emcee`_ HDF5 chain.
+
+The priors of a `CheckpointModel` are computed from only ``num_samples`` randomly
+chosen rows of the flattened MCMC chain. Downloading the whole HDF5 file and loading
+the full chain (as ``emcee.backends.HDFBackend.get_chain(flat=True)`` does) only to
+pick a few rows would make the peak memory proportional to the length of the chain.
+
+Instead, `read_chain_subset` first reads the shape of the chain dataset and chooses
+the rows from it. It then reads only the chunks of the dataset that contain selected
+rows (see `read_chain_rows`), straight from the remote file opened via the
+`DVCFileSystem`. The same rows are chosen as before for the same ``seed``, and they
+are returned in the same order.
+
+The subset is stored as a compact NumPy ``.npy`` file in the location given by the
+``SAMPLES_STORE_DIR`` setting (see `get_or_fetch_samples`), such that it only has to
+be fetched once.
+
+.. _emcee: https://emcee.readthedocs.io/
+"""
+
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import BinaryIO
+
+import h5py
+import joblib
+import numpy as np
+from dvc.api import DVCFileSystem
+
+from lyprox.settings import SAMPLES_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+SAMPLES_GROUP = "mcmc"
+"""Name of the HDF5 group in which `emcee` stores the chain by default."""
+
+
+def choose_flat_indices(num_flat: int, num_samples: int, seed: int) -> np.ndarray:
+    """Randomly choose ``num_samples`` distinct indices of the flattened chain.
+
+    >>> choose_flat_indices(num_flat=10, num_samples=3, seed=42)
+    array([9, 0, 6])
+    """
+    rng = np.random.default_rng(seed)
+    return rng.choice(a=num_flat, size=num_samples, replace=False)
+
+
+def read_chain_rows(chain: h5py.Dataset, indices: np.ndarray) -> np.ndarray:
+    """Read the rows at the ``indices`` of the flattened ``chain`` dataset.
+
+    The ``chain`` has the shape ``(iterations, walkers, dims)``, as written by
+    `emcee`. Its flattened row ``i`` is walker ``i % walkers`` in iteration
+    ``i // walkers``. The indices are sorted and grouped by the chunk of iterations
+    they fall into, such that every chunk is read at most once. For datasets without
+    chunks, only the selected iterations are read.
+    """
+    num_walkers, num_dims = chain.shape[1:]
+    order = np.argsort(indices)
+    iterations, walkers = np.divmod(indices[order], num_walkers)
+    chunk_length = 1 if chain.chunks is None else chain.chunks[0]
+    chunk_starts = iterations - iterations % chunk_length
+    unique_starts, first_positions = np.unique(chunk_starts, return_index=True)
+    last_positions = [*first_positions[1:], len(indices)]
+    rows = np.empty(shape=(len(indices), num_dims), dtype=chain.dtype)
+
+    for start, first, last in zip(
+        unique_starts, first_positions, last_positions, strict=True
+    ):
+        chunk = chain[start : start + chunk_length]
+        rows[first:last] = chunk[iterations[first:last] - start, walkers[first:last]]
+
+    subset = np.empty_like(rows)
+    subset[order] = rows
+    return subset
+
+
+def read_chain_subset(
+    file: str | Path | BinaryIO,
+    num_samples: int,
+    seed: int,
+    group: str = SAMPLES_GROUP,
+) -> np.ndarray:
+    """Read ``num_samples`` random rows of the flattened chain in the HDF5 ``file``.
+
+    This returns the same as choosing the rows via `choose_flat_indices` from the
+    full ``HDFBackend(file).get_chain(flat=True)``, but without loading the full
+    chain into memory.
+    """
+    with h5py.File(file, mode="r") as h5_file:
+        chain_group = h5_file[group]
+        chain = chain_group["chain"]
+        num_iterations = int(chain_group.attrs["iteration"])
+        indices = choose_flat_indices(
+            num_flat=num_iterations * chain.shape[1],
+            num_samples=num_samples,
+            seed=seed,
+        )
+        return read_chain_rows(chain=chain, indices=indices)
+
+
+def get_samples_file(
+    repo_name: str,
+    ref: str,
+    samples_path: str,
+    num_samples: int,
+    seed: int,
+    root: Path = SAMPLES_STORE_DIR,
+) -> Path:
+    """Return where the subset of samples identified by the arguments is stored."""
+    name = joblib.hash((repo_name, ref, samples_path, num_samples, seed))
+    return root / f"{name}.npy"
+
+
+def get_or_fetch_samples(
+    repo_name: str,
+    ref: str,
+    samples_path: str,
+    num_samples: int,
+    remote: str | None,
+    seed: int,
+    root: Path = SAMPLES_STORE_DIR,
+) -> np.ndarray:
+    """Load the subset of samples from the ``root`` directory or fetch it first.
+
+    If the subset is not stored yet, it is read from the HDF5 file at
+    ``samples_path`` in the DVC repo via `read_chain_subset`. It is then written to a
+    temporary file, which is renamed to the path from `get_samples_file`, such that
+    concurrently starting workers never see a half-written file.
+    """
+    samples_file = get_samples_file(
+        repo_name=repo_name,
+        ref=ref,
+        samples_path=samples_path,
+        num_samples=num_samples,
+        seed=seed,
+        root=root,
+    )
+    if samples_file.exists():
+        return np.load(samples_file)
+
+    start_time = time.perf_counter()
+    repo_url = f"https://github.com/{repo_name}"
+    dvc_fs = DVCFileSystem(url=repo_url, rev=ref, remote=remote)
+    with dvc_fs.open(samples_path, mode="rb") as remote_file:
+        samples = read_chain_subset(remote_file, num_samples=num_samples, seed=seed)
+
+    root.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=root, prefix=f".{samples_file.stem}-", suffix=".npy", delete=False
+    ) as tmp_file:
+        np.save(tmp_file, samples)
+    os.replace(tmp_file.name, samples_file)
+
+    end_time = time.perf_counter()
+    logger.info(
+        f"Fetched {num_samples} samples from {repo_name}@{ref}:{samples_path} "
+        f"in {end_time - start_time:.2f} seconds."
+    )
+    return samples
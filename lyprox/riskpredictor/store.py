@@ -0,0 +1,163 @@
+"""Memory-mapped store of the priors of every `models.CheckpointModel`.
+
+For `Bilateral` and `Midline` models, the priors of one T-stage have the shape
+``(num_samples, 2^n, 2^n)`` (or even larger). If every gunicorn worker kept its own
+copy of them (e.g. by unpickling them from the `joblib` cache), several checkpoints
+across many workers would exhaust the memory.
+
+Instead, the priors of every T-stage are written as a raw NumPy ``.npy`` file, in
+the ``PRIORS_DTYPE`` (``float64`` by default, ``float32`` halves their size). Every
+worker attaches to these files via `numpy.load` with ``mmap_mode="r"``. The operating
+system's page cache holds the data only once, no matter how many workers read it.
+
+The files of a checkpoint are found via a small manifest in the checkpoint's directory
+``PRIORS_STORE_DIR / <pk>`` (see `read_manifest`). It records the `models.SamplesKey`
+the priors were computed for, the dtype, the subdirectory with the current files, and
+which file belongs to which T-stage. So, no arguments need to be hashed to find them.
+The files are written to a temporary subdirectory first, which is then renamed. After
+that, the manifest is atomically replaced, such that concurrent readers always see
+complete priors.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import joblib
+import numpy as np
+
+from lyprox.settings import PRIORS_DTYPE, PRIORS_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.joblib"
+"""Name of the file that describes the stored priors of a checkpoint."""
+
+
+def get_checkpoint_directory(pk: int, root: Path = PRIORS_STORE_DIR) -> Path:
+    """Return the directory in which the priors of the checkpoint ``pk`` are stored."""
+    return root / str(pk)
+
+
+def read_manifest(pk: int, root: Path = PRIORS_STORE_DIR) -> dict[str, Any] | None:
+    """Read the manifest of the checkpoint ``pk``, or return ``None`` if it has none."""
+    manifest_path = get_checkpoint_directory(pk, root) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+
+    return joblib.load(manifest_path)
+
+
+def load_priors(
+    pk: int,
+    samples_key: tuple,
+    dtype: str = PRIORS_DTYPE,
+    root: Path = PRIORS_STORE_DIR,
+) -> dict[str | int, np.memmap] | None:
+    """Memory-map the stored priors of the checkpoint ``pk`` read-only.
+
+    Returns ``None`` if nothing is stored for the checkpoint or if the stored priors
+    were computed for a different ``samples_key`` or ``dtype``.
+    """
+    manifest = read_manifest(pk, root)
+    if manifest is None:
+        return None
+
+    if manifest["samples_key"] != samples_key or manifest["dtype"] != dtype:
+        logger.info(f"Stored priors of checkpoint {pk} are stale.")
+        return None
+
+    directory = get_checkpoint_directory(pk, root) / manifest["directory"]
+    return {
+        t_stage: np.load(directory / file_name, mmap_mode="r")
+        for t_stage, file_name in manifest["files"].items()
+    }
+
+
+def remove_stale_directories(checkpoint_directory: Path, keep: str) -> None:
+    """Remove all subdirectories of ``checkpoint_directory``, except ``keep``.
+
+    Workers that still have the files of a removed subdirectory memory-mapped can keep
+    using them, because the data is only freed once the last mapping is closed.
+    """
+    for path in checkpoint_directory.iterdir():
+        if path.is_dir() and path.name != keep and not path.name.startswith("."):
+            logger.info(f"Removing stale priors {path}.")
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def write_priors(
+    pk: int,
+    samples_key: tuple,
+    priors: dict[str | int, np.ndarray],
+    dtype: str = PRIORS_DTYPE,
+    root: Path = PRIORS_STORE_DIR,
+) -> None:
+    """Write the ``priors`` of the checkpoint ``pk`` as ``.npy`` files.
+
+    The files are written to a new subdirectory of `get_checkpoint_directory`. Then,
+    the manifest is replaced to point to it and older subdirectories are removed.
+    """
+    checkpoint_directory = get_checkpoint_directory(pk, root)
+    checkpoint_directory.mkdir(parents=True, exist_ok=True)
+    tmp_directory = Path(tempfile.mkdtemp(prefix=".priors-", dir=checkpoint_directory))
+    files = {}
+
+    for i, (t_stage, t_stage_priors) in enumerate(priors.items()):
+        files[t_stage] = f"{i}.npy"
+        np.save(tmp_directory / files[t_stage], t_stage_priors.astype(dtype))
+
+    directory = checkpoint_directory / tmp_directory.name.lstrip(".")
+    os.rename(tmp_directory, directory)
+
+    manifest = {
+        "samples_key": samples_key,
+        "dtype": dtype,
+        "directory": directory.name,
+        "files": files,
+    }
+    tmp_manifest_path = directory / MANIFEST_NAME
+    joblib.dump(manifest, tmp_manifest_path)
+    os.replace(tmp_manifest_path, checkpoint_directory / MANIFEST_NAME)
+    remove_stale_directories(checkpoint_directory, keep=directory.name)
+
+
+def get_or_compute_priors(
+    pk: int,
+    samples_key: tuple,
+    compute: Callable[[], dict[str | int, np.ndarray]],
+    dtype: str = PRIORS_DTYPE,
+    root: Path = PRIORS_STORE_DIR,
+) -> dict[str | int, np.memmap]:
+    """Load the priors of the checkpoint ``pk`` or ``compute`` and store them first.
+
+    In both cases, the returned priors are memory-mapped from the stored files, such
+    that even the process that computed them does not keep a private copy.
+    """
+    priors = load_priors(pk, samples_key, dtype=dtype, root=root)
+    if priors is not None:
+        return priors
+
+    start_time = time.perf_counter()
+    write_priors(pk, samples_key, priors=compute(), dtype=dtype, root=root)
+    end_time = time.perf_counter()
+    logger.info(
+        f"Computed and stored priors of checkpoint {pk} "
+        f"in {end_time - start_time:.2f} seconds."
+    )
+    return load_priors(pk, samples_key, dtype=dtype, root=root)
+
+
+def remove_priors(pk: int, root: Path = PRIORS_STORE_DIR) -> None:
+    """Remove all stored priors of the checkpoint ``pk``."""
+    shutil.rmtree(get_checkpoint_directory(pk, root), ignore_errors=True)
+
+
+def remove_priors_receiver(sender, instance, **kwargs) -> None:
+    """Receive the ``post_delete`` signal of a `models.CheckpointModel`."""
+    remove_priors(pk=instance.pk)
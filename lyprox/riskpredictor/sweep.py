@@ -0,0 +1,211 @@
+"""Compute the risks of one diagnosis for a whole grid of specificities/sensitivities.
+
+While a user drags the specificity or sensitivity slider of the dashboard, every step
+would otherwise send a separate request to `views.update_risk_prediction`. Instead,
+`compute_sweep_payload` returns the risks of one diagnosis on a grid of values the two
+sliders can take (see `get_sweep_grid`), so that the client can interpolate between
+them. By default, the grid has a step of `SWEEP_STEP`, since computing all 51x51
+values the sliders can take is about 20 times slower.
+
+The likelihoods of the diagnosis are not computed via one observation matrix per grid
+point. Since the observation matrix of a side is a Kronecker product over its LNLs
+(and so is the encoding of the diagnosis), the likelihood is the Kronecker product of
+every LNL's likelihood (see `compute_lnl_likelihoods`). These are computed for all
+grid points at once in `compute_sweep_side_likelihoods`. The risks of all grid points
+are then computed in batches by `batch.compute_risk_stats_in_batches`.
+"""
+
+import logging
+import time
+from typing import Any
+
+import numpy as np
+from lymph.types import Model
+from lyscripts.configs import DiagnosisConfig
+
+from lyprox.riskpredictor.batch import compute_risk_stats_in_batches
+from lyprox.riskpredictor.models import CheckpointModel
+from lyprox.riskpredictor.predict import (
+    RISKS_DECIMALS,
+    assemble_diagnosis,
+    get_side_models,
+    select_midext_priors,
+)
+
+logger = logging.getLogger(__name__)
+
+SWEEP_MIN = 0.5
+"""Smallest specificity and sensitivity the dashboard's sliders allow."""
+
+SWEEP_MAX = 1.0
+"""Largest specificity and sensitivity the dashboard's sliders allow."""
+
+SWEEP_STEP = 0.05
+"""Default step between the grid values of the specificity and sensitivity."""
+
+
+def get_sweep_grid(step: float = SWEEP_STEP) -> np.ndarray:
+    """Return the values from `SWEEP_MIN` to `SWEEP_MAX` in steps of ``step``.
+
+    The ``step`` must be a positive multiple of the sliders' step (see
+    `RISKS_DECIMALS`) and must divide the range evenly. Otherwise, a `ValueError` is
+    raised. This is checked in integer multiples of the sliders' step, such that tiny
+    or zero steps are rejected before the grid is allocated.
+
+    >>> get_sweep_grid(step=0.25)
+    array([0.5 , 0.75, 1.  ])
+    >>> get_sweep_grid(step=0.3)
+    Traceback (most recent call last):
+    ...
+    ValueError: Step 0.3 does not divide the range from 0.5 to 1.0.
+    >>> get_sweep_grid(step=1e-9)
+    Traceback (most recent call last):
+    ...
+    ValueError: Step 1e-09 does not divide the range from 0.5 to 1.0.
+    """
+    scale = 10**RISKS_DECIMALS
+    slider_steps = round(step * scale) if np.isfinite(step) else 0
+    range_steps = round((SWEEP_MAX - SWEEP_MIN) * scale)
+    if (
+        slider_steps < 1
+        or not np.isclose(step, slider_steps / scale)
+        or range_steps % slider_steps != 0
+    ):
+        raise ValueError(
+            f"Step {step} does not divide the range from {SWEEP_MIN} to {SWEEP_MAX}."
+        )
+
+    num_steps = range_steps // slider_steps
+    return np.linspace(SWEEP_MIN, SWEEP_MAX, num_steps + 1).round(RISKS_DECIMALS)
+
+
+def compute_lnl_likelihoods(
+    involvement: bool | None,
+    specificities: np.ndarray,
+    sensitivities: np.ndarray,
+    is_trinary: bool = False,
+) -> np.ndarray:
+    """Compute the likelihood of an LNL's observed ``involvement`` given its state.
+
+    Returns one row per pair of ``specificities`` and ``sensitivities`` and one
+    column per state of the LNL. This is the column of the clinical modality's
+    confusion matrix for the observed ``involvement`` (see `lymph.modalities`), or
+    all ones if the ``involvement`` is unknown.
+
+    >>> compute_lnl_likelihoods(True, np.array([0.9]), np.array([0.8]))
+    array([[0.1, 0.8]])
+    >>> compute_lnl_likelihoods(False, np.array([0.9]), np.array([0.8]), True)
+    array([[0.9, 0.9, 0.2]])
+    """
+    num_states = 3 if is_trinary else 2
+    if involvement is None:
+        return np.ones(shape=(len(specificities), num_states))
+
+    healthy = 1.0 - specificities if involvement else specificities
+    involved = sensitivities if involvement else 1.0 - sensitivities
+    # clinical modalities cannot detect microscopic involvement
+    columns = [healthy, healthy, involved] if is_trinary else [healthy, involved]
+    return np.column_stack(columns)
+
+
+def compute_sweep_side_likelihoods(
+    model: Model,
+    diagnosis: DiagnosisConfig,
+    specificities: np.ndarray,
+    sensitivities: np.ndarray,
+    modality: str = "D",
+) -> list[np.ndarray]:
+    """Compute the likelihood of the ``diagnosis`` for many specificities/sensitivities.
+
+    This returns the same as `predict.compute_side_likelihoods`, but for every pair of
+    ``specificities`` and ``sensitivities`` at once: One array per side of the
+    ``model``, with one row per pair and one column per state of the side.
+    """
+    diagnosis = diagnosis.model_dump()
+    side_likelihoods = []
+
+    for side, side_model in get_side_models(model).items():
+        pattern = diagnosis[side].get(modality, {})
+        likelihoods = np.ones(shape=(len(specificities), 1))
+        for lnl in side_model.graph.lnls:
+            lnl_likelihoods = compute_lnl_likelihoods(
+                involvement=pattern.get(lnl),
+                specificities=specificities,
+                sensitivities=sensitivities,
+                is_trinary=side_model.is_trinary,
+            )
+            # row-wise Kronecker product, in the same LNL order as `lymph.matrix`
+            likelihoods = likelihoods[:, :, None] * lnl_likelihoods[:, None, :]
+            likelihoods = likelihoods.reshape(len(specificities), -1)
+
+        side_likelihoods.append(likelihoods)
+
+    return side_likelihoods
+
+
+def compute_risk_surface(
+    model: Model,
+    priors: np.ndarray,
+    diagnosis: DiagnosisConfig,
+    grid: np.ndarray,
+) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """Compute the risks of the ``diagnosis`` for every specificity and sensitivity.
+
+    Both the specificity and the sensitivity take every value of the ``grid``.
+    Returned are the keys (like ``ipsi_II``) and the mean and std of the risks (in
+    percent), with the specificity along the first, the sensitivity along the
+    second, and the keys along the third axis.
+    """
+    specificities, sensitivities = np.meshgrid(grid, grid, indexing="ij")
+    side_likelihoods = compute_sweep_side_likelihoods(
+        model=model,
+        diagnosis=diagnosis,
+        specificities=specificities.ravel(),
+        sensitivities=sensitivities.ravel(),
+    )
+    keys, means, stds = compute_risk_stats_in_batches(model, priors, side_likelihoods)
+    shape = (len(grid), len(grid), len(keys))
+    return keys, means.reshape(shape), stds.reshape(shape)
+
+
+def compute_sweep_payload(
+    checkpoint: CheckpointModel,
+    form_data: dict[str, Any],
+    lnls: list[str],
+    step: float = SWEEP_STEP,
+) -> dict[str, Any]:
+    """Compute the risk surface for the diagnosis in the cleaned ``form_data``.
+
+    The specificity and sensitivity of the ``form_data`` are ignored. Instead, the
+    payload contains the ``grid`` of values both take (see `get_sweep_grid` for the
+    ``step``), and for every key like ``ipsi_II`` the ``mean`` and ``std`` of the
+    risk as nested lists (specificity first, then sensitivity), rounded to two
+    decimals.
+    """
+    start_time = time.perf_counter()
+    model = checkpoint.construct_model()
+    priors = checkpoint.compute_priors(t_stage=form_data["t_stage"])
+    priors = select_midext_priors(priors=priors, midext=form_data.get("midext"))
+    grid = get_sweep_grid(step=step)
+    keys, means, stds = compute_risk_surface(
+        model=model,
+        priors=priors,
+        diagnosis=assemble_diagnosis(form_data=form_data, lnls=lnls),
+        grid=grid,
+    )
+
+    payload = {"grid": grid.tolist()}
+    for i, key in enumerate(keys):
+        if key not in form_data:
+            continue
+        payload[key] = {
+            "mean": means[..., i].round(2).tolist(),
+            "std": stds[..., i].round(2).tolist(),
+        }
+
+    end_time = time.perf_counter()
+    logger.info(
+        f"Computed risks for {len(grid)}x{len(grid)} specificities/sensitivities "
+        f"in {end_time - start_time:.2f} seconds."
+    )
+    return payload
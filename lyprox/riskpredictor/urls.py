@@ -1,7 +1,13 @@
 """URLs related to the `riskpredictor` prediction app.
 
 This app is reachable under the URL ``https://lyprox.org/riskpredictor``. Like the
-`dataexplorer`, this includes a dashboard and a help page.
+`dataexplorer`, this includes a dashboard and a help page. Logged-in users can score
+cohorts of diagnoses at once by sending them to the ``<checkpoint_pk>/batch/``
+endpoint, and the ``<checkpoint_pk>/sweep/`` endpoint returns the risks of one
+diagnosis for all specificities and sensitivities. The ``<checkpoint_pk>/stream/``
+endpoint streams estimates of the risks that are refined as more samples are
+processed. The risks of one diagnosis under several checkpoints are compared side by
+side via ``compare/``.
 """
 
 from django.urls import path
@@ -12,8 +18,12 @@ app_name = "riskpredictor"
 urlpatterns = [
     path("add/", views.AddCheckpointModelView.as_view(), name="add"),
     path("list/", views.ChooseCheckpointModelView.as_view(), name="list"),
+    path("compare/", views.compare_risk_prediction, name="compare"),
     path("<int:checkpoint_pk>/", views.render_risk_prediction, name="dashboard"),
     path("<int:checkpoint_pk>/ajax/", views.update_risk_prediction, name="ajax"),
+    path("<int:checkpoint_pk>/stream/", views.stream_risk_prediction, name="stream"),
+    path("<int:checkpoint_pk>/sweep/", views.sweep_risk_prediction, name="sweep"),
+    path("<int:checkpoint_pk>/batch/", views.batch_risk_prediction, name="batch"),
     path("help/", views.help_view, name="help"),
     path("test/", views.test_view, name="test"),
 ]
@@ -3,22 +3,28 @@
 # pylint: disable=attribute-defined-outside-init
 import json
 import logging
+from copy import deepcopy
 from typing import Any
 
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.views.generic import CreateView, ListView
 from lymph import graph
 from lymph.types import Model
 
 from lyprox.loggers import ViewLoggerMixin
-from lyprox.riskpredictor import predict
+from lyprox.riskpredictor import batch, compare, predict, progressive, sweep
 from lyprox.riskpredictor.forms import CheckpointModelForm, RiskpredictorForm
-from lyprox.riskpredictor.models import (
-    CheckpointModel,
-    cached_construct_model_and_add_dists,
-)
+from lyprox.riskpredictor.models import CheckpointModel
 
 logger = logging.getLogger(__name__)
 
@@ -59,7 +65,11 @@ class AddCheckpointModelView(
 
 
 class ChooseCheckpointModelView(ViewLoggerMixin, ListView):
-    """View for choosing a `CheckpointModel` instance."""
+    """View for choosing a `CheckpointModel` instance.
+
+    Checkpoints that are still warming up show the progress of their latest
+    `models.PrecomputeJob` instead of a link to the dashboard.
+    """
 
     model = CheckpointModel
     template_name = "riskpredictor/checkpoint_list.html"
@@ -72,10 +82,29 @@ class ChooseCheckpointModelView(ViewLoggerMixin, ListView):
         return context
 
 
+def respond_not_ready(checkpoint: CheckpointModel) -> JsonResponse:
+    """Tell the client that the ``checkpoint``'s priors are not precomputed yet.
+
+    The views of the dashboard do not compute the priors of a checkpoint that is
+    still warming up, since this is done in the background (see `jobs`).
+    """
+    logger.info(f"Refused request for {checkpoint}, which is {checkpoint.status}.")
+    return JsonResponse(
+        {"error": f"Model {checkpoint} is not ready ({checkpoint.status})."},
+        status=503,
+    )
+
+
 def render_risk_prediction(request: HttpRequest, checkpoint_pk: int) -> HttpResponse:
     """View for the riskpredictor dashboard."""
     request_data = request.GET
     checkpoint = CheckpointModel.objects.get(pk=checkpoint_pk)
+
+    if not checkpoint.is_ready:
+        logger.info(f"Rendering not-ready page for {checkpoint}.")
+        context = {"checkpoint": checkpoint, "job": checkpoint.latest_job}
+        return render(request, "riskpredictor/not_ready.html", context, status=503)
+
     form = RiskpredictorForm(request_data, checkpoint=checkpoint)
 
     if not form.is_valid():
@@ -87,18 +116,15 @@ def render_risk_prediction(request: HttpRequest, checkpoint_pk: int) -> HttpResp
         return HttpResponse("Form is not valid.")
 
     lnls = list(form.get_lnls())
-    risks = predict.compute_risks(
+    payload = predict.get_risks_payload(
         checkpoint=checkpoint,
         form_data=form.cleaned_data,
         lnls=lnls,
     )
-    graph_config, model_config, dist_configs, version = checkpoint.validate_configs()
-    model = cached_construct_model_and_add_dists(
-        graph_config=graph_config,
-        model_config=model_config,
-        dist_configs=dist_configs,
-        version=version,
-    )
+    risks = predict.risks_from_payload(payload)
+    _, model_config, dist_configs, _ = checkpoint.validate_configs()
+    # the registered model is shared, so the mean parameters are set on a copy
+    model = deepcopy(checkpoint.construct_model())
     model.set_named_params(*checkpoint.fetch_samples().mean(axis=0))
     graph_repr = retrieve_graph_representation(model)
 
@@ -120,11 +146,15 @@ def update_risk_prediction(request: HttpRequest, checkpoint_pk: int) -> JsonResp
     """View for the AJAX request of the riskpredictor dashboard.
 
     This view receives the same data as the `render_risk_prediction` function, but in
-    JSON format. It then computes the risks and returns them in JSON format again to be
-    handled by JavaScript on the client side.
+    JSON format. It then computes the risks (or looks them up, see
+    `predict.get_risks_payload`) and returns them in JSON format again to be handled by
+    JavaScript on the client side.
     """
     request_data = json.loads(request.body.decode("utf-8"))
     checkpoint = CheckpointModel.objects.get(pk=checkpoint_pk)
+    if not checkpoint.is_ready:
+        return respond_not_ready(checkpoint)
+
     form = RiskpredictorForm(request_data, checkpoint=checkpoint)
 
     if not form.is_valid():
@@ -132,17 +162,188 @@ def update_risk_prediction(request: HttpRequest, checkpoint_pk: int) -> JsonResp
         return JsonResponse({"error": "Form is not valid."})
 
     lnls = list(form.get_lnls())
-    risks = predict.compute_risks(
+    payload = predict.get_risks_payload(
         checkpoint=checkpoint,
         form_data=form.cleaned_data,
         lnls=lnls,
     )
-    risks = risks.model_dump()
+    risks = dict(payload)
     risks["total"] = 100.0
     risks["type"] = "risk"
     return JsonResponse(risks)
 
 
+def stream_risk_prediction(
+    request: HttpRequest,
+    checkpoint_pk: int,
+) -> StreamingHttpResponse | JsonResponse:
+    """View that streams progressively refined risks for the dashboard's diagnosis.
+
+    This receives the same JSON data as `update_risk_prediction`. But instead of
+    waiting for the risks over all samples, it first returns an estimate from a small
+    random subset of the samples and then refined ones, one JSON line at a time (see
+    `progressive.iter_progressive_payloads`). The last line has ``"final": true`` and
+    contains the same risks that `update_risk_prediction` returns.
+    """
+    request_data = json.loads(request.body.decode("utf-8"))
+    checkpoint = CheckpointModel.objects.get(pk=checkpoint_pk)
+    if not checkpoint.is_ready:
+        return respond_not_ready(checkpoint)
+
+    form = RiskpredictorForm(request_data, checkpoint=checkpoint)
+
+    if not form.is_valid():
+        logger.error("Riskpredictor form from stream request not valid.")
+        return JsonResponse({"error": "Form is not valid."})
+
+    payloads = progressive.iter_progressive_payloads(
+        checkpoint=checkpoint,
+        form_data=form.cleaned_data,
+        lnls=list(form.get_lnls()),
+    )
+    return StreamingHttpResponse(
+        (progressive.serialize_payload(payload) for payload in payloads),
+        content_type="application/x-ndjson",
+    )
+
+
+def sweep_risk_prediction(request: HttpRequest, checkpoint_pk: int) -> JsonResponse:
+    """View for the risks of one diagnosis for all specificities and sensitivities.
+
+    Like `update_risk_prediction`, this receives the dashboard's form data as JSON. But
+    it returns the risk surface over a grid of specificities and sensitivities (see
+    `sweep.compute_sweep_payload`), computed in one batched pass. This way, the client
+    does not need to send a request for every step of a slider. The grid's step may
+    be set with the GET parameter ``step`` (e.g. ``?step=0.01`` for every value the
+    sliders can take).
+    """
+    request_data = json.loads(request.body.decode("utf-8"))
+    checkpoint = CheckpointModel.objects.get(pk=checkpoint_pk)
+    if not checkpoint.is_ready:
+        return respond_not_ready(checkpoint)
+
+    form = RiskpredictorForm(request_data, checkpoint=checkpoint)
+
+    if not form.is_valid():
+        logger.error("Riskpredictor form from sweep request not valid.")
+        return JsonResponse({"error": "Form is not valid."})
+
+    try:
+        payload = sweep.compute_sweep_payload(
+            checkpoint=checkpoint,
+            form_data=form.cleaned_data,
+            lnls=list(form.get_lnls()),
+            step=float(request.GET.get("step", sweep.SWEEP_STEP)),
+        )
+    except ValueError as val_err:
+        logger.error(f"Invalid step for sweep request: {val_err}")
+        return JsonResponse({"error": str(val_err)})
+
+    payload["type"] = "sweep"
+    return JsonResponse(payload)
+
+
+@csrf_exempt
+@login_required
+@require_POST
+def compare_risk_prediction(request: HttpRequest) -> JsonResponse:
+    """View for the risks of one diagnosis under several checkpoints.
+
+    The JSON data contains a list of the checkpoints' primary keys under
+    ``"checkpoints"`` and the diagnosis in the same fields as the dashboard's form.
+    Missing fields take their initial values. The risks of all checkpoints are
+    computed in parallel and returned as one table with a column per checkpoint (see
+    `compare.compute_comparison_payload`).
+
+    Like `batch_risk_prediction`, this view is expensive. So, only logged-in users may
+    use it, and with at most `compare.COMPARE_MAX_CHECKPOINTS` checkpoints.
+    """
+    try:
+        request_data = json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError as json_err:
+        logger.error(f"Invalid JSON in comparison request: {json_err}")
+        return JsonResponse({"error": "Invalid JSON data."}, status=400)
+
+    checkpoint_pks = None
+    if isinstance(request_data, dict):
+        checkpoint_pks = request_data.pop("checkpoints", [])
+
+    if not isinstance(checkpoint_pks, list) or not all(
+        isinstance(pk, int) and not isinstance(pk, bool) for pk in checkpoint_pks
+    ):
+        logger.error(f"Invalid checkpoints in comparison request: {checkpoint_pks}")
+        return JsonResponse(
+            {"error": "Checkpoints must be a list of primary keys."},
+            status=400,
+        )
+
+    if len(checkpoint_pks) > compare.COMPARE_MAX_CHECKPOINTS:
+        logger.error(f"Refused comparison of {len(checkpoint_pks)} checkpoints.")
+        return JsonResponse(
+            {"error": f"At most {compare.COMPARE_MAX_CHECKPOINTS} checkpoints."},
+            status=400,
+        )
+
+    checkpoints = CheckpointModel.objects.in_bulk(checkpoint_pks)
+    if not checkpoint_pks or len(checkpoints) < len(set(checkpoint_pks)):
+        logger.error(f"Unknown checkpoints in comparison request: {checkpoint_pks}")
+        return JsonResponse({"error": "Unknown or no checkpoints given."})
+
+    payload = compare.compute_comparison_payload(
+        checkpoints=[checkpoints[pk] for pk in checkpoint_pks],
+        diagnosis=request_data,
+    )
+    payload["type"] = "comparison"
+    return JsonResponse(payload)
+
+
+@csrf_exempt
+@login_required
+@require_POST
+def batch_risk_prediction(
+    request: HttpRequest,
+    checkpoint_pk: int,
+) -> StreamingHttpResponse | JsonResponse:
+    """Score many diagnoses sent in the request body and stream the results back.
+
+    The body contains one diagnosis per line, either as JSON lines or, if the content
+    type is ``text/csv``, as CSV with a header. Every diagnosis has the same fields as
+    the dashboard's form, plus an optional ``id``. The results are streamed back as
+    JSON lines, one chunk of `batch.BATCH_CHUNK_SIZE` diagnoses at a time (see
+    `batch.iter_scored_chunks`).
+
+    Since this view does not change anything and is meant to be called by scripts, it
+    does not require a CSRF token. But because scoring is expensive, only logged-in
+    users may use it, and at most `batch.BATCH_MAX_ROWS` diagnoses per request.
+    """
+    checkpoint = CheckpointModel.objects.get(pk=checkpoint_pk)
+    if not checkpoint.is_ready:
+        return respond_not_ready(checkpoint)
+
+    lines = request.body.decode("utf-8").splitlines()
+    num_rows = sum(1 for line in lines if line.strip())
+    if request.content_type == "text/csv":
+        num_rows -= 1
+
+    if num_rows > batch.BATCH_MAX_ROWS:
+        logger.error(f"Refused batch request with {num_rows} diagnoses.")
+        return JsonResponse(
+            {"error": f"At most {batch.BATCH_MAX_ROWS} diagnoses per request."},
+            status=413,
+        )
+
+    if request.content_type == "text/csv":
+        rows = batch.read_csv(lines)
+    else:
+        rows = batch.read_jsonl(lines)
+
+    chunks = batch.iter_scored_chunks(checkpoint=checkpoint, rows=rows)
+    return StreamingHttpResponse(
+        (batch.serialize_chunk(chunk) for chunk in chunks),
+        content_type="application/x-ndjson",
+    )
+
+
 def help_view(request) -> HttpResponse:
     """View for the help page of the riskpredictor app."""
     template_name = "riskpredictor/help/index.html"
@@ -358,3 +358,31 @@ PUBLICATIONS_PATH = STATIC_ROOT / "publications" / "data.yaml"
 JOBLIB_CACHE_DIR = BASE_DIR / ".cache"
 JOBLIB_MEMORY = Memory(location=JOBLIB_CACHE_DIR, verbose=0)
 """Cache for joblib. This is used to cache the results of expensive computations."""
+
+PATIENT_STORE_DIR = JOBLIB_CACHE_DIR / "patient_store"
+"""Where the memory-mapped columns of the joined patient table are stored."""
+
+DATASET_STORE_DIR = JOBLIB_CACHE_DIR / "datasets"
+"""Where the memory-mapped columns of each dataset's table are stored."""
+
+SAMPLES_STORE_DIR = JOBLIB_CACHE_DIR / "samples"
+"""Where the subsets of the checkpoints' parameter samples are stored."""
+
+PRIORS_STORE_DIR = JOBLIB_CACHE_DIR / "priors"
+"""Where the memory-mapped priors of the checkpoints are stored."""
+
+PRIORS_DTYPE = os.getenv("DJANGO_PRIORS_DTYPE", "float64")
+"""Dtype of the stored priors. ``"float32"`` halves their size in memory."""
+
+PRIORS_MAX_WORKERS = int(os.getenv("DJANGO_PRIORS_MAX_WORKERS", "1"))
+"""Processes for computing the priors of models that cannot be evolved stacked."""
+
+COMPARE_MAX_WORKERS = int(os.getenv("DJANGO_COMPARE_MAX_WORKERS", "4"))
+"""Threads for computing the risks of several checkpoints for one comparison."""
+
+PRECOMPUTE_MAX_WORKERS = int(os.getenv("DJANGO_PRECOMPUTE_MAX_WORKERS", "2"))
+"""Processes for precomputing the priors of saved checkpoints in the background.
+
+If set to ``0``, the priors are precomputed in the process that saves the checkpoint,
+before the saving returns.
+"""
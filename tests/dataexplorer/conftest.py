@@ -1,9 +1,21 @@
 from collections import namedtuple
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+from types import SimpleNamespace
 from typing import Any
 
-from pytest import fixture
+import numpy as np
+import pandas as pd
+from lydata.utils import get_default_modalities
+from pytest import MonkeyPatch, fixture
 
+from lyprox.accounts.models import Institution
+from lyprox.dataexplorer import models, query
 from lyprox.dataexplorer.forms import DataexplorerForm
+from lyprox.dataexplorer.models import DatasetModel
+from lyprox.dataexplorer.query import combine_involvement
+from lyprox.settings import LNLS
 
 
 MockUser = namedtuple("MockUser", ["is_authenticated"])
@@ -18,3 +30,131 @@ def cleaned_initial_form() -> dict[str, Any]:
         raise ValueError("Initial form is not valid.")
 
     return initial_form.cleaned_data
+
+
+def create_synthetic_table(
+    num_patients: int = 300,
+    name: str = "2021-usz-oropharynx",
+    seed: int = 42,
+) -> pd.DataFrame:
+    """Create a random table of patients with the columns the dashboard needs."""
+    rng = np.random.default_rng(seed)
+
+    def nullable_bools(missing: float = 0.2) -> pd.arrays.BooleanArray:
+        values = pd.array(rng.random(num_patients) < 0.5, dtype="boolean")
+        values[rng.random(num_patients) < missing] = pd.NA
+        return values
+
+    def dates() -> pd.Series:
+        days = pd.to_timedelta(rng.integers(0, 2000, num_patients), unit="D")
+        return pd.Timestamp("2015-01-01") + days
+
+    data = {
+        ("patient", "core", "id"): [f"{name}-{i}" for i in range(num_patients)],
+        ("patient", "core", "institution"): ["University Hospital Zurich"]
+        * num_patients,
+        ("patient", "core", "sex"): rng.choice(["male", "female"], num_patients),
+        ("patient", "core", "age"): pd.array(
+            rng.integers(30, 90, num_patients), dtype="Int64"
+        ),
+        ("patient", "core", "diagnose_date"): dates(),
+        ("patient", "core", "nicotine_abuse"): nullable_bools(),
+        ("patient", "core", "hpv_status"): nullable_bools(),
+        ("patient", "core", "neck_dissection"): nullable_bools(),
+        ("patient", "core", "n_stage"): pd.array(
+            rng.integers(0, 4, num_patients), dtype="Int64"
+        ),
+        ("tumor", "core", "location"): rng.choice(
+            ["tonsil", "base of tongue"], num_patients
+        ),
+        ("tumor", "core", "subsite"): rng.choice(
+            ["C01", "C09.0", "C09.1", "C10.3"], num_patients
+        ),
+        ("tumor", "core", "central"): nullable_bools(),
+        ("tumor", "core", "extension"): nullable_bools(),
+        ("tumor", "core", "t_stage"): pd.array(
+            rng.integers(1, 5, num_patients), dtype="Int64"
+        ),
+    }
+    for modality in get_default_modalities():
+        data[modality, "core", "date"] = dates()
+        for side in ["ipsi", "contra"]:
+            for lnl in LNLS:
+                data[modality, side, lnl] = nullable_bools(missing=0.5)
+
+    table = pd.DataFrame(data)
+    table.columns = pd.MultiIndex.from_tuples(table.columns)
+    table["dataset", "core", "name"] = name
+    return table
+
+
+def combine_default_modalities(
+    table: pd.DataFrame,
+    method: str = "max_llh",
+) -> pd.DataFrame:
+    """Add the consensus involvement of all default modalities to the ``table``."""
+    combined = combine_involvement(table, get_default_modalities(), method)
+    return pd.concat([table, combined], axis="columns")
+
+
+@fixture
+def make_synthetic_table() -> Callable[..., pd.DataFrame]:
+    """Return the factory of random tables of patients (`create_synthetic_table`)."""
+    return create_synthetic_table
+
+
+@fixture
+def add_combined_involvement() -> Callable[..., pd.DataFrame]:
+    """Return the function that adds combined involvement columns to a table."""
+    return combine_default_modalities
+
+
+@fixture
+def synthetic_table() -> pd.DataFrame:
+    """Return a random table of patients with combined involvement columns."""
+    return combine_default_modalities(create_synthetic_table())
+
+
+def fetch_synthetic_dataframe(
+    year: int,
+    institution: str,
+    subsite: str,
+    **_kwargs,
+) -> pd.DataFrame:
+    """Return a random table instead of fetching a dataset from GitHub."""
+    name = f"{year}-{institution}-{subsite}"
+    table = create_synthetic_table(num_patients=100, name=name, seed=year)
+    return table.drop(columns=[("dataset", "core", "name")])
+
+
+@fixture
+def stored_datasets(
+    db,
+    tmp_path: Path,
+    monkeypatch: MonkeyPatch,
+) -> list[DatasetModel]:
+    """Create datasets whose tables are random and stored in a temporary directory."""
+    repo = SimpleNamespace(private=False, pushed_at=datetime(2025, 1, 1, tzinfo=UTC))
+    monkeypatch.setattr(DatasetModel, "get_repo", lambda self: repo)
+    monkeypatch.setattr(models, "fetch_dataframe", fetch_synthetic_dataframe)
+    monkeypatch.setattr(models, "DATASET_STORE_DIR", tmp_path / "datasets")
+    monkeypatch.setattr(query, "PATIENT_STORE_DIR", tmp_path / "patient_store")
+
+    institution = Institution.objects.create(
+        name="University Hospital Zurich",
+        shortname="USZ",
+        street="Raemistrasse 100",
+        city="Zurich",
+        country="CH",
+        phone="+41442551111",
+    )
+    return [
+        DatasetModel.objects.create(
+            year=year,
+            institution=institution,
+            subsite="oropharynx",
+            repo_name=f"lycosystem/{year}-usz-oropharynx",
+            ref="main",
+        )
+        for year in [2021, 2023]
+    ]
@@ -0,0 +1,66 @@
+"""Test the bitmap index used for executing queries."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from lydata import C
+
+from lyprox.dataexplorer.bitmap import BitmapIndex
+from lyprox.dataexplorer.query import get_lnl_query, get_risk_factor_query
+from lyprox.settings import LNLS
+
+
+@pytest.fixture
+def index(synthetic_table: pd.DataFrame) -> BitmapIndex:
+    """Return a bitmap index of the synthetic table."""
+    return BitmapIndex.from_table(synthetic_table, method="max_llh")
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        C("t_stage").isin([1, 2]),
+        C("subsite").isin(["C01", "C10.3", "C32"]),
+        (C("hpv") == True) & (C("smoke") == False),
+        (C("n_stage") > 0) | (C("midext") == True),
+        ~(C("max_llh", "ipsi", "II") == True)
+        & (C("max_llh", "contra", "III") == False),
+    ],
+)
+def test_execute_matches_lydata(
+    synthetic_table: pd.DataFrame,
+    index: BitmapIndex,
+    query,
+) -> None:
+    """Check that the index returns the same rows as the lydata query."""
+    expected = query.execute(synthetic_table).fillna(False).to_numpy(dtype=bool)
+    assert np.array_equal(index.execute(query), expected)
+
+
+def test_execute_form_queries(
+    synthetic_table: pd.DataFrame,
+    index: BitmapIndex,
+) -> None:
+    """Check the queries created from (a subset of) the form data."""
+    cleaned_form = {
+        "t_stage": [1, 2, 3, 4],
+        "subsite": ["C01", "C09.0", "C09.1"],
+        "smoke": None,
+        "hpv": True,
+        "surgery": None,
+        "midext": None,
+        "central": False,
+        "is_n_plus": True,
+        "modality_combine": "max_llh",
+        **{f"{side}_{lnl}": None for side in ["ipsi", "contra"] for lnl in LNLS},
+    }
+    cleaned_form["ipsi_II"] = True
+    query = get_risk_factor_query(cleaned_form) & get_lnl_query(cleaned_form)
+    expected = synthetic_table.ly.query(query)
+    assert synthetic_table[index.execute(query)].equals(expected)
+
+
+def test_unindexed_column_raises(index: BitmapIndex) -> None:
+    """Comparisons on columns that are not indexed must not silently return rows."""
+    with pytest.raises(KeyError):
+        index.execute(C("age") > 50)
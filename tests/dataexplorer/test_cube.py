@@ -0,0 +1,49 @@
+"""Test the count cube for queries on risk factors only."""
+
+import pandas as pd
+import pytest
+from lydata import C
+
+from lyprox.dataexplorer.bitmap import DATASET_COLUMN
+from lyprox.dataexplorer.query import (
+    Statistics,
+    cached_build_count_cube,
+    decode_counts,
+)
+
+
+@pytest.fixture
+def two_datasets_table(synthetic_table: pd.DataFrame) -> pd.DataFrame:
+    """Return the synthetic table with its patients split into two datasets."""
+    names = ["2021-usz-oropharynx", "2023-clb-multisite"]
+    synthetic_table[DATASET_COLUMN] = pd.Categorical(
+        [names[i % 2] for i in range(len(synthetic_table))],
+    )
+    return synthetic_table
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        C(*DATASET_COLUMN).isin(["2021-usz-oropharynx", "2023-clb-multisite"]),
+        C(*DATASET_COLUMN).isin(["2023-clb-multisite"]) & (C("hpv") == True),
+        C("t_stage").isin([3, 4]) & C("subsite").isin(["C01", "C09.1"]),
+        (C("n_stage") > 0) & (C("smoke") == False) & (C("midext") == True),
+        (C("n_stage") == 0) & (C("central") == True) & (C("surgery") == False),
+        C(*DATASET_COLUMN).isin([]),
+    ],
+)
+def test_cube_matches_row_statistics(two_datasets_table: pd.DataFrame, query) -> None:
+    """Summing the cube's cells must give the same statistics as counting rows."""
+    lnl_columns = ["max_llh"]
+    cube, values = cached_build_count_cube(
+        ("test-cube", len(two_datasets_table)),
+        two_datasets_table.drop(columns=lnl_columns),
+        two_datasets_table[lnl_columns],
+        "max_llh",
+    )
+    assert len(cube.cells) < len(two_datasets_table)
+
+    stats = Statistics(**decode_counts(cube.count(query), values))
+    expected = Statistics.from_table(two_datasets_table.ly.query(query))
+    assert stats == expected
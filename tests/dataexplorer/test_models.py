@@ -1,5 +1,41 @@
 """Test the data models and loading."""
 
+from pathlib import Path
+
+import pandas as pd
 import pytest
 
+from lyprox.dataexplorer import models
 from lyprox.dataexplorer.models import ensure_lnls_in_modalities
+
+
+def test_cached_load_dataframe(
+    synthetic_table: pd.DataFrame,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A dataset must only be fetched once per ref."""
+    fetched_refs = []
+
+    def fetch_dataframe(**kwargs) -> pd.DataFrame:
+        fetched_refs.append(kwargs["ref"])
+        return synthetic_table
+
+    monkeypatch.setattr(models, "DATASET_STORE_DIR", tmp_path)
+    monkeypatch.setattr(models, "fetch_dataframe", fetch_dataframe)
+    kwargs = {
+        "year": 2021,
+        "institution": "usz",
+        "subsite": "oropharynx",
+        "repo_name": "lycosystem/lydata",
+    }
+
+    full = models.cached_load_dataframe(**kwargs, ref="v1")
+    again = models.cached_load_dataframe(**kwargs, ref="v1")
+    assert fetched_refs == ["v1"]
+    assert full.shape == synthetic_table.shape
+    assert again.columns.equals(full.columns)
+
+    models.cached_load_dataframe(**kwargs, ref="v2")
+    assert fetched_refs == ["v1", "v2"]
+    assert len(list((tmp_path / "2021-usz-oropharynx").iterdir())) == 1
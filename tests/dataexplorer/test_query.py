@@ -1,11 +1,32 @@
 """Test the querying functionality."""
 
+from collections.abc import Callable
+from types import SimpleNamespace
 from typing import Any
 
 import pandas as pd
+import pytest
 from lydata import C
+from lydata.utils import get_default_modalities
 
-from lyprox.dataexplorer.query import BaseStatistics, Statistics, execute_query
+from lyprox.dataexplorer.bitmap import DATASET_COLUMN, BitmapIndex
+from lyprox.dataexplorer.query import (
+    BaseStatistics,
+    Statistics,
+    assemble_selected_modalities,
+    cached_combine_involvement,
+    combine_involvement,
+    compute_statistics,
+    encode_column,
+    evict_dataset,
+    execute_query,
+    get_lnl_query,
+    iter_query_chunks,
+    get_query_key,
+    get_risk_factor_query,
+    join_dataset_tables,
+)
+from lyprox.dataexplorer.models import DatasetModel
 
 
 def test_contradiction(dataset: pd.DataFrame) -> None:
@@ -38,3 +59,157 @@ def test_execute_query(cleaned_initial_form: dict[str, Any]) -> None:
     cleaned_initial_form["contra_II"] = False
     queried_dataset = execute_query(cleaned_form_data=cleaned_initial_form)
     assert len(queried_dataset) == 696, "Wrong number of patients in queried dataset"
+
+
+def reference_value_counts(column: pd.Series) -> dict[Any, int]:
+    """Count values like the dashboard did before vectorizing the statistics."""
+    return {
+        (None if pd.isna(key) else key): value
+        for key, value in column.value_counts(dropna=False).to_dict().items()
+    }
+
+
+def test_vectorized_stats_match_value_counts(synthetic_table: pd.DataFrame) -> None:
+    """Check the single-pass statistics against per-column value counts."""
+    queried_table = synthetic_table.iloc[::3]
+    stats = Statistics.from_table(queried_table)
+
+    assert stats.total == len(queried_table)
+    assert stats.datasets == {"2021-usz-oropharynx": len(queried_table)}
+    assert stats.hpv == reference_value_counts(queried_table.ly.hpv)
+    assert stats.t_stage == {0: 0, **reference_value_counts(queried_table.ly.t_stage)}
+    assert stats.is_n_plus == {
+        None: 0,
+        **reference_value_counts(queried_table.ly.n_stage > 0),
+    }
+    for side in ["ipsi", "contra"]:
+        for lnl in ["II", "IIa", "IV"]:
+            expected = reference_value_counts(queried_table["max_llh", side, lnl])
+            assert getattr(stats, f"{side}_{lnl}") == {None: 0, **expected}
+
+
+@pytest.mark.parametrize("dtype", ["boolean", "object"])
+def test_encode_column_with_missing_values(dtype: str) -> None:
+    """Missing values must be encoded with the last code and decoded to ``None``."""
+    column = pd.Series([True, None, False, True], dtype=dtype)
+    codes, values = encode_column(column)
+    assert values[-1] is None
+    assert [values[code] for code in codes] == [True, None, False, True]
+
+
+def test_cached_combine_involvement_and_eviction(synthetic_table: pd.DataFrame) -> None:
+    """Combined involvement must be cached until its dataset is evicted."""
+    modalities = get_default_modalities()
+    fingerprint = ((("2000-test-cached", "v1"),), tuple(sorted(modalities)), "max_llh")
+    args = (fingerprint, synthetic_table, modalities, "max_llh")
+
+    first = cached_combine_involvement(*args)
+    second = cached_combine_involvement(*args)
+    assert first is second
+    assert first.columns.get_level_values(0).unique().tolist() == ["max_llh"]
+    assert all(isinstance(dtype, pd.BooleanDtype) for dtype in first.dtypes)
+
+    assert evict_dataset("2000-test-cached") >= 1
+    assert fingerprint not in cached_combine_involvement.cache
+    third = cached_combine_involvement(*args)
+    assert third is not first
+    pd.testing.assert_frame_equal(first, third)
+
+
+def test_select_datasets_from_joined_table(
+    make_synthetic_table: Callable[..., pd.DataFrame],
+    add_combined_involvement: Callable[..., pd.DataFrame],
+) -> None:
+    """Selecting datasets from the joined table must act like joining only them."""
+    names = ["2021-usz-oropharynx", "2023-clb-multisite", "2025-hvh-oropharynx"]
+    datasets = [
+        SimpleNamespace(
+            name=name,
+            load_dataframe=lambda seed=seed: make_synthetic_table(50, seed=seed).drop(
+                columns=[DATASET_COLUMN],
+            ),
+        )
+        for seed, name in enumerate(names)
+    ]
+    joined = add_combined_involvement(join_dataset_tables(datasets))
+    assert isinstance(joined[DATASET_COLUMN].dtype, pd.CategoricalDtype)
+    assert joined[DATASET_COLUMN].value_counts().to_dict() == dict.fromkeys(names, 50)
+
+    index = BitmapIndex.from_table(joined)
+    query = C(*DATASET_COLUMN).isin(names[1:])
+    selected = joined[index.execute(query)].reset_index(drop=True)
+    expected = add_combined_involvement(join_dataset_tables(datasets[1:]))
+    pd.testing.assert_frame_equal(
+        selected.astype({DATASET_COLUMN: str}),
+        expected.astype({DATASET_COLUMN: str}),
+    )
+
+
+def test_query_key_is_canonical() -> None:
+    """The query key must not depend on the order of fields and selected values."""
+    datasets = [SimpleNamespace(name="2021-usz-oropharynx")]
+    fingerprint = (("2021-usz-oropharynx", "v1", None),)
+    form = {"t_stage": [1, 2], "hpv": True, "datasets": datasets}
+    reordered = {"datasets": datasets, "hpv": True, "t_stage": [2, 1]}
+    changed = {"t_stage": [1, 2], "hpv": False, "datasets": datasets}
+    updated = (("2021-usz-oropharynx", "v2", None),)
+
+    assert get_query_key(form, fingerprint) == get_query_key(reordered, fingerprint)
+    assert get_query_key(form, fingerprint) != get_query_key(changed, fingerprint)
+    assert get_query_key(form, fingerprint) != get_query_key(form, updated)
+
+
+def test_execute_query_on_stored_datasets(
+    stored_datasets: list[DatasetModel],
+    cleaned_initial_form: dict[str, Any],
+) -> None:
+    """The query must return the same patients as querying the joined tables."""
+    cleaned_initial_form["hpv"] = True
+    cleaned_initial_form["ipsi_II"] = True
+    method = cleaned_initial_form["modality_combine"]
+    queried = execute_query(cleaned_form_data=cleaned_initial_form)
+
+    joined = join_dataset_tables(stored_datasets)
+    modalities = assemble_selected_modalities(cleaned_initial_form["modalities"])
+    joined = pd.concat(
+        [joined, combine_involvement(joined, modalities, method)],
+        axis="columns",
+    )
+    query = get_risk_factor_query(cleaned_initial_form)
+    query &= get_lnl_query(cleaned_initial_form)
+    expected = joined.ly.query(query)
+
+    assert len(queried) > 0
+    assert queried.index.tolist() == expected.index.tolist()
+    assert queried["patient", "core", "id"].tolist() == (
+        expected["patient", "core", "id"].tolist()
+    )
+
+
+def test_compute_statistics_is_cached(
+    stored_datasets: list[DatasetModel],
+    cleaned_initial_form: dict[str, Any],
+) -> None:
+    """Statistics must be cached until one of the datasets is updated."""
+    stats = compute_statistics(cleaned_form_data=cleaned_initial_form)
+    assert compute_statistics(cleaned_form_data=cleaned_initial_form) is stats
+    assert stats == Statistics.from_table(
+        table=execute_query(cleaned_form_data=cleaned_initial_form),
+        method=cleaned_initial_form["modality_combine"],
+    )
+
+    stored_datasets[0].ref = "v2"
+    stored_datasets[0].save()
+    assert compute_statistics(cleaned_form_data=cleaned_initial_form) is not stats
+
+
+def test_iter_query_chunks(
+    stored_datasets: list[DatasetModel],
+    cleaned_initial_form: dict[str, Any],
+) -> None:
+    """Concatenated chunks must be equal to the result of `execute_query`."""
+    queried_table = execute_query(cleaned_form_data=cleaned_initial_form)
+    chunks = list(iter_query_chunks(cleaned_initial_form, chunk_size=7))
+
+    assert all(len(chunk) <= 7 for chunk in chunks)
+    assert pd.concat(chunks).equals(queried_table)
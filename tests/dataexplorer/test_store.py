@@ -0,0 +1,54 @@
+"""Test the memory-mapped columnar store of the joined patient table."""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lyprox.dataexplorer.bitmap import DATASET_COLUMN
+from lyprox.dataexplorer.store import MANIFEST_NAME, get_or_create_store, load_store
+
+
+def test_store_roundtrip(synthetic_table: pd.DataFrame, tmp_path: Path) -> None:
+    """Loading a store must return the same values, with objects as categoricals."""
+    synthetic_table[DATASET_COLUMN] = pd.Categorical(synthetic_table[DATASET_COLUMN])
+    loaded = get_or_create_store("test", lambda: synthetic_table, root=tmp_path)
+
+    for column in synthetic_table.columns:
+        if synthetic_table[column].dtype == object:
+            assert isinstance(loaded[column].dtype, pd.CategoricalDtype)
+        else:
+            assert loaded[column].dtype == synthetic_table[column].dtype
+
+    pd.testing.assert_frame_equal(
+        loaded.astype(object),
+        synthetic_table.astype(object),
+        check_column_type=False,
+    )
+
+
+def test_store_is_memory_mapped(synthetic_table: pd.DataFrame, tmp_path: Path) -> None:
+    """The columns of a loaded store must not be copied into memory."""
+    get_or_create_store("test", lambda: synthetic_table, root=tmp_path)
+    loaded = load_store(tmp_path / "test")
+    data = loaded["CT", "ipsi", "II"].array._data
+
+    while not isinstance(data, np.memmap):
+        data = data.base
+
+    assert not data.flags.writeable
+
+
+def test_existing_store_is_reused(
+    synthetic_table: pd.DataFrame, tmp_path: Path
+) -> None:
+    """A complete store must be loaded instead of built again."""
+    get_or_create_store("first", lambda: synthetic_table, root=tmp_path)
+
+    def fail_to_build() -> pd.DataFrame:
+        raise AssertionError("Store should not be built again.")
+
+    get_or_create_store("first", fail_to_build, root=tmp_path)
+    get_or_create_store("second", lambda: synthetic_table, root=tmp_path)
+    assert [path.name for path in tmp_path.iterdir()] == ["second"]
+    assert (tmp_path / "second" / MANIFEST_NAME).exists()
@@ -1,6 +1,12 @@
 """Test some utility functions."""
 
-from lyprox.dataexplorer.utils import get_nested_fields
+import pandas as pd
+from lyprox.dataexplorer.models import DatasetModel
+from lyprox.dataexplorer.utils import (
+    INVOLVEMENT_CLASSES,
+    get_nested_fields,
+    render_table,
+)
 from pydantic import BaseModel
 import pytest
 
@@ -21,3 +27,24 @@ def test_get_nested_fields():
     assert "field_c" in fields
     assert "field_a" in fields["nested"]
     assert "field_b" in fields["nested"]
+
+
+def test_render_table(
+    stored_datasets: list[DatasetModel],
+    synthetic_table: pd.DataFrame,
+    django_assert_num_queries,
+) -> None:
+    """The table must be rendered with a single query for the institution names."""
+    page = synthetic_table.iloc[:15].copy()
+    page.loc[0, ("patient", "core", "sex")] = "<script>"
+    page.loc[1, ("max_llh", "ipsi", "II")] = pd.NA
+
+    with django_assert_num_queries(1):
+        html = render_table(page)
+
+    assert html.count("<tr>") == 3 + len(page)
+    assert ">USZ</td>" in html
+    assert "University Hospital Zurich" not in html
+    assert "&lt;script&gt;" in html and "<script>" not in html
+    assert f'<td class="{INVOLVEMENT_CLASSES[None]}">-</td>' in html
+    assert f'<td class="{INVOLVEMENT_CLASSES[True]}">True</td>' in html
@@ -0,0 +1,54 @@
+"""Test the table and download views of the dashboard."""
+
+import gzip
+import io
+
+import pandas as pd
+import pytest
+from django.test import Client
+from django.urls import reverse
+
+from lyprox.dataexplorer import query, views
+from lyprox.dataexplorer.models import DatasetModel
+
+
+def test_streaming_csv_download(
+    stored_datasets: list[DatasetModel],
+    client: Client,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """The streamed CSV must have one header and be identical when gzip-compressed."""
+    monkeypatch.setattr(views, "DOWNLOAD_CHUNK_SIZE", 7)
+    response = client.get(reverse("dataexplorer:download"))
+    assert response.streaming
+    assert "patients.csv" in response["Content-Disposition"]
+    content = b"".join(response.streaming_content)
+
+    gzip_response = client.get(
+        reverse("dataexplorer:download"), {"compression": "gzip"}
+    )
+    assert "patients.csv.gz" in gzip_response["Content-Disposition"]
+    assert gzip.decompress(b"".join(gzip_response.streaming_content)) == content
+
+    patients = pd.read_csv(io.BytesIO(content), header=[0, 1, 2])
+    assert len(patients) > views.DOWNLOAD_CHUNK_SIZE
+
+
+def test_table_pages_copy_only_their_rows(
+    stored_datasets: list[DatasetModel],
+    client: Client,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Every page of the table must only copy the rows it displays."""
+    num_taken = []
+
+    def take_patients(joined_table, combined_inv_table, positions):
+        num_taken.append(len(positions))
+        return query.take_patients(joined_table, combined_inv_table, positions)
+
+    monkeypatch.setattr(views, "take_patients", take_patients)
+    response = client.get(reverse("dataexplorer:table", args=[2]))
+    page = response.context["page"]
+    assert page.number == 2
+    assert page.paginator.count > 2 * page.paginator.per_page
+    assert num_taken == [page.paginator.per_page]
@@ -0,0 +1,122 @@
+from collections import Counter
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from joblib import Memory
+from lymph import models as lymph_models
+from lymph.diagnosis_times import Distribution
+from lymph.types import Model
+from lyscripts.configs import DiagnosisConfig
+from pytest import MonkeyPatch, fixture
+from scipy.stats import binom
+
+from lyprox.riskpredictor import jobs, models, predict, registry
+from lyprox.riskpredictor.forms import RiskpredictorForm
+from lyprox.riskpredictor.models import CheckpointModel
+from lyprox.riskpredictor.priors import compute_priors
+
+GRAPH = {("tumor", "T"): ["II", "III"], ("lnl", "II"): ["III"], ("lnl", "III"): []}
+
+
+def create_model(kind: str = "unilateral") -> Model:
+    """Create a small model of the given ``kind`` with an early T-stage dist."""
+    model = {
+        "unilateral": lambda: lymph_models.Unilateral(graph_dict=GRAPH),
+        "trinary": lambda: lymph_models.Unilateral.trinary(graph_dict=GRAPH),
+        "hpv": lambda: lymph_models.HPVUnilateral(graph_dict=GRAPH),
+        "bilateral": lambda: lymph_models.Bilateral(graph_dict=GRAPH),
+        "midline": lambda: lymph_models.Midline(graph_dict=GRAPH),
+        "midline_no_evo": lambda: lymph_models.Midline(
+            graph_dict=GRAPH,
+            use_central=True,
+            use_midext_evo=False,
+        ),
+    }[kind]()
+    model.set_distribution("early", Distribution(binom.pmf(np.arange(11), 10, 0.3)))
+    return model
+
+
+def create_samples(num_samples: int = 10, num_dims: int = 3) -> np.ndarray:
+    """Create random parameter samples of the unilateral model."""
+    return np.random.default_rng(42).random((num_samples, num_dims))
+
+
+@fixture
+def make_model() -> Callable[..., Model]:
+    """Return the factory of small models (`create_model`)."""
+    return create_model
+
+
+@fixture
+def make_samples() -> Callable[..., np.ndarray]:
+    """Return the factory of random parameter samples (`create_samples`)."""
+    return create_samples
+
+
+@fixture
+def diagnosis() -> DiagnosisConfig:
+    """Return a diagnosis with involved, healthy, and unknown LNLs."""
+    return DiagnosisConfig(
+        ipsi={"D": {"II": True, "III": None}},
+        contra={"D": {"II": False, "III": None}},
+    )
+
+
+@fixture
+def calls(monkeypatch: MonkeyPatch, tmp_path: Path) -> Counter:
+    """Stub the remote steps of the `CheckpointModel` and count the expensive ones.
+
+    The model is constructed by `create_model` and the samples come from
+    `create_samples`. The serialized risks are stored on ``tmp_path``, and saved
+    checkpoints are precomputed right away, such that the views may use them.
+    """
+    calls = Counter()
+    compute_risks = predict.compute_risks
+
+    def construct_model(**_kwargs) -> Model:
+        calls["construct"] += 1
+        return create_model()
+
+    def fetch_samples(**_kwargs) -> np.ndarray:
+        calls["samples"] += 1
+        return create_samples()
+
+    def cached_compute_priors(checkpoint_pk, samples_key, get_model, get_samples):
+        calls["priors"] += 1
+        return compute_priors(model=get_model(), samples=get_samples())
+
+    def counting_compute_risks(*args, **kwargs):
+        calls["risks"] += 1
+        return compute_risks(*args, **kwargs)
+
+    memory = Memory(location=tmp_path, verbose=0)
+    stored_risks_payload = memory.cache(
+        predict.stored_risks_payload.func,
+        ignore=predict.stored_risks_payload.ignore,
+    )
+    monkeypatch.setattr(models, "cached_fetch_and_merge_yaml", lambda **_kw: {})
+    monkeypatch.setattr(models, "validate_configs", lambda _yaml: (None, None, {}, 1))
+    monkeypatch.setattr(models, "cached_construct_model_and_add_dists", construct_model)
+    monkeypatch.setattr(models, "cached_fetch_model_samples", fetch_samples)
+    monkeypatch.setattr(models, "cached_compute_priors", cached_compute_priors)
+    monkeypatch.setattr(predict, "compute_risks", counting_compute_risks)
+    monkeypatch.setattr(predict, "stored_risks_payload", stored_risks_payload)
+    monkeypatch.setattr(jobs, "PRECOMPUTE_MAX_WORKERS", 0)
+    registry.REGISTRY.clear()
+    registry.RISKS_CACHE.clear()
+    return calls
+
+
+def create_form_data(checkpoint: CheckpointModel, **changes: Any) -> dict[str, Any]:
+    """Return the initial cleaned form data of the ``checkpoint`` with ``changes``."""
+    form = RiskpredictorForm.from_initial(checkpoint=checkpoint)
+    assert form.is_valid()
+    return {**form.cleaned_data, **changes}
+
+
+@fixture
+def get_form_data() -> Callable[..., dict[str, Any]]:
+    """Return the factory of a checkpoint's form data (`create_form_data`)."""
+    return create_form_data
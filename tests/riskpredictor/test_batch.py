@@ -0,0 +1,108 @@
+"""Test the batch scoring of cohorts via the module, the view, and the command."""
+
+import json
+from collections import Counter
+from collections.abc import Callable
+
+import numpy as np
+import pytest
+from django.core.management import call_command
+from django.test import Client
+
+from lyprox.riskpredictor import batch, predict
+from lyprox.riskpredictor.models import CheckpointModel
+
+ROWS = [
+    {"id": "a", "ipsi_II": True},
+    {"ipsi_III": None, "specificity": 0.9},
+    {"t_stage": "late"},
+    {"id": "d", "ipsi_II": True, "ipsi_III": True, "sensitivity": 0.7},
+]
+CSV_LINES = ["id,ipsi_II,ipsi_III,t_stage", "a,True,,early", "b,False,None,early"]
+
+
+def assert_matches_dashboard(
+    checkpoint: CheckpointModel,
+    form_data: dict,
+    result: dict,
+) -> None:
+    """The batch ``result`` must match the risks the dashboard computes."""
+    payload = predict.get_risks_payload(checkpoint, form_data, ["II", "III"])
+    for key, stats in payload.items():
+        assert np.isclose(result[key]["std"], stats[None])
+        assert np.isclose(result[key]["mean"], stats[True] + stats[None] / 2)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("max_bytes", [batch.BATCH_MAX_BYTES, 1])
+def test_scored_chunks(
+    max_bytes: int,
+    calls: Counter,
+    get_form_data: Callable[..., dict],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Every row must be scored like on the dashboard or get the form's errors."""
+    monkeypatch.setattr(batch, "BATCH_MAX_BYTES", max_bytes)
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    lines = [json.dumps(row) for row in ROWS]
+    chunks = list(batch.iter_scored_chunks(checkpoint, batch.read_jsonl(lines), 2))
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+
+    results = [result for chunk in chunks for result in chunk]
+    assert [result["id"] for result in results] == ["a", 1, 2, "d"]
+    assert "t_stage" in results[2]["errors"]
+    assert calls["risks"] == 0
+
+    for row, result in zip(ROWS, results, strict=True):
+        if "errors" not in result:
+            form_data = get_form_data(checkpoint, **row)
+            assert_matches_dashboard(checkpoint, form_data, result)
+
+
+@pytest.mark.django_db
+def test_batch_view(
+    calls: Counter,
+    client: Client,
+    django_user_model,
+    get_form_data: Callable[..., dict],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """The view must stream back one line of JSON per row of the CSV body."""
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    url = f"/riskpredictor/{checkpoint.pk}/batch/"
+    data = "\n".join(CSV_LINES)
+    response = client.post(url, data=data, content_type="text/csv")
+    assert response.status_code == 302
+    assert calls["risks"] == 0
+
+    user = django_user_model.objects.create_user(
+        email="user@example.com", password="password", is_active=True
+    )
+    client.force_login(user)
+    monkeypatch.setattr(batch, "BATCH_MAX_ROWS", 1)
+    response = client.post(url, data=data, content_type="text/csv")
+    assert response.status_code == 413
+
+    monkeypatch.setattr(batch, "BATCH_MAX_ROWS", 2)
+    response = client.post(url, data=data, content_type="text/csv")
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+
+    content = b"".join(response.streaming_content).decode()
+    results = [json.loads(line) for line in content.splitlines()]
+    assert [result["id"] for result in results] == ["a", "b"]
+    form_data = get_form_data(checkpoint, ipsi_II=True, ipsi_III=None)
+    assert_matches_dashboard(checkpoint, form_data, results[0])
+
+
+@pytest.mark.django_db
+def test_score_cohort_command(calls: Counter, tmp_path) -> None:
+    """The command must read the CSV and write one line of JSON per diagnosis."""
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    input_path, output_path = tmp_path / "cohort.csv", tmp_path / "risks.jsonl"
+    input_path.write_text("\n".join(CSV_LINES))
+
+    call_command("score_cohort", checkpoint.pk, input=input_path, output=output_path)
+    results = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert [result["id"] for result in results] == ["a", "b"]
+    assert set(results[1]) == {"id", "ipsi_II", "ipsi_III"}
@@ -0,0 +1,51 @@
+"""Test the caches of the `CheckpointModel` and their lightweight keys."""
+
+from collections import Counter
+from collections.abc import Callable
+
+import numpy as np
+import pytest
+from lymph.types import Model
+
+from lyprox.riskpredictor import store
+from lyprox.riskpredictor.models import CheckpointModel
+from lyprox.riskpredictor.priors import compute_priors
+
+
+def test_stored_priors_are_keyed_lightly(
+    make_model: Callable[[], Model],
+    make_samples: Callable[[], np.ndarray],
+    tmp_path,
+) -> None:
+    """The model and samples must only be requested when nothing is stored."""
+    calls = Counter()
+
+    def get_model() -> Model:
+        calls["model"] += 1
+        return make_model()
+
+    def get_samples() -> np.ndarray:
+        calls["samples"] += 1
+        return make_samples()
+
+    def compute() -> dict:
+        return compute_priors(model=get_model(), samples=get_samples())
+
+    samples_key = CheckpointModel(ref="v1").samples_key
+    priors = store.get_or_compute_priors(1, samples_key, compute, root=tmp_path)
+    again = store.get_or_compute_priors(1, samples_key, compute, root=tmp_path)
+    assert calls == {"model": 1, "samples": 1}
+    assert np.array_equal(priors["early"], again["early"])
+
+    samples_key = CheckpointModel(ref="v2").samples_key
+    store.get_or_compute_priors(1, samples_key, compute, root=tmp_path)
+    assert calls == {"model": 2, "samples": 2}
+
+
+@pytest.mark.parametrize("field", ["ref", "num_samples", "samples_path"])
+def test_samples_key_changes(field: str) -> None:
+    """Every field that changes the priors must change the samples key."""
+    checkpoint = CheckpointModel()
+    key = checkpoint.samples_key
+    setattr(checkpoint, field, 7 if field == "num_samples" else "other")
+    assert checkpoint.samples_key != key
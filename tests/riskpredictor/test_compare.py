@@ -0,0 +1,97 @@
+"""Test the comparison of the risks of one diagnosis under several checkpoints."""
+
+import json
+from collections import Counter
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+from django.http import HttpResponse
+from django.test import Client
+
+from lyprox.riskpredictor import compare, predict
+from lyprox.riskpredictor.models import CheckpointModel
+
+
+@pytest.fixture
+def user_client(client: Client, django_user_model) -> Client:
+    """Return a client that is logged in."""
+    user = django_user_model.objects.create_user(
+        email="user@example.com", password="password", is_active=True
+    )
+    client.force_login(user)
+    return client
+
+
+def post_comparison(client: Client, data: Any) -> HttpResponse:
+    """Post the ``data`` as JSON to the comparison view."""
+    return client.post(
+        "/riskpredictor/compare/",
+        data=json.dumps(data),
+        content_type="application/json",
+    )
+
+
+@pytest.mark.django_db
+def test_compare_view(
+    calls: Counter,
+    user_client: Client,
+    get_form_data: Callable[..., dict],
+) -> None:
+    """The risks of every checkpoint must be aligned in the order of the request."""
+    first, second, failed = (
+        CheckpointModel.objects.create(ref=ref) for ref in ["v1", "v2", "v3"]
+    )
+    CheckpointModel.objects.filter(pk=failed.pk).update(status="failed")
+    data = {"checkpoints": [second.pk, first.pk, failed.pk], "ipsi_II": True}
+    comparison = post_comparison(user_client, data).json()
+    assert comparison["type"] == "comparison"
+    assert [column["ref"] for column in comparison["checkpoints"]] == [
+        "v2",
+        "v1",
+        "v3",
+    ]
+    assert "error" not in comparison["checkpoints"][0]
+    assert "not ready" in comparison["checkpoints"][2]["error"]
+    assert calls["risks"] == 2
+
+    form_data = get_form_data(first, ipsi_II=True)
+    payload = predict.get_risks_payload(first, form_data, ["II", "III"])
+    assert calls["risks"] == 2
+    assert list(comparison["risks"]) == list(payload)
+    for key, stats in payload.items():
+        _, risks, missing = comparison["risks"][key]
+        assert risks == {"mean": stats[True] + stats[None] / 2, "std": stats[None]}
+        assert missing is None
+
+
+@pytest.mark.django_db
+def test_compare_unknown_checkpoint(user_client: Client) -> None:
+    """Unknown checkpoints must be reported instead of computing anything."""
+    response = post_comparison(user_client, {"checkpoints": [42]})
+    assert "error" in response.json()
+
+
+@pytest.mark.django_db
+def test_compare_invalid_request(
+    client: Client,
+    django_user_model,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Anonymous users, invalid or too many checkpoints must be refused."""
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    assert post_comparison(client, {"checkpoints": [checkpoint.pk]}).status_code == 302
+
+    user = django_user_model.objects.create_user(
+        email="user@example.com", password="password", is_active=True
+    )
+    client.force_login(user)
+    for checkpoints in [["1"], [True], "1", 1, None, {"1": 1}]:
+        response = post_comparison(client, {"checkpoints": checkpoints})
+        assert response.status_code == 400
+        assert "error" in response.json()
+
+    assert post_comparison(client, [checkpoint.pk]).status_code == 400
+    monkeypatch.setattr(compare, "COMPARE_MAX_CHECKPOINTS", 1)
+    response = post_comparison(client, {"checkpoints": [checkpoint.pk] * 2})
+    assert response.status_code == 400
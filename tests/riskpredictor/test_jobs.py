@@ -0,0 +1,197 @@
+"""Test the background jobs that precompute the priors of saved checkpoints."""
+
+import json
+from collections import Counter
+from collections.abc import Callable
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import Client
+
+from lyprox.riskpredictor import jobs, models
+from lyprox.riskpredictor.models import CheckpointModel, PrecomputeJob
+
+
+@pytest.mark.django_db
+def test_job_runs_inline(calls: Counter) -> None:
+    """Without workers, the checkpoint must be ready once it is saved."""
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    assert checkpoint.is_ready
+
+    job = checkpoint.latest_job
+    assert job.status == PrecomputeJob.Status.DONE
+    assert job.num_steps_done == job.num_steps == len(jobs.PRECOMPUTE_STEPS)
+
+
+@pytest.mark.django_db
+def test_job_is_queued_after_commit(
+    calls: Counter,
+    client: Client,
+    monkeypatch: pytest.MonkeyPatch,
+    django_capture_on_commit_callbacks,
+    get_form_data: Callable[..., dict],
+) -> None:
+    """With workers, the checkpoint must be warming and refused by the dashboard."""
+    monkeypatch.setattr(jobs, "PRECOMPUTE_MAX_WORKERS", 2)
+    with django_capture_on_commit_callbacks() as callbacks:
+        checkpoint = CheckpointModel.objects.create(ref="v1", description="")
+        checkpoint.save()
+
+    assert len(callbacks) == 2
+    first_job, latest_job = checkpoint.precompute_jobs.order_by("pk")
+    assert latest_job == checkpoint.latest_job
+    assert latest_job.status == PrecomputeJob.Status.QUEUED
+    assert checkpoint.status == CheckpointModel.Status.WARMING
+
+    response = client.get(f"/riskpredictor/{checkpoint.pk}/")
+    assert response.status_code == 503
+    assert b"not ready" in response.content
+    response = client.get("/riskpredictor/list/")
+    assert b"step 0 of 4" in response.content
+
+    # a superseded job must not change the status of the checkpoint
+    assert jobs.run_precompute_job(first_job.pk) == PrecomputeJob.Status.DONE
+    checkpoint.refresh_from_db()
+    assert checkpoint.status == CheckpointModel.Status.WARMING
+
+    assert jobs.run_precompute_job(latest_job.pk) == PrecomputeJob.Status.DONE
+    checkpoint.refresh_from_db()
+    assert checkpoint.is_ready
+
+    response = client.post(
+        f"/riskpredictor/{checkpoint.pk}/ajax/",
+        data=json.dumps(get_form_data(checkpoint, ipsi_II=True)),
+        content_type="application/json",
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_failed_job(
+    calls: Counter,
+    client: Client,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Errors must be recorded in the job and mark the checkpoint as failed."""
+
+    def fail(**_kwargs):
+        raise OSError("remote unavailable")
+
+    monkeypatch.setattr(models, "cached_fetch_model_samples", fail)
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    assert checkpoint.status == CheckpointModel.Status.FAILED
+
+    job = checkpoint.latest_job
+    assert job.status == PrecomputeJob.Status.FAILED
+    assert job.step == "fetch samples"
+    assert job.error == "OSError: remote unavailable"
+
+    response = client.post(
+        f"/riskpredictor/{checkpoint.pk}/sweep/",
+        data="{}",
+        content_type="application/json",
+    )
+    assert response.status_code == 503
+    assert "failed" in response.json()["error"]
+
+
+@pytest.mark.django_db
+def test_only_changed_samples_requeue(calls: Counter) -> None:
+    """Editing the description must keep a ready checkpoint online."""
+    checkpoint = CheckpointModel.objects.create(ref="v1", description="")
+    stale = CheckpointModel.objects.get(pk=checkpoint.pk)
+    CheckpointModel.objects.filter(pk=checkpoint.pk).update(status="warming")
+    checkpoint.refresh_from_db()
+    assert checkpoint.precompute_jobs.count() == 1
+
+    # a not-ready checkpoint is precomputed again, even if loaded while ready
+    stale.description = "new description"
+    stale.save()
+    assert stale.is_ready
+    assert checkpoint.precompute_jobs.count() == 2
+
+    stale.description = "another description"
+    stale.save()
+    assert stale.is_ready
+    assert checkpoint.precompute_jobs.count() == 2
+
+    stale.num_samples = 5
+    stale.save()
+    assert stale.is_ready
+    assert checkpoint.precompute_jobs.count() == 3
+
+
+@pytest.mark.django_db
+def test_resume_interrupted_job(
+    calls: Counter,
+    monkeypatch: pytest.MonkeyPatch,
+    django_capture_on_commit_callbacks,
+) -> None:
+    """A job from before the server started must be queued again by the command."""
+    monkeypatch.setattr(jobs, "PRECOMPUTE_MAX_WORKERS", 2)
+    with django_capture_on_commit_callbacks(execute=False):
+        checkpoint = CheckpointModel.objects.create(ref="v1")
+
+    interrupted = checkpoint.latest_job
+    started = interrupted.created.isoformat()
+    assert jobs.resume_precompute_jobs(before=interrupted.created) == []
+    interrupted.refresh_from_db()
+    assert interrupted.status == PrecomputeJob.Status.QUEUED
+
+    monkeypatch.setattr(jobs, "PRECOMPUTE_MAX_WORKERS", 0)
+    PrecomputeJob.objects.filter(pk=interrupted.pk).update(
+        created=interrupted.created - timedelta(minutes=1),
+    )
+    call_command("resume_precompute", "--before", started)
+    checkpoint.refresh_from_db()
+    assert checkpoint.is_ready
+    interrupted.refresh_from_db()
+    assert interrupted.status == PrecomputeJob.Status.FAILED
+    assert checkpoint.latest_job.status == PrecomputeJob.Status.DONE
+    assert jobs.resume_precompute_jobs() == []
+
+
+@pytest.mark.django_db
+def test_broken_pool(
+    calls: Counter,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A broken pool must fail its job and be replaced for the next one."""
+    monkeypatch.setattr(jobs, "EXECUTOR", "broken pool")
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    job = jobs.queue_precompute_job(checkpoint)
+
+    future = futures.Future()
+    future.set_exception(BrokenProcessPool("worker died"))
+    jobs.discard_future(job.pk, future)
+    assert jobs.EXECUTOR is None
+    checkpoint.refresh_from_db()
+    assert checkpoint.status == CheckpointModel.Status.FAILED
+    assert checkpoint.latest_job.error == "BrokenProcessPool: worker died"
+
+    call_command("resume_precompute", "--failed")
+    checkpoint.refresh_from_db()
+    assert checkpoint.is_ready
+
+
+@pytest.mark.django_db(transaction=True)
+def test_migrated_checkpoints_are_queued() -> None:
+    """Checkpoints from before the jobs existed must be warming with a queued job."""
+    executor = MigrationExecutor(connection)
+    executor.migrate([("riskpredictor", "0002_checkpointmodel_description")])
+    old_apps = executor.loader.project_state(
+        [("riskpredictor", "0002_checkpointmodel_description")]
+    ).apps
+    old_apps.get_model("riskpredictor", "CheckpointModel").objects.create(ref="v1")
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
+    checkpoint = CheckpointModel.objects.get(ref="v1")
+    assert checkpoint.status == CheckpointModel.Status.WARMING
+    assert checkpoint.latest_job.status == PrecomputeJob.Status.QUEUED
+    assert checkpoint.latest_job.num_steps == len(jobs.PRECOMPUTE_STEPS)
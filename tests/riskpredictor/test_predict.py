@@ -0,0 +1,172 @@
+"""Test the batched computation of posteriors and risks."""
+
+from collections.abc import Callable
+
+import numpy as np
+import pytest
+from lymph import models
+from lymph.types import Model
+from lyscripts.configs import DiagnosisConfig, ModalityConfig, add_modalities
+
+from lyprox.riskpredictor.predict import (
+    compute_diagnosis_likelihood,
+    compute_posteriors,
+    compute_side_likelihoods,
+    compute_stacked_risk_stats,
+    create_risks_fields_and_kwargs,
+    get_observation_matrix,
+)
+
+
+def make_priors(model: Model, num_samples: int = 20, seed: int = 42) -> np.ndarray:
+    """Compute the early T-stage priors for random parameter samples."""
+    rng = np.random.default_rng(seed)
+    priors = []
+    for _ in range(num_samples):
+        model.set_named_params(*rng.random(model.get_num_dims()))
+        submodel = model.nohpv if isinstance(model, models.HPVUnilateral) else model
+        priors.append(submodel.state_dist(t_stage="early"))
+
+    return np.stack(priors)
+
+
+@pytest.mark.parametrize(
+    "kind, midext",
+    [
+        ("unilateral", None),
+        ("hpv", None),
+        ("bilateral", None),
+        ("midline", None),
+        ("midline", True),
+        ("midline", False),
+    ],
+)
+def test_batched_posteriors(
+    kind: str,
+    midext: bool | None,
+    diagnosis: DiagnosisConfig,
+    make_model: Callable[[str], Model],
+) -> None:
+    """Batched posteriors must match the model's own posterior for every sample."""
+    model = make_model(kind)
+    priors = make_priors(model)
+    posteriors = compute_posteriors(model, priors, diagnosis, midext=midext)
+
+    model = add_modalities(model, {"D": ModalityConfig(spec=0.9, sens=0.9)})
+    if isinstance(model, models.HPVUnilateral):
+        model = model.nohpv
+    is_unilateral = isinstance(model, models.Unilateral)
+    given_diagnosis = diagnosis.ipsi if is_unilateral else diagnosis.model_dump()
+    midext_kwarg = {"midext": midext} if isinstance(model, models.Midline) else {}
+    expected = np.stack(
+        [
+            model.posterior_state_dist(
+                given_state_dist=prior,
+                given_diagnosis=given_diagnosis,
+                **midext_kwarg,
+            )
+            for prior in priors
+        ]
+    )
+
+    assert posteriors.shape == expected.shape
+    assert np.allclose(posteriors, expected)
+
+
+@pytest.mark.parametrize("kind", ["unilateral", "bilateral", "midline"])
+def test_marginal_risks(
+    kind: str,
+    diagnosis: DiagnosisConfig,
+    make_model: Callable[[str], Model],
+) -> None:
+    """Risks from the indicator matrices must match the model's marginalization."""
+    model = make_model(kind)
+    posteriors = compute_posteriors(model, make_priors(model), diagnosis, midext=True)
+    keys = ["ipsi_II", "ipsi_III", "contra_II", "contra_III"]
+    fields, kwargs = create_risks_fields_and_kwargs(
+        model=model,
+        state_dists=posteriors,
+        lnls=["II", "III"],
+        keys_to_consider=keys,
+    )
+
+    for key in keys:
+        side, lnl = key.split("_")
+        if isinstance(model, models.Unilateral):
+            if side == "contra":
+                assert key not in fields
+                continue
+            involvement = {lnl: True}
+        else:
+            involvement = {side: {lnl: True}}
+
+        risks = 100 * np.array(
+            [
+                model.marginalize(involvement=involvement, given_state_dist=posterior)
+                for posterior in posteriors
+            ]
+        )
+        assert np.isclose(kwargs[key][None], risks.std())
+        assert np.isclose(kwargs[key][True], risks.mean() - risks.std() / 2)
+
+
+@pytest.mark.parametrize("kind", ["unilateral", "hpv", "bilateral", "midline"])
+def test_cached_likelihood(
+    kind: str,
+    diagnosis: DiagnosisConfig,
+    make_model: Callable[[str], Model],
+) -> None:
+    """Likelihoods from cached observation matrices must match the modal model's."""
+    model = make_model(kind)
+    get_observation_matrix.cache_clear()
+    likelihood = compute_diagnosis_likelihood(model, diagnosis, 0.85, 0.7000001)
+    compute_diagnosis_likelihood(model, diagnosis, 0.85000001, 0.7)
+    assert len(get_observation_matrix.cache) == 1
+
+    model = add_modalities(model, {"D": ModalityConfig(spec=0.85, sens=0.7)})
+    if isinstance(model, models.HPVUnilateral):
+        model = model.nohpv
+    if isinstance(model, models.Midline):
+        model = model.ext
+
+    if isinstance(model, models.Unilateral):
+        expected = model.compute_encoding(diagnosis.ipsi) @ model.observation_matrix().T
+    else:
+        ipsi, contra = (
+            getattr(model, side).compute_encoding(getattr(diagnosis, side))
+            @ getattr(model, side).observation_matrix().T
+            for side in ["ipsi", "contra"]
+        )
+        expected = np.outer(ipsi, contra)
+
+    assert np.allclose(likelihood, expected)
+
+
+@pytest.mark.parametrize("kind", ["unilateral", "hpv", "bilateral", "midline"])
+def test_stacked_risk_stats(
+    kind: str,
+    diagnosis: DiagnosisConfig,
+    make_model: Callable[[str], Model],
+) -> None:
+    """Stacked risk stats must match those of the diagnoses computed one by one."""
+    model = make_model(kind)
+    priors = make_priors(model)
+    if isinstance(model, models.Midline):
+        priors = priors.sum(axis=1)
+
+    diagnoses = [diagnosis, DiagnosisConfig(ipsi={"D": {"III": True}})]
+    side_likelihoods = [
+        np.stack(likelihoods)
+        for likelihoods in zip(
+            *(compute_side_likelihoods(model, d, 0.8, 0.7) for d in diagnoses),
+            strict=True,
+        )
+    ]
+    keys, means, stds = compute_stacked_risk_stats(model, priors, side_likelihoods)
+
+    for d, mean, std in zip(diagnoses, means, stds, strict=True):
+        posteriors = compute_posteriors(model, priors, d, None, 0.8, 0.7)
+        lnls = ["II", "III"]
+        _, kwargs = create_risks_fields_and_kwargs(model, posteriors, lnls, keys)
+        assert np.allclose(std, [kwargs[key][None] for key in keys])
+        assert np.allclose(mean - std / 2, [kwargs[key][True] for key in keys])
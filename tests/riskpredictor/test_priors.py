@@ -0,0 +1,51 @@
+"""Test the stacked computation of the prior state distributions."""
+
+from collections.abc import Callable
+
+import numpy as np
+import pytest
+from lymph.diagnosis_times import Distribution
+from lymph.types import Model
+from scipy.stats import binom
+
+from lyprox.riskpredictor.priors import (
+    compute_priors,
+    compute_priors_in_pool,
+    compute_priors_sequentially,
+)
+
+
+def late_binomial(support: np.ndarray, p: float = 0.5) -> np.ndarray:
+    """Parametrized binomial distribution over diagnosis times."""
+    return binom.pmf(support, len(support) - 1, p)
+
+
+@pytest.mark.parametrize(
+    "kind",
+    ["unilateral", "trinary", "bilateral", "midline", "midline_no_evo"],
+)
+def test_stacked_priors(kind: str, make_model: Callable[[str], Model]) -> None:
+    """Stacked priors must be identical to calling `state_dist` for every sample."""
+    model = make_model(kind)
+    model.set_distribution("late", Distribution(late_binomial, max_time=10))
+    samples = np.random.default_rng(42).random((20, model.get_num_dims()))
+
+    priors = compute_priors(model, samples)
+    expected = compute_priors_sequentially(model, samples, t_stages=["early", "late"])
+
+    assert priors.keys() == expected.keys()
+    for t_stage in ["early", "late"]:
+        assert priors[t_stage].shape == expected[t_stage].shape
+        assert np.allclose(priors[t_stage], expected[t_stage])
+
+
+def test_priors_in_pool(make_model: Callable[[str], Model]) -> None:
+    """Distributing the samples over processes must not change the priors."""
+    model = make_model("bilateral")
+    model.set_distribution("late", Distribution(late_binomial, max_time=10))
+    samples = np.random.default_rng(42).random((5, model.get_num_dims()))
+
+    priors = compute_priors_in_pool(model, samples, ["late"], max_workers=2)
+    expected = compute_priors_sequentially(model, samples, ["late"])
+
+    assert np.allclose(priors["late"], expected["late"])
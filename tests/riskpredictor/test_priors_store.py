@@ -0,0 +1,59 @@
+"""Test the memory-mapped store of the priors of every checkpoint."""
+
+import numpy as np
+import pytest
+
+from lyprox.riskpredictor import registry, store
+from lyprox.riskpredictor.models import CheckpointModel
+
+PRIORS = {
+    "early": np.random.default_rng(42).random((5, 4, 4)),
+    1: np.random.default_rng(7).random((5, 4, 4)),
+}
+
+
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_priors_are_memory_mapped(dtype: str, tmp_path) -> None:
+    """Stored priors must be read-only memory maps of the requested dtype."""
+    samples_key = CheckpointModel(ref="v1").samples_key
+    priors = store.get_or_compute_priors(
+        pk=1,
+        samples_key=samples_key,
+        compute=lambda: PRIORS,
+        dtype=dtype,
+        root=tmp_path,
+    )
+    assert set(priors) == {"early", 1}
+    for t_stage, t_stage_priors in priors.items():
+        assert isinstance(t_stage_priors, np.memmap)
+        assert not t_stage_priors.flags.writeable
+        assert t_stage_priors.dtype == dtype
+        assert np.allclose(t_stage_priors, PRIORS[t_stage])
+        assert registry.get_entry_size(t_stage_priors) == 0
+
+    manifest = store.read_manifest(pk=1, root=tmp_path)
+    assert manifest["samples_key"] == samples_key
+    assert manifest["dtype"] == dtype
+    assert store.load_priors(1, samples_key, dtype="float16", root=tmp_path) is None
+
+
+def test_stale_priors_are_replaced(tmp_path) -> None:
+    """Priors of another samples key must be replaced, keeping only one directory."""
+    old_key = CheckpointModel(ref="v1").samples_key
+    new_key = CheckpointModel(ref="v2").samples_key
+    store.write_priors(pk=1, samples_key=old_key, priors=PRIORS, root=tmp_path)
+    old_priors = store.load_priors(pk=1, samples_key=old_key, root=tmp_path)
+    assert store.load_priors(pk=1, samples_key=new_key, root=tmp_path) is None
+
+    doubled = {t_stage: 2 * priors for t_stage, priors in PRIORS.items()}
+    store.write_priors(pk=1, samples_key=new_key, priors=doubled, root=tmp_path)
+    new_priors = store.load_priors(pk=1, samples_key=new_key, root=tmp_path)
+    assert np.allclose(new_priors["early"], doubled["early"])
+    # the files of the old priors stay usable while they are memory-mapped
+    assert np.allclose(old_priors["early"], PRIORS["early"])
+
+    checkpoint_directory = store.get_checkpoint_directory(pk=1, root=tmp_path)
+    assert len([path for path in checkpoint_directory.iterdir() if path.is_dir()]) == 1
+
+    store.remove_priors(pk=1, root=tmp_path)
+    assert not checkpoint_directory.exists()
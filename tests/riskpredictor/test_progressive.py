@@ -0,0 +1,80 @@
+"""Test the progressively refined risk estimates of one diagnosis."""
+
+import json
+from collections import Counter
+from collections.abc import Callable
+
+import numpy as np
+import pytest
+from django.test import Client
+
+from lyprox.riskpredictor import predict, progressive, registry
+from lyprox.riskpredictor.models import CheckpointModel
+
+
+@pytest.mark.django_db
+def test_final_payload_matches(
+    calls: Counter,
+    get_form_data: Callable[..., dict],
+) -> None:
+    """Estimates must be refined until they match the risks over all samples."""
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    lnls = ["II", "III"]
+    form_data = get_form_data(checkpoint, ipsi_II=True, ipsi_III=None)
+
+    payloads = progressive.iter_progressive_payloads(
+        checkpoint, form_data, lnls, first_batch=2
+    )
+    payloads = list(payloads)
+    assert [payload.pop("num_samples") for payload in payloads] == [2, 6, 10]
+    assert {payload.pop("num_total") for payload in payloads} == {10}
+    assert all(payload.keys() == {"ipsi_II", "ipsi_III"} for payload in payloads)
+    assert calls["risks"] == 0
+
+    # the final payload is cached and matches the one computed at once
+    cached = predict.get_risks_payload(checkpoint, form_data, lnls)
+    assert calls["risks"] == 0
+    assert cached == payloads[-1]
+    registry.RISKS_CACHE.clear()
+    computed = predict.get_risks_payload(checkpoint, form_data, lnls)
+    assert calls["risks"] == 1
+    for key, stats in computed.items():
+        for value, percent in stats.items():
+            assert np.isclose(payloads[-1][key][value], percent)
+
+
+@pytest.mark.django_db
+def test_stream_view(
+    calls: Counter,
+    client: Client,
+    get_form_data: Callable[..., dict],
+) -> None:
+    """The view must stream JSON lines and end with the dashboard's risks."""
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    form_data = get_form_data(checkpoint, ipsi_II=True)
+    url = f"/riskpredictor/{checkpoint.pk}/stream/"
+    data = json.dumps(form_data)
+    response = client.post(url, data=data, content_type="application/json")
+    assert response["Content-Type"] == "application/x-ndjson"
+
+    content = b"".join(response.streaming_content)
+    lines = [json.loads(line) for line in content.splitlines()]
+    assert [line["final"] for line in lines] == [True]
+    assert lines[0]["type"] == "risk"
+
+    ajax = client.post(
+        f"/riskpredictor/{checkpoint.pk}/ajax/",
+        data=data,
+        content_type="application/json",
+    )
+    final = {**lines[0]}
+    assert (final.pop("num_samples"), final.pop("num_total")) == (10, 10)
+    del final["final"]
+    assert ajax.json() == final
+    assert calls["risks"] == 0
+
+    # once cached, only the final estimate is streamed
+    response = client.post(url, data=data, content_type="application/json")
+    lines = b"".join(response.streaming_content).splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["final"]
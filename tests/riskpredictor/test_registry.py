@@ -0,0 +1,56 @@
+"""Test the process-local registry of checkpoint models, samples, and priors."""
+
+from collections import Counter
+
+import pytest
+
+from lyprox.riskpredictor import predict, registry
+from lyprox.riskpredictor.models import CheckpointModel
+
+
+@pytest.mark.django_db
+def test_registry_and_eviction(calls: Counter) -> None:
+    """Results must be registered once and evicted when the checkpoint is saved."""
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    # start empty, like a web worker whose job ran in the pool
+    registry.evict_checkpoint(pk=checkpoint.pk)
+    calls.clear()
+
+    model = checkpoint.construct_model()
+    assert checkpoint.construct_model() is model
+    assert checkpoint.is_unilateral and not checkpoint.is_midline
+
+    priors = checkpoint.compute_priors(t_stage="early")
+    assert checkpoint.compute_priors(t_stage="early") is priors
+    assert not priors.flags.writeable
+    assert calls == {"construct": 1, "samples": 1, "priors": 1}
+
+    reloaded = CheckpointModel.objects.get(pk=checkpoint.pk)
+    assert reloaded.construct_model() is model
+
+    stale = (checkpoint.pk, checkpoint.samples_key)
+    checkpoint.ref = "v2"
+    checkpoint.save()
+    assert not any(key[:2] == stale for key in registry.REGISTRY)
+
+    checkpoint.construct_model()
+    pk = checkpoint.pk
+    checkpoint.delete()
+    assert not any(key[0] == pk for key in registry.REGISTRY)
+
+
+@pytest.mark.django_db
+def test_changed_samples_in_other_process(calls: Counter) -> None:
+    """Entries must not be used after another process changed the samples."""
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    priors = checkpoint.compute_priors(t_stage="early")
+    risks_key = predict.get_risks_cache_key(checkpoint, canonical_form_data=())
+    calls.clear()
+
+    # saving in another process evicts only that process's registry
+    CheckpointModel.objects.filter(pk=checkpoint.pk).update(num_samples=5)
+    changed = CheckpointModel.objects.get(pk=checkpoint.pk)
+    assert any(key[0] == checkpoint.pk for key in registry.REGISTRY)
+    assert changed.compute_priors(t_stage="early") is not priors
+    assert calls == {"construct": 1, "samples": 1, "priors": 1}
+    assert predict.get_risks_cache_key(changed, canonical_form_data=()) != risks_key
@@ -0,0 +1,58 @@
+"""Test the cache of serialized risks and the command that prefills it."""
+
+from collections import Counter
+from collections.abc import Callable
+
+import pytest
+from django.core.management import call_command
+
+from lyprox.riskpredictor import predict, registry
+from lyprox.riskpredictor.models import CheckpointModel
+
+
+@pytest.mark.django_db
+def test_risks_payload_is_cached(
+    calls: Counter,
+    get_form_data: Callable[..., dict],
+) -> None:
+    """Canonically equal diagnoses must be computed only once per checkpoint."""
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    lnls = ["II", "III"]
+    form_data = get_form_data(checkpoint, ipsi_II=True, specificity=0.8)
+
+    payload = predict.get_risks_payload(checkpoint, form_data, lnls)
+    expected = predict.compute_risks(checkpoint, {**form_data, "midext": None}, lnls)
+    assert payload == expected.model_dump()
+    assert predict.risks_from_payload(payload).ipsi_II == payload["ipsi_II"]
+    calls.clear()
+
+    nearly_equal = {**form_data, "specificity": 0.8000001}
+    assert predict.get_risks_payload(checkpoint, nearly_equal, lnls) is payload
+    assert calls["risks"] == 0
+
+    predict.get_risks_payload(checkpoint, {**form_data, "ipsi_III": True}, lnls)
+    assert calls["risks"] == 1
+
+    checkpoint.save()
+    predict.get_risks_payload(checkpoint, form_data, lnls)
+    assert calls["risks"] == 2
+
+
+@pytest.mark.django_db
+def test_prefill_risks(
+    calls: Counter,
+    get_form_data: Callable[..., dict],
+) -> None:
+    """Prefilled diagnoses must be read from disk instead of being computed."""
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    call_command("prefill_risks", max_involved=1)
+    assert calls["risks"] == 3
+
+    registry.RISKS_CACHE.clear()
+    form_data = get_form_data(checkpoint, ipsi_III=True)
+    predict.get_risks_payload(checkpoint, form_data, ["II", "III"])
+    assert calls["risks"] == 3
+
+    form_data = get_form_data(checkpoint, ipsi_II=True, ipsi_III=True)
+    predict.get_risks_payload(checkpoint, form_data, ["II", "III"])
+    assert calls["risks"] == 4
@@ -0,0 +1,99 @@
+"""Test the row-selective loading of parameter samples from an HDF5 chain."""
+
+from pathlib import Path
+
+import emcee
+import h5py
+import numpy as np
+import pytest
+
+from lyprox.riskpredictor import samples
+
+NUM_WALKERS, NUM_DIMS, NUM_ITERATIONS = 6, 3, 40
+
+
+@pytest.fixture(params=["emcee", "chunked", "contiguous"])
+def chain_file(request: pytest.FixtureRequest, tmp_path: Path) -> Path:
+    """Create an HDF5 file with a chain sampled by `emcee` in different layouts."""
+    path = tmp_path / "samples.hdf5"
+    backend = emcee.backends.HDFBackend(path)
+    sampler = emcee.EnsembleSampler(
+        nwalkers=NUM_WALKERS,
+        ndim=NUM_DIMS,
+        log_prob_fn=lambda x: -0.5 * np.sum(x**2),
+        backend=backend,
+    )
+    rng = np.random.default_rng(42)
+    sampler.run_mcmc(rng.normal(size=(NUM_WALKERS, NUM_DIMS)), NUM_ITERATIONS)
+    if request.param == "emcee":
+        return path
+
+    chain = backend.get_chain()
+    rewritten_path = tmp_path / f"{request.param}.hdf5"
+    with h5py.File(rewritten_path, mode="w") as h5_file:
+        group = h5_file.create_group(samples.SAMPLES_GROUP)
+        group.attrs["iteration"] = NUM_ITERATIONS
+        chunks = (7, NUM_WALKERS, NUM_DIMS) if request.param == "chunked" else None
+        # chains may be allocated longer than the number of valid iterations
+        padded = np.concatenate([chain, np.full_like(chain[:5], np.nan)])
+        group.create_dataset("chain", data=padded, chunks=chunks)
+
+    return rewritten_path
+
+
+@pytest.mark.parametrize("num_samples", [1, 17, NUM_WALKERS * NUM_ITERATIONS])
+def test_chain_subset(chain_file: Path, num_samples: int) -> None:
+    """The subset must match the rows chosen from the full flat chain."""
+    with h5py.File(chain_file, mode="r") as h5_file:
+        num_iterations = h5_file[samples.SAMPLES_GROUP].attrs["iteration"]
+        chain = h5_file[samples.SAMPLES_GROUP]["chain"][:num_iterations]
+
+    flat_chain = chain.reshape(-1, NUM_DIMS)
+    indices = samples.choose_flat_indices(len(flat_chain), num_samples, seed=42)
+    subset = samples.read_chain_subset(chain_file, num_samples=num_samples, seed=42)
+    assert np.array_equal(subset, flat_chain[indices])
+
+    with chain_file.open(mode="rb") as file_obj:
+        from_file_obj = samples.read_chain_subset(file_obj, num_samples, seed=42)
+    assert np.array_equal(from_file_obj, subset)
+
+
+def test_samples_store(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """The subset must be fetched once and then loaded from the ``.npy`` file."""
+    rng = np.random.default_rng(42)
+    chain = rng.random((NUM_ITERATIONS, NUM_WALKERS, NUM_DIMS))
+    chain_path = tmp_path / "samples.hdf5"
+    with h5py.File(chain_path, mode="w") as h5_file:
+        group = h5_file.create_group(samples.SAMPLES_GROUP)
+        group.attrs["iteration"] = NUM_ITERATIONS
+        group.create_dataset("chain", data=chain)
+
+    opened = []
+
+    class LocalFileSystem:
+        """Open the local chain instead of the one in the DVC repo."""
+
+        def __init__(self, **_kwargs) -> None:
+            pass
+
+        def open(self, path: str, mode: str):
+            opened.append(path)
+            return chain_path.open(mode=mode)
+
+    monkeypatch.setattr(samples, "DVCFileSystem", LocalFileSystem)
+    kwargs = {
+        "repo_name": "lycosystem/lynference",
+        "ref": "v1",
+        "samples_path": "models/samples.hdf5",
+        "num_samples": 10,
+        "remote": None,
+        "seed": 42,
+        "root": tmp_path / "store",
+    }
+    fetched = samples.get_or_fetch_samples(**kwargs)
+    loaded = samples.get_or_fetch_samples(**kwargs)
+    assert opened == ["models/samples.hdf5"]
+    assert np.array_equal(fetched, loaded)
+    assert fetched.shape == (10, NUM_DIMS)
+    del kwargs["remote"]
+    assert list(kwargs["root"].iterdir()) == [samples.get_samples_file(**kwargs)]
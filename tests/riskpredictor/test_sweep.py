@@ -0,0 +1,71 @@
+"""Test the risks of one diagnosis over all specificities and sensitivities."""
+
+import json
+from collections import Counter
+from collections.abc import Callable
+
+import numpy as np
+import pytest
+from django.test import Client
+from lymph.types import Model
+from lyscripts.configs import DiagnosisConfig
+
+from lyprox.riskpredictor import predict, sweep
+from lyprox.riskpredictor.models import CheckpointModel
+
+
+KINDS = ["unilateral", "trinary", "hpv", "bilateral", "midline"]
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_sweep_side_likelihoods(
+    kind: str,
+    diagnosis: DiagnosisConfig,
+    make_model: Callable[[str], Model],
+) -> None:
+    """Likelihoods for all grid points must match those computed one by one."""
+    model = make_model(kind)
+
+    specificities = np.array([0.5, 0.73, 1.0])
+    sensitivities = np.array([0.9, 0.61, 0.5])
+    swept = sweep.compute_sweep_side_likelihoods(
+        model, diagnosis, specificities, sensitivities
+    )
+
+    for i, (spec, sens) in enumerate(zip(specificities, sensitivities, strict=True)):
+        expected = predict.compute_side_likelihoods(model, diagnosis, spec, sens)
+        for swept_side, expected_side in zip(swept, expected, strict=True):
+            assert np.allclose(swept_side[i], expected_side)
+
+
+@pytest.mark.django_db
+def test_sweep_view(
+    calls: Counter,
+    client: Client,
+    get_form_data: Callable[..., dict],
+) -> None:
+    """The surface must contain the risks the dashboard computes for one grid point."""
+    checkpoint = CheckpointModel.objects.create(ref="v1")
+    form_data = get_form_data(checkpoint, ipsi_II=True, ipsi_III=None)
+    url = f"/riskpredictor/{checkpoint.pk}/sweep/"
+    data = json.dumps(form_data)
+    response = client.post(url, data=data, content_type="application/json")
+    assert len(response.json()["grid"]) == 11
+
+    for invalid_step in ["0.03", "0", "-0.05", "1e-9", "inf", "nan", "abc"]:
+        response = client.post(f"{url}?step={invalid_step}", data, "application/json")
+        assert response.status_code == 200
+        assert "error" in response.json()
+
+    response = client.post(f"{url}?step=0.01", data, "application/json")
+    surface = response.json()
+    assert surface["grid"] == sweep.get_sweep_grid(step=0.01).tolist()
+    assert calls["risks"] == 0
+
+    i, j = surface["grid"].index(0.83), surface["grid"].index(0.6)
+    form_data.update(specificity=0.83, sensitivity=0.6)
+    payload = predict.get_risks_payload(checkpoint, form_data, ["II", "III"])
+    for key, stats in payload.items():
+        assert np.isclose(surface[key]["std"][i][j], stats[None], atol=0.01)
+        mean = stats[True] + stats[None] / 2
+        assert np.isclose(surface[key]["mean"][i][j], mean, atol=0.01)